@@ -215,6 +215,101 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_TIMEZONE = "UTC"
 CELERY_ENABLE_UTC = True
 
+# Delivered/cancelled orders older than this are moved to the order archive
+ORDER_ARCHIVE_AFTER_MONTHS = 6
+
+# Used for kitchen load and ready-time estimates when MenuItem.prep_time_minutes is empty
+DEFAULT_PREP_TIME_MINUTES = 15
+
+# Orders a kitchen prepares in parallel when KitchenCapacity has no prep budget
+DEFAULT_KITCHEN_STATIONS = 3
+
+# Promo code cap counters in Redis (restaurants.promo_codes) expire after this
+# long and are reloaded from the PromoCodeRedemption rows, so a reservation
+# leaked by a crashed checkout or a deleted redemption is corrected
+PROMO_CODE_COUNTER_TIMEOUT_SECONDS = 60 * 5
+
+# Couriers are dispatched this long before the order is expected to be ready
+DISPATCH_LEAD_MINUTES = 10
+
+# Couriers further than this from the pickup are not considered by the GEO index
+DISPATCH_RADIUS_KM = 10
+
+# Batch dispatch (delivery.dispatch): deliveries matched per tick, and nearest
+# couriers pulled from the GEO index for each of them
+DISPATCH_BATCH_SIZE = 500
+DISPATCH_CANDIDATES_PER_DELIVERY = 5
+
+# Stacked deliveries (delivery.batching): with batching on, pending deliveries
+# whose pickups are this close, whose dropoffs are within the dropoff radius
+# and that are ready within the window of each other go to one courier
+DISPATCH_BATCHING = False
+BATCH_PICKUP_RADIUS_KM = 0.5
+BATCH_DROPOFF_RADIUS_KM = 3
+BATCH_READY_WINDOW_MINUTES = 10
+BATCH_MAX_DELIVERIES = 3
+
+# Courier track record (delivery.performance): a delivery is on time when it is
+# delivered within this long of being accepted. Once a courier had enough
+# offers, dispatch adds these km to their pickup cost, scaled by their decline
+# rate and late rate
+COURIER_ON_TIME_MINUTES = 45
+DISPATCH_STATS_MIN_OFFERS = 10
+DISPATCH_DECLINE_PENALTY_KM = 2
+DISPATCH_LATE_PENALTY_KM = 2
+
+# Search radius of the couriers' nearby pending deliveries listing
+NEARBY_DELIVERIES_RADIUS_KM = 5
+NEARBY_DELIVERIES_MAX_RADIUS_KM = 25
+
+# Rows fetched per keyset page by the order export
+ORDER_EXPORT_CHUNK_SIZE = 2000
+
+# Location pings (courier and customer) are only stored and broadcast once the
+# device moved this far and this long after the last accepted ping, or as a
+# heartbeat when none was accepted for LOCATION_HEARTBEAT_SECONDS (delivery.movement)
+LOCATION_MIN_MOVE_METERS = 10
+LOCATION_MIN_INTERVAL_SECONDS = 1
+LOCATION_HEARTBEAT_SECONDS = 30
+
+# Courier location pings are buffered in a capped Redis stream and written to
+# Postgres in batches by `manage.py ingest_locations`
+LOCATION_STREAM_MAXLEN = 100000
+LOCATION_INGEST_BATCH_SIZE = 500
+
+# Finished deliveries' trails are simplified to this tolerance, and their raw
+# DeliveryTracking points are deleted this many days after compaction
+TRAIL_SIMPLIFY_TOLERANCE_METERS = 5
+TRACKING_RETENTION_DAYS = 7
+
+# A delivery ETA is recomputed when the courier moved this far, or when the
+# estimate is this old
+ETA_MIN_MOVE_METERS = 50
+ETA_MAX_AGE_SECONDS = 30
+
+# Websocket location fan-out (delivery.fanout): at most this many updates per
+# second reach a group; anything older than the max age is dropped
+LOCATION_FANOUT_RATE = 2
+LOCATION_FANOUT_MAX_AGE_SECONDS = 10
+
+# Geofences around pickups/dropoffs (`manage.py geofence_locations`). With
+# auto-advance on, leaving the pickup marks a delivery picked_up and reaching
+# the dropoff marks it delivered; otherwise the courier is only prompted
+GEOFENCE_PICKUP_RADIUS_METERS = 75
+GEOFENCE_DROPOFF_RADIUS_METERS = 75
+GEOFENCE_REFRESH_SECONDS = 5
+GEOFENCE_AUTO_ADVANCE = False
+
+# In DEBUG, websocket workers log the stack of anything that holds the event
+# loop longer than this (delivery.watchdog)
+LOOP_BLOCK_THRESHOLD_MS = 100
+
+# Live demand/supply heatmap (delivery.heatmap): grid cell size in degrees
+# (~1.1 km at 0.01; run rebuild_heatmap_grid after changing it) and how long
+# the served payload is reused
+HEATMAP_CELL_DEGREES = 0.01
+HEATMAP_REFRESH_SECONDS = 5
+
 
 ASGI_APPLICATION = "Fudz_api.asgi.application"
 
@@ -1,12 +1,12 @@
 from django.contrib import admin
 from django.contrib.gis.admin import GISModelAdmin
-from .models import DeliveryRequest, DeliveryTracking, CourierEarnings
+from .models import DeliveryBatch, DeliveryRequest, DeliveryTracking, CourierEarnings, CourierEarningsDaily
 
 
 @admin.register(DeliveryRequest)
 class DeliveryRequestAdmin(GISModelAdmin):
 	list_display = ["id", "order", "courier", "status", "pickup_location", "dropoff_location", "assigned_at", "updated_at"]
-	readonly_fields = ["assigned_at", "updated_at"]
+	readonly_fields = ["assigned_at", "accepted_at", "declined_at", "picked_up_at", "delivered_at", "cancelled_at", "updated_at"]
 	default_lon = 0
 	default_lat = 0
 	default_zoom = 2
@@ -26,4 +26,18 @@ class CourierEarningsAdmin(GISModelAdmin):
 	readonly_fields = ["created_at"]
 	default_lon = 0
 	default_lat = 0
-	default_zoom = 2
\ No newline at end of file
+	default_zoom = 2
+
+
+@admin.register(CourierEarningsDaily)
+class CourierEarningsDailyAdmin(admin.ModelAdmin):
+	list_display = ["id", "courier", "day", "amount", "deliveries"]
+	list_filter = ["day"]
+	readonly_fields = ["courier", "day", "amount", "deliveries"]
+
+
+@admin.register(DeliveryBatch)
+class DeliveryBatchAdmin(admin.ModelAdmin):
+	list_display = ["id", "courier", "status", "created_at", "updated_at"]
+	list_filter = ["status"]
+	readonly_fields = ["stops", "created_at", "updated_at"]
@@ -0,0 +1,197 @@
+"""
+Stacked deliveries.
+
+With DISPATCH_BATCHING on, the dispatcher first groups compatible waiting
+deliveries (pickups close together, dropoffs close together, ready within
+a short window) and matches each group to one courier as a single job. The
+courier's pickup and dropoff stops are then ordered with nearest-neighbour
+plus 2-opt and single-stop moves, never visiting a dropoff before its pickup.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from .dispatch import haversine_matrix
+from .models import DeliveryBatch, DeliveryRequest
+
+# A declined delivery leaves the batch (delivery.views decline), so its stops are off the route
+PICKED_UP_STATUSES = ["picked_up", "delivered", "cancelled", "declined"]
+DROPPED_OFF_STATUSES = ["delivered", "cancelled", "declined"]
+
+
+def group_deliveries(deliveries):
+    """
+    Greedily group deliveries (each with a ``ready_at`` attribute, possibly
+    None) around the earliest-ready ones. Returns a list of lists.
+    """
+    if len(deliveries) < 2:
+        return [[delivery] for delivery in deliveries]
+
+    pickups = [delivery.pickup_location.coords for delivery in deliveries]
+    dropoffs = [
+        delivery.dropoff_location.coords if delivery.dropoff_location else delivery.pickup_location.coords
+        for delivery in deliveries
+    ]
+    pickup_km = haversine_matrix(pickups, pickups)
+    dropoff_km = haversine_matrix(dropoffs, dropoffs)
+    ready = [delivery.ready_at.timestamp() if delivery.ready_at else 0 for delivery in deliveries]
+    window = settings.BATCH_READY_WINDOW_MINUTES * 60
+
+    order = sorted(range(len(deliveries)), key=lambda i: ready[i])
+    grouped = set()
+    groups = []
+    for seed in order:
+        if seed in grouped:
+            continue
+        group = [seed]
+        grouped.add(seed)
+        for other in order:
+            if len(group) >= settings.BATCH_MAX_DELIVERIES:
+                break
+            if other in grouped or not deliveries[other].dropoff_location:
+                continue
+            if (
+                pickup_km[seed, other] <= settings.BATCH_PICKUP_RADIUS_KM
+                and dropoff_km[seed, other] <= settings.BATCH_DROPOFF_RADIUS_KM
+                and abs(ready[other] - ready[seed]) <= window
+            ):
+                group.append(other)
+                grouped.add(other)
+        groups.append([deliveries[i] for i in group])
+    return groups
+
+
+def route_length(route, distances):
+    """Length of an open path through point indexes, starting at point 0"""
+    path = [0] + route
+    return sum(distances[a, b] for a, b in zip(path, path[1:]))
+
+
+def respects_precedence(route, stops):
+    picked = set()
+    for index in route:
+        delivery_id, kind = stops[index - 1][:2]
+        if kind == "pickup":
+            picked.add(delivery_id)
+        elif delivery_id not in picked:
+            return False
+    return True
+
+
+def neighbours(route):
+    for i in range(len(route) - 1):
+        for j in range(i + 1, len(route)):
+            yield route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+    for i in range(len(route)):
+        rest = route[:i] + route[i + 1:]
+        for j in range(len(route)):
+            if j != i:
+                yield rest[:j] + [route[i]] + rest[j:]
+
+
+def plan_route(start, deliveries):
+    """
+    Order the pickup and dropoff stops of ``deliveries`` for a courier at
+    ``start`` (lng, lat). Returns [{"delivery_id", "kind", "lng", "lat"}, ...].
+    """
+    stops = [(delivery.id, "pickup", delivery.pickup_location.coords) for delivery in deliveries]
+    stops += [(delivery.id, "dropoff", delivery.dropoff_location.coords) for delivery in deliveries if delivery.dropoff_location]
+    distances = haversine_matrix([start] + [stop[2] for stop in stops], [start] + [stop[2] for stop in stops])
+
+    # Nearest feasible stop next (indexes are into ``distances``, so stop i is i + 1)
+    route = []
+    picked = set()
+    remaining = set(range(1, len(stops) + 1))
+    current = 0
+    while remaining:
+        feasible = [i for i in remaining if stops[i - 1][1] == "pickup" or stops[i - 1][0] in picked]
+        current = min(feasible, key=lambda i: distances[current, i])
+        route.append(current)
+        remaining.discard(current)
+        if stops[current - 1][1] == "pickup":
+            picked.add(stops[current - 1][0])
+
+    # Local search: 2-opt segment reversals plus single-stop moves (which get
+    # around pickup/dropoff pairs that block a reversal), while they help
+    best = route_length(route, distances)
+    improved = True
+    while improved:
+        improved = False
+        for candidate in neighbours(route):
+            length = route_length(candidate, distances)
+            if length < best - 1e-9 and respects_precedence(candidate, stops):
+                route, best, improved = candidate, length, True
+                break
+
+    return [
+        {"delivery_id": stops[i - 1][0], "kind": stops[i - 1][1], "lng": stops[i - 1][2][0], "lat": stops[i - 1][2][1]}
+        for i in route
+    ]
+
+
+def remaining_stops(stops, statuses):
+    """
+    Stops of a batch route still ahead, given {delivery_id: status} of the
+    batch's deliveries. Deliveries no longer in the batch have no stops left.
+    """
+    done = {"pickup": PICKED_UP_STATUSES, "dropoff": DROPPED_OFF_STATUSES}
+    return [
+        stop for stop in stops
+        if stop["delivery_id"] in statuses and statuses[stop["delivery_id"]] not in done[stop["kind"]]
+    ]
+
+
+def route_position(stops, statuses, delivery_id):
+    """{"stops_before", "total_stops"} for a customer waiting on ``delivery_id``"""
+    ahead = remaining_stops(stops, statuses)
+    for index, stop in enumerate(ahead):
+        if stop["delivery_id"] == delivery_id and stop["kind"] == "dropoff":
+            return {"stops_before": index, "total_stops": len(ahead)}
+    return None
+
+
+def batch_route_positions(batch_id):
+    """{delivery_id: route_position} for every delivery of a batch"""
+    batch = DeliveryBatch.objects.get(id=batch_id)
+    statuses = dict(batch.deliveries.values_list("id", "status"))
+    return {delivery_id: route_position(batch.stops, statuses, delivery_id) for delivery_id in statuses}
+
+
+def push_route_positions(batch_id):
+    """Tell each customer of a batch how many stops are still ahead of theirs"""
+    channel_layer = get_channel_layer()
+    for delivery_id, position in batch_route_positions(batch_id).items():
+        async_to_sync(channel_layer.group_send)(
+            f"delivery_{delivery_id}",
+            {"type": "route_update", "delivery_id": delivery_id, "position": position},
+        )
+
+
+def create_batch(courier, deliveries):
+    """Plan the route for ``deliveries`` (already assigned to ``courier``) and link them"""
+    batch = DeliveryBatch.objects.create(
+        courier=courier,
+        stops=plan_route(courier.current_location.coords, deliveries),
+    )
+    DeliveryRequest.objects.filter(id__in=[delivery.id for delivery in deliveries]).update(batch=batch)
+    for delivery in deliveries:
+        delivery.batch = batch
+    # robust: a channel layer error must not skip the rest of the dispatch commit's callbacks
+    transaction.on_commit(lambda: push_route_positions(batch.id), robust=True)
+    return batch
+
+
+def release_courier(delivery):
+    """Make the courier available again once none of their deliveries is in progress"""
+    courier = delivery.courier
+    if courier is None:
+        return
+    if DeliveryRequest.objects.filter(courier=courier, status__in=DeliveryRequest.ACTIVE_STATUSES).exists():
+        return
+
+    with transaction.atomic():
+        courier.is_available = True
+        courier.save()
+        if delivery.batch_id:
+            DeliveryBatch.objects.filter(id=delivery.batch_id).update(status="completed")
@@ -1,16 +1,20 @@
-import json
-
 from django.contrib.gis.geos import Point
 from django.utils import timezone
 from django.core.cache import cache
 
-from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
-from users.models import CourierProfile, CustomerProfile, User
-from .models import DeliveryRequest, DeliveryTracking
-
-class CourierLocationConsumer(AsyncWebsocketConsumer):
+from users.models import CustomerProfile
+from .models import DeliveryRequest
+from .eta import update_delivery_eta
+from .fanout import fanout
+from .framing import FramedWebsocketConsumer
+from .movement import should_accept
+from .streams import publish_location
+from .batching import batch_route_positions
+from .tracking import get_active_deliveries
+
+class CourierLocationConsumer(FramedWebsocketConsumer):
     async def connect(self):
         self.courier_id = self.scope['url_route']['kwargs']['courier_id']
 
@@ -25,10 +29,10 @@ class CourierLocationConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'connection_established',
             'message': f'Connected to courier {self.courier_id}'
-        }))
+        })
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
@@ -36,80 +40,109 @@ class CourierLocationConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
+            data = self.decode_frame(text_data, bytes_data)
             lat = data.get('lat')
             lng = data.get('lng')
             
             if lat and lng:
-                point = Point(lng, lat)
-                delivery = await self.update_courier_location(point)
-                
-                if delivery:
-                    await self.channel_layer.group_send(
-                        f"delivery_{delivery.id}",
+                timestamp = timezone.now().isoformat()
+                deliveries = await self.record_ping(lat, lng, timestamp)
+                if deliveries is None:
+                    # Hasn't moved enough since the last accepted ping
+                    await self.send_frame({
+                        'type': 'location_received',
+                        'lat': lat,
+                        'lng': lng,
+                        'accepted': False
+                    })
+                    return
+
+                # Persisted in batches by `manage.py ingest_locations`
+                await publish_location(
+                    self.courier_id, lat, lng, timestamp, delivery_ids=[delivery['id'] for delivery in deliveries]
+                )
+
+                for delivery in deliveries:
+                    await fanout(
+                        self.channel_layer,
+                        f"delivery_{delivery['id']}",
                         {
                             'type': 'location_update',
                             'lat': lat,
                             'lng': lng,
-                            'timestamp': timezone.now().isoformat()
+                            'timestamp': timestamp,
+                            'eta': delivery['eta']
                         }
                     )
-
-                cache.set(
-                    f"courier:{self.courier_id}",
-                    {
-                        "lat": lat, 
-                        "lng": lng, 
-                        "timestamp": timezone.now().isoformat()
-                    },
-                    timeout=60 * 10
-                )
                 
-                await self.send(text_data=json.dumps({
+                await self.send_frame({
                     'type': 'location_received',
                     'lat': lat,
-                    'lng': lng
-                }))
+                    'lng': lng,
+                    'accepted': True
+                })
         except Exception as e:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 'type': 'error',
                 'message': str(e)
-            }))
+            })
 
     async def location_update(self, event):
         """Handler for location updates from group_send"""
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'location_update',
             'lat': event['lat'],
             'lng': event['lng'],
             'timestamp': event['timestamp']
-        }))
+        })
         
+    async def geofence_event(self, event):
+        """Arrival at a pickup/dropoff detected by delivery.geofence"""
+        await self.send_frame({
+            'type': 'geofence',
+            'event': event['event'],
+            'delivery_id': event['delivery_id'],
+            'status': event['status']
+        })
+
+    async def customer_location_update(self, event):
+        """Handler for the customer's position, sent by CustomerLocationConsumer"""
+        await self.send_frame({
+            'type': 'customer_location_update',
+            'customer_id': event['customer_id'],
+            'lat': event['lat'],
+            'lng': event['lng'],
+            'timestamp': event['timestamp']
+        })
+
     @database_sync_to_async
-    def update_courier_location(self, point):
-        try:
-            courier = CourierProfile.objects.get(id=self.courier_id)
-            courier.current_location = point
-            courier.last_updated = timezone.now()
-            courier.save()
-
-            delivery = DeliveryRequest.objects.filter(
-                courier=courier, status__in=["assigned", "accepted", "picked_up"]
-            ).first()
-
-            if delivery:
-                DeliveryTracking.objects.create(
-                    delivery=delivery,
-                    courier=courier,
-                    current_location=point
-                )
-                return delivery
-        except CourierProfile.DoesNotExist:
-            pass
+    def record_ping(self, lat, lng, timestamp):
+        """
+        Blocking cache work for a ping, in one hop off the event loop:
+        store the position and refresh the ETAs of the courier's deliveries.
+        Returns [{"id", "eta"}, ...], or None when the ping is under the
+        movement threshold (delivery.movement).
+        """
+        if not should_accept(cache.get(f"courier:{self.courier_id}"), lat, lng, timestamp):
+            return None
+
+        cache.set(
+            f"courier:{self.courier_id}",
+            {
+                "lat": lat, 
+                "lng": lng, 
+                "timestamp": timestamp
+            },
+            timeout=60 * 10
+        )
+        return [
+            {"id": delivery["id"], "eta": update_delivery_eta(delivery, lat, lng, timestamp)}
+            for delivery in get_active_deliveries(self.courier_id)
+        ]
 
-class CustomerLocationConsumer(AsyncWebsocketConsumer):
+class CustomerLocationConsumer(FramedWebsocketConsumer):
     """Consumer to receive and broadcast customer location updates"""    
     async def connect(self):
         self.customer_id = self.scope['url_route']['kwargs']['customer_id']
@@ -125,10 +158,10 @@ class CustomerLocationConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'connection_established',
             'message': f'Connected as customer {self.customer_id}'
-        }))
+        })
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
@@ -136,86 +169,98 @@ class CustomerLocationConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Receive customer location updates"""
         try:
-            data = json.loads(text_data)
+            data = self.decode_frame(text_data, bytes_data)
             lat = data.get('lat')
             lng = data.get('lng')
 
             if lat and lng:
-                point = Point(lng, lat)
-                delivery = await self.update_customer_location(point)
+                timestamp = timezone.now().isoformat()
+                accepted, delivery = await self.update_customer_location(lat, lng, timestamp)
+                if not accepted:
+                    # Hasn't moved enough since the last accepted ping
+                    await self.send_frame({
+                        'type': 'location_received',
+                        'lat': lat,
+                        'lng': lng,
+                        'accepted': False
+                    })
+                    return
 
                 location_data = {
                     'type': 'customer_location_update',
                     'customer_id': self.customer_id,
                     'lat': lat,
                     'lng': lng,
-                    'timestamp': timezone.now().isoformat()
+                    'timestamp': timestamp
                 }
 
-                if delivery and delivery.courier:
-                    await self.channel_layer.group_send(
-                        f"courier_{delivery.courier.id}",
+                if delivery and delivery['courier_id']:
+                    await fanout(
+                        self.channel_layer,
+                        f"courier_{delivery['courier_id']}",
                         location_data
                     )
                     
-                    await self.channel_layer.group_send(
-                        f"delivery_{delivery.id}",
+                    await fanout(
+                        self.channel_layer,
+                        f"delivery_{delivery['id']}",
                         location_data
                     )
 
-                cache.set(
-                    f"customer:{self.customer_id}",
-                    {
-                        "lat": lat, 
-                        "lng": lng, 
-                        "timestamp": timezone.now().isoformat()
-                    },
-                    timeout=60 * 10
-                )
-
-                await self.send(text_data=json.dumps({
+                await self.send_frame({
                     'type': 'location_received',
                     'lat': lat,
                     'lng': lng,
-                    'delivery_id': delivery.id if delivery else None,
-                    'courier_notified': delivery and delivery.courier is not None
-                }))
+                    'accepted': True,
+                    'delivery_id': delivery['id'] if delivery else None,
+                    'courier_notified': bool(delivery and delivery['courier_id'])
+                })
 
         except Exception as e:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 'type': 'error',
                 'message': str(e)
-            }))
+            })
 
     async def location_update(self, event):
         """Handler for location updates from group_send"""
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'location_update',
             'customer_id': event.get('customer_id'),
             'lat': event['lat'],
             'lng': event['lng'],
             'timestamp': event['timestamp']
-        }))
+        })
 
     @database_sync_to_async
-    def update_customer_location(self, point):
-        """Update customer location in database"""
-        try:
-            customer = User.objects.get(id=self.customer_id)
-            
-            customer_profile = CustomerProfile.objects.get(user=customer)
-            customer_profile.current_location = point
-            customer_profile.last_updated = timezone.now()
-            customer_profile.save()
-
-        except (User.DoesNotExist, CustomerProfile.DoesNotExist):
-            pass
+    def update_customer_location(self, lat, lng, timestamp):
+        """
+        Store the customer's position (off the event loop) and return
+        (accepted, their in-progress delivery as {"id", "courier_id"} or None).
+        Pings under the movement threshold are not stored.
+        """
+        if not should_accept(cache.get(f"customer:{self.customer_id}"), lat, lng, timestamp):
+            return False, None
+
+        CustomerProfile.objects.filter(user_id=self.customer_id).update(current_location=Point(lng, lat, srid=4326))
+        cache.set(
+            f"customer:{self.customer_id}",
+            {
+                "lat": lat, 
+                "lng": lng, 
+                "timestamp": timestamp
+            },
+            timeout=60 * 10
+        )
+        return True, DeliveryRequest.objects.filter(
+            order__customer__user_id=self.customer_id, status__in=DeliveryRequest.ACTIVE_STATUSES
+        ).values("id", "courier_id").first()
 
 
-class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
+class DeliveryTrackingConsumer(FramedWebsocketConsumer):
     async def connect(self):
         self.delivery_id = self.scope['url_route']['kwargs']['delivery_id']
         self.group_name = f"delivery_{self.delivery_id}"
@@ -223,29 +268,68 @@ class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'connection_established',
             'message': f'Connected to delivery {self.delivery_id} tracking'
-        }))
+        })
+
+        position = await self.get_route_position()
+        if position:
+            await self.send_frame({
+                'type': 'route_update',
+                'delivery_id': self.delivery_id,
+                'position': position
+            })
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
-    async def receive(self, text_data):
-        await self.send(text_data=json.dumps({
+    async def receive(self, text_data=None, bytes_data=None):
+        await self.send_frame({
             'type': 'info',
             'message': 'This WebSocket is for receiving tracking updates only.'
-        }))
+        })
 
     async def location_update(self, event):
         """Receives courier updates from CourierLocationConsumer"""
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'location_update',
             'lat': event['lat'],
             'lng': event['lng'],
+            'timestamp': event['timestamp'],
+            'eta': event.get('eta')
+        })
+
+    async def geofence_event(self, event):
+        """Arrival at a pickup/dropoff detected by delivery.geofence"""
+        await self.send_frame({
+            'type': 'geofence',
+            'event': event['event'],
+            'delivery_id': event['delivery_id'],
+            'status': event['status']
+        })
+
+    async def customer_location_update(self, event):
+        """Handler for the customer's position, sent by CustomerLocationConsumer"""
+        await self.send_frame({
+            'type': 'customer_location_update',
+            'customer_id': event['customer_id'],
+            'lat': event['lat'],
+            'lng': event['lng'],
             'timestamp': event['timestamp']
-        }))
-        
-        
-        
-        
\ No newline at end of file
+        })
+
+    async def route_update(self, event):
+        """Stops still ahead of this delivery's dropoff, when it is part of a batch"""
+        await self.send_frame({
+            'type': 'route_update',
+            'delivery_id': event['delivery_id'],
+            'position': event['position']
+        })
+
+    @database_sync_to_async
+    def get_route_position(self):
+        batch_id = DeliveryRequest.objects.filter(id=self.delivery_id).values_list("batch_id", flat=True).first()
+        if not batch_id:
+            return None
+        return batch_route_positions(batch_id).get(int(self.delivery_id))
@@ -0,0 +1,248 @@
+"""
+Batch courier dispatch.
+
+Every tick collects all deliveries waiting for a courier, prices each
+delivery/courier pair in one NumPy distance matrix and solves the whole
+assignment at once (Hungarian method), so two deliveries never compete for
+the same courier and the total pickup distance is minimal. Couriers who
+often decline or deliver late pay a km penalty (delivery.performance). Assignments are
+committed under row locks; anything that could not be matched or locked is
+simply still pending on the next tick.
+
+The matrix and solver functions take plain coordinates so they can be used
+without the database.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.measure import D
+from django.db import transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from orders.eta import get_ready_etas
+from users.models import CourierProfile
+from .expressions import KNNDistance
+from .geo_index import nearest_couriers
+from .models import DeliveryRequest
+from .performance import dispatch_penalty_km
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Cost of pairs that must not be matched (courier outside the dispatch radius)
+UNREACHABLE = 1e9
+
+# Deliveries waiting for a courier; declined ones go back into the pool
+DISPATCH_STATUSES = ["pending", "declined"]
+
+
+def haversine_matrix(origins, destinations):
+    """Great-circle km between every (lng, lat) in ``origins`` and ``destinations``"""
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))[:, None, :]
+    destinations = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))[None, :, :]
+
+    dlng = destinations[..., 0] - origins[..., 0]
+    dlat = destinations[..., 1] - origins[..., 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(origins[..., 1]) * np.cos(destinations[..., 1]) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def build_cost_matrix(pickups, couriers, max_km=None, penalties=None):
+    """
+    Pickup distance (km) of every courier to every pickup, plus each courier's
+    ``penalties`` km (track record) if given; too-far pairs are UNREACHABLE
+    """
+    distance = haversine_matrix(pickups, couriers)
+    cost = distance + np.asarray(penalties, dtype=float)[None, :] if penalties is not None else distance.copy()
+    cost[distance > (max_km or settings.DISPATCH_RADIUS_KM)] = UNREACHABLE
+    return cost
+
+
+def solve_assignment(cost):
+    """
+    Minimum-cost matching of rows to columns (Hungarian method with
+    potentials, O(n²m)). Returns [(row, col), ...] leaving out UNREACHABLE pairs.
+    """
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return []
+
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # 1-based as in the textbook formulation; column 0 is a virtual start
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    row_of = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+
+    for row in range(1, n + 1):
+        row_of[0] = row
+        col = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while row_of[col]:
+            used[col] = True
+            current = row_of[col]
+            free = ~used[1:]
+
+            slack = cost[current - 1] - u[current] - v[1:]
+            improved = free & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = col
+
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_col = int(np.argmin(candidates)) + 1
+            delta = candidates[next_col - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[row_of[used_cols]] += delta
+            v[used_cols] -= delta
+            min_slack[1:][free] -= delta
+            col = next_col
+
+        # Flip the augmenting path
+        while col:
+            previous = way[col]
+            row_of[col] = row_of[previous]
+            col = previous
+
+    pairs = []
+    for col in range(1, m + 1):
+        row = row_of[col]
+        if row and cost[row - 1, col - 1] < UNREACHABLE:
+            pairs.append((col - 1, row - 1) if transposed else (row - 1, col - 1))
+    return sorted(pairs)
+
+
+def dispatchable_deliveries(delivery_ids=None):
+    """Deliveries waiting for a courier whose order is (nearly) ready, with ``ready_at`` set"""
+    deliveries = DeliveryRequest.objects.filter(
+        status__in=DISPATCH_STATUSES, courier__isnull=True, pickup_location__isnull=False
+    )
+    if delivery_ids is not None:
+        deliveries = deliveries.filter(id__in=delivery_ids)
+
+    # Don't tie up a courier while the kitchen is still cooking. Ready times
+    # come from the ETA cache, not a column, so page past the oldest
+    # deliveries until a batch of ready ones is found
+    batch_size = settings.DISPATCH_BATCH_SIZE
+    dispatch_before = timezone.now() + timedelta(minutes=settings.DISPATCH_LEAD_MINUTES)
+    ready = []
+    last_id = 0
+    while len(ready) < batch_size:
+        page = list(deliveries.filter(id__gt=last_id).order_by("id")[:batch_size])
+        ready_etas = get_ready_etas([delivery.order_id for delivery in page])
+        for delivery in page:
+            delivery.ready_at = ready_etas.get(delivery.order_id)
+            if delivery.ready_at is None or delivery.ready_at <= dispatch_before:
+                ready.append(delivery)
+        if len(page) < batch_size:
+            break
+        last_id = page[-1].id
+    return ready[:batch_size]
+
+
+def candidate_couriers(deliveries):
+    """Available couriers near any of the pickups (GEO index, PostGIS fallback)"""
+    couriers = CourierProfile.objects.filter(is_available=True, current_location__isnull=False)
+    try:
+        courier_ids = set()
+        for delivery in deliveries:
+            courier_ids.update(
+                nearest_couriers(delivery.pickup_location, count=settings.DISPATCH_CANDIDATES_PER_DELIVERY)
+            )
+    except RedisError:
+        courier_ids = set()
+
+    if courier_ids:
+        return list(couriers.filter(id__in=courier_ids))
+
+    # Index empty or unreachable: the same nearest couriers per pickup, straight from PostGIS
+    for delivery in deliveries:
+        courier_ids.update(
+            couriers.filter(current_location__dwithin=(delivery.pickup_location, D(km=settings.DISPATCH_RADIUS_KM)))
+            .annotate(distance=KNNDistance("current_location", delivery.pickup_location))
+            .order_by("distance")
+            .values_list("id", flat=True)[:settings.DISPATCH_CANDIDATES_PER_DELIVERY]
+        )
+    return list(couriers.filter(id__in=courier_ids))
+
+
+def commit_assignments(pairs):
+    """
+    Assign each (deliveries, courier) pair; a group of several deliveries
+    becomes a DeliveryBatch. Rows another worker holds, or that changed since
+    they were read, are skipped and picked up on the next tick.
+    Returns the committed (delivery, courier) pairs.
+    """
+    from .batching import create_batch
+
+    assigned = []
+    with transaction.atomic():
+        deliveries = (
+            DeliveryRequest.objects.select_related("order")
+            .select_for_update(skip_locked=True, of=("self",))
+            .filter(
+                id__in=[delivery.id for group, _ in pairs for delivery in group],
+                status__in=DISPATCH_STATUSES,
+                courier__isnull=True,
+            )
+            .in_bulk()
+        )
+        couriers = (
+            CourierProfile.objects.select_for_update(skip_locked=True)
+            .filter(id__in=[courier.id for _, courier in pairs], is_available=True)
+            .in_bulk()
+        )
+
+        for group, courier in pairs:
+            group = [deliveries[delivery.id] for delivery in group if delivery.id in deliveries]
+            courier = couriers.get(courier.id)
+            if not group or courier is None:
+                continue
+
+            for delivery in group:
+                # A delivery dispatched alone must not keep a previous courier's batch
+                if len(group) == 1:
+                    delivery.batch = None
+                delivery.assign_to(courier)
+
+                order = delivery.order
+                order.courier = courier
+                order.save(update_fields=["courier", "updated_at"])
+                assigned.append((delivery, courier))
+
+            if len(group) > 1:
+                create_batch(courier, group)
+
+            courier.is_available = False
+            courier.save()
+
+    return assigned
+
+
+def dispatch_deliveries(delivery_ids=None):
+    """Match waiting deliveries to couriers in one pass. Returns the committed pairs"""
+    from .batching import group_deliveries
+
+    deliveries = dispatchable_deliveries(delivery_ids)
+    if not deliveries:
+        return []
+    couriers = candidate_couriers(deliveries)
+    if not couriers:
+        return []
+
+    # With batching, each group of compatible deliveries is one job, priced at its first pickup
+    groups = group_deliveries(deliveries) if settings.DISPATCH_BATCHING else [[delivery] for delivery in deliveries]
+    cost = build_cost_matrix(
+        [group[0].pickup_location.coords for group in groups],
+        [courier.current_location.coords for courier in couriers],
+        penalties=[dispatch_penalty_km(courier.performance_stats) for courier in couriers],
+    )
+    pairs = [(groups[row], couriers[col]) for row, col in solve_assignment(cost)]
+    return commit_assignments(pairs) if pairs else []
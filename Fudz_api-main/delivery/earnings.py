@@ -0,0 +1,42 @@
+"""
+Courier earnings ledger.
+
+CourierEarnings is append-only with one entry per (courier, order); an entry
+is inserted with ON CONFLICT DO NOTHING, and only when it was actually new
+are the courier's daily rollup and earnings_balance incremented, in the same
+transaction. Summaries then read two rows instead of summing the ledger.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from orders.rollups import increment_rollup
+from users.models import CourierProfile
+from .models import CourierEarnings, CourierEarningsDaily
+
+INSERT_EARNING = f"""
+INSERT INTO {CourierEarnings._meta.db_table} (courier_id, order_id, amount, commission_rate, created_at)
+VALUES (%s, %s, %s, %s, %s)
+ON CONFLICT (courier_id, order_id) DO NOTHING
+RETURNING id
+"""
+
+
+def record_earning(courier_id, order_id, amount):
+    """Credit ``amount`` for an order once. Returns False if it was already recorded"""
+    created_at = timezone.now()
+    commission_rate = CourierEarnings._meta.get_field("commission_rate").default
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT_EARNING, [courier_id, order_id, amount, commission_rate, created_at])
+            if cursor.fetchone() is None:
+                return False
+
+        increment_rollup(
+            CourierEarningsDaily,
+            {"courier_id": courier_id, "day": timezone.localdate(created_at)},
+            {"amount": amount, "deliveries": 1},
+        )
+        CourierProfile.objects.filter(id=courier_id).update(earnings_balance=F("earnings_balance") + amount)
+    return True
@@ -0,0 +1,135 @@
+"""
+Delivery ETAs.
+
+Each estimate is the remaining route (courier -> pickup -> dropoff before
+pickup, courier -> dropoff after, or along a batch's planned stops up to
+the delivery's dropoff) divided by the courier's recent speed, an
+EWMA of ping-to-ping speeds seeded with a per-vehicle default. It is only
+recomputed when the courier has moved meaningfully, enough time has passed,
+or the delivery status changed, and it lives in the cache, so the tracking
+socket and REST reads never query the database.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Typical urban speeds; used until the courier has a speed history
+VEHICLE_SPEEDS_KMH = {
+    "bike": 15,
+    "motorcycle": 30,
+    "car": 25,
+}
+DEFAULT_SPEED_KMH = 20
+
+# Streets aren't straight lines
+ROUTE_FACTOR = 1.3
+
+# Weight of the latest ping-to-ping speed in the EWMA
+SPEED_SMOOTHING = 0.3
+
+ETA_TIMEOUT = 60 * 60 * 6
+
+
+def delivery_eta_key(delivery_id):
+    return f"delivery:{delivery_id}:eta"
+
+
+def haversine_km(a, b):
+    """Great-circle km between two (lng, lat) pairs"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(h, 1)))
+
+
+def remaining_km(delivery, position):
+    """Road-ish distance the courier still has to cover"""
+    stops = [delivery["dropoff"]]
+    if delivery.get("stops"):
+        # Batched: every stop on the route up to this delivery's dropoff
+        stops = delivery["stops"]
+    elif delivery["status"] != "picked_up" and delivery["pickup"]:
+        stops.insert(0, delivery["pickup"])
+
+    distance = 0
+    for stop in stops:
+        if stop is None:
+            continue
+        distance += haversine_km(position, stop)
+        position = stop
+    return distance * ROUTE_FACTOR
+
+
+def smoothed_speed(previous, position, ts, vehicle_speed):
+    """EWMA speed in km/h, bounded so a stop at the lights or a GPS jump can't dominate"""
+    if not previous:
+        return vehicle_speed
+
+    elapsed_hours = (ts - previous["ts"]) / 3600
+    if elapsed_hours <= 0:
+        return previous["speed_kmh"]
+
+    observed = haversine_km(previous["position"], position) / elapsed_hours
+    speed = SPEED_SMOOTHING * observed + (1 - SPEED_SMOOTHING) * previous["speed_kmh"]
+    return min(max(speed, vehicle_speed / 3), vehicle_speed * 2)
+
+
+def should_recompute(previous, delivery, position, ts):
+    if not previous or previous["status"] != delivery["status"]:
+        return True
+    if len(previous.get("stops", ())) != len(delivery.get("stops", ())):
+        # Another stop of the batch was completed
+        return True
+    if ts - previous["ts"] >= settings.ETA_MAX_AGE_SECONDS:
+        return True
+    return haversine_km(previous["position"], position) * 1000 >= settings.ETA_MIN_MOVE_METERS
+
+
+def update_delivery_eta(delivery, lat, lng, timestamp):
+    """
+    Refresh the cached estimate of ``delivery`` (tracking.delivery_context)
+    for a courier ping, if it moved meaningfully. Returns the current estimate.
+    """
+    if not delivery.get("dropoff"):
+        return None
+
+    key = delivery_eta_key(delivery["id"])
+    previous = cache.get(key)
+    position = (float(lng), float(lat))
+    ts = datetime.fromisoformat(timestamp).timestamp()
+
+    if not should_recompute(previous, delivery, position, ts):
+        return previous["eta"]
+
+    vehicle_speed = VEHICLE_SPEEDS_KMH.get(delivery.get("vehicle_type"), DEFAULT_SPEED_KMH)
+    speed = smoothed_speed(previous, position, ts, vehicle_speed)
+    distance = remaining_km(delivery, position)
+    arrival = datetime.fromtimestamp(ts, tz=dt_timezone.utc) + timedelta(hours=distance / speed)
+
+    eta = {
+        "eta": arrival.isoformat(),
+        "remaining_km": round(distance, 2),
+        "speed_kmh": round(speed, 1),
+    }
+    cache.set(
+        key,
+        {
+            "position": position,
+            "ts": ts,
+            "status": delivery["status"],
+            "stops": delivery.get("stops", []),
+            "speed_kmh": speed,
+            "eta": eta,
+        },
+        timeout=ETA_TIMEOUT,
+    )
+    return eta
+
+
+def get_delivery_eta(delivery_id):
+    """Cached estimate of a delivery, or None"""
+    estimate = cache.get(delivery_eta_key(delivery_id))
+    return estimate["eta"] if estimate else None
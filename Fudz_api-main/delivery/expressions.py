@@ -0,0 +1,16 @@
+from django.contrib.gis.db.models import PointField
+from django.db.models import FloatField, Func, Value
+
+
+class KNNDistance(Func):
+    """
+    ``column <-> point``: PostGIS distance operator (metres on geography).
+    Unlike ST_Distance, ORDER BY on it is answered from the GiST index
+    nearest-first, so ``[:n]`` doesn't have to sort every candidate.
+    """
+    arg_joiner = " <-> "
+    template = "%(expressions)s"
+    output_field = FloatField()
+
+    def __init__(self, expression, point, **extra):
+        super().__init__(expression, Value(point, output_field=PointField(geography=True)), **extra)
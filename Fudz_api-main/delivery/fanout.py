@@ -0,0 +1,120 @@
+"""
+Coalesced fan-out of location updates to channel-layer groups.
+
+A device can ping many times a second, but subscribers only need the latest
+position. Per group, the first update is sent right away; updates arriving
+within the next LOCATION_FANOUT_INTERVAL replace each other and only the
+last one is flushed at the end of the window. Updates older than
+LOCATION_FANOUT_MAX_AGE_SECONDS, or older than what the group already got,
+are dropped. Updates are coalesced per (group, message type), since
+courier and customer positions share the delivery group.
+
+A group can have several publishers: the courier's and the customer's
+sockets both write to delivery_{id}, and may live on different ASGI
+workers. This state is kept per process, so the rate limit applies to each
+worker's publishers separately and subscribers can receive up to one update
+per publishing worker per interval. The counters below are per process too.
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from prometheus_client import Counter
+
+MESSAGES_IN = Counter(
+    "fudz_location_fanout_messages_in_total", "Location updates offered for fan-out", ["type"]
+)
+MESSAGES_OUT = Counter(
+    "fudz_location_fanout_messages_out_total", "Location updates sent to the channel layer", ["type"]
+)
+MESSAGES_DROPPED = Counter(
+    "fudz_location_fanout_messages_dropped_total", "Location updates not sent", ["type", "reason"]
+)
+
+logger = logging.getLogger(__name__)
+
+# Forget groups that have been quiet this many intervals (checked that often)
+PRUNE_AFTER_INTERVALS = 100
+
+
+def message_time(message):
+    return datetime.fromisoformat(message["timestamp"]).timestamp()
+
+
+class GroupCoalescer:
+    def __init__(self, interval):
+        self.interval = interval
+        self.pending = {}
+        self.last_sent = {}
+        self.next_prune_at = 0
+        # Scheduled flush tasks, referenced until done so they aren't collected
+        self.flushes = set()
+
+    def is_stale(self, key, message, now):
+        sent_ts = self.last_sent.get(key, (0, 0))[1]
+        ts = message_time(message)
+        return ts < sent_ts or now - ts > settings.LOCATION_FANOUT_MAX_AGE_SECONDS
+
+    async def send(self, channel_layer, group, message):
+        kind = message["type"]
+        MESSAGES_IN.labels(kind).inc()
+        loop = asyncio.get_running_loop()
+        key = (group, kind)
+
+        if key in self.pending:
+            # A flush is already scheduled; it will carry this newer update instead
+            MESSAGES_DROPPED.labels(kind, "coalesced").inc()
+            self.pending[key] = (channel_layer, message)
+            return
+
+        wait = self.last_sent.get(key, (float("-inf"), 0))[0] + self.interval - loop.time()
+        if wait <= 0:
+            await self.deliver(channel_layer, key, message)
+        else:
+            self.pending[key] = (channel_layer, message)
+            loop.call_later(wait, self.start_flush, key)
+
+    def start_flush(self, key):
+        task = asyncio.ensure_future(self.flush(key))
+        self.flushes.add(task)
+        task.add_done_callback(self.flush_done)
+
+    def flush_done(self, task):
+        self.flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Coalesced location update could not be sent", exc_info=task.exception())
+
+    async def flush(self, key):
+        channel_layer, message = self.pending.pop(key)
+        await self.deliver(channel_layer, key, message)
+
+    async def deliver(self, channel_layer, key, message):
+        kind = message["type"]
+        if self.is_stale(key, message, datetime.now().timestamp()):
+            MESSAGES_DROPPED.labels(kind, "stale").inc()
+            return
+
+        self.last_sent[key] = (asyncio.get_running_loop().time(), message_time(message))
+        await channel_layer.group_send(key[0], message)
+        MESSAGES_OUT.labels(kind).inc()
+        self.prune()
+
+    def prune(self):
+        now = asyncio.get_running_loop().time()
+        if now < self.next_prune_at:
+            return
+        period = self.interval * PRUNE_AFTER_INTERVALS
+        self.next_prune_at = now + period
+        self.last_sent = {key: sent for key, sent in self.last_sent.items() if sent[0] > now - period}
+
+
+_coalescer = None
+
+
+async def fanout(channel_layer, group, message):
+    """group_send ``message`` (with an ISO ``timestamp``), coalesced per group"""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = GroupCoalescer(1 / settings.LOCATION_FANOUT_RATE)
+    await _coalescer.send(channel_layer, group, message)
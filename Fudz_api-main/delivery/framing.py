@@ -0,0 +1,36 @@
+"""
+Negotiated websocket frame encoding.
+
+Clients that offer the "msgpack" subprotocol (``new WebSocket(url, ["msgpack"])``)
+exchange msgpack-encoded binary frames; everyone else keeps getting JSON text.
+"""
+import json
+
+import msgpack
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .watchdog import install_loop_watchdog
+
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+
+class FramedWebsocketConsumer(AsyncWebsocketConsumer):
+    use_msgpack = False
+
+    async def accept(self, subprotocol=None, headers=None):
+        install_loop_watchdog()
+        if subprotocol is None and MSGPACK_SUBPROTOCOL in self.scope.get("subprotocols", []):
+            self.use_msgpack = True
+            subprotocol = MSGPACK_SUBPROTOCOL
+        await super().accept(subprotocol=subprotocol, headers=headers)
+
+    async def send_frame(self, data):
+        if self.use_msgpack:
+            await self.send(bytes_data=msgpack.packb(data))
+        else:
+            await self.send(text_data=json.dumps(data))
+
+    def decode_frame(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            return msgpack.unpackb(bytes_data)
+        return json.loads(text_data)
@@ -0,0 +1,72 @@
+"""
+Live Redis GEO index of couriers available for dispatch.
+
+Membership follows CourierProfile availability (delivery.signals); positions
+are refreshed from the location stream by the ingestion worker. Postgres
+stays the source of truth: dispatch re-checks availability there and falls
+back to a PostGIS query when the index is empty or Redis is unreachable.
+"""
+from django.conf import settings
+
+from users.models import CourierProfile
+from .streams import get_redis
+
+AVAILABLE_COURIERS_KEY = "couriers:available"
+
+
+def is_dispatchable(courier):
+    return courier.is_available and courier.current_location is not None
+
+
+def index_courier(courier):
+    """Add or drop a courier depending on whether it can take deliveries"""
+    if is_dispatchable(courier):
+        point = courier.current_location
+        get_redis().geoadd(AVAILABLE_COURIERS_KEY, (point.x, point.y, courier.id))
+    else:
+        get_redis().zrem(AVAILABLE_COURIERS_KEY, courier.id)
+
+
+def update_positions(positions, client=None):
+    """
+    Move indexed couriers to their latest {courier_id: (lng, lat)}.
+    XX leaves couriers that are not available out of the index.
+    """
+    if not positions:
+        return
+    values = []
+    for courier_id, (lng, lat) in positions.items():
+        values.extend((lng, lat, courier_id))
+    (client or get_redis()).geoadd(AVAILABLE_COURIERS_KEY, values, xx=True)
+
+
+def nearest_couriers(point, radius_km=None, count=10):
+    """IDs of indexed couriers within ``radius_km`` of ``point``, nearest first"""
+    members = get_redis().geosearch(
+        AVAILABLE_COURIERS_KEY,
+        longitude=point.x,
+        latitude=point.y,
+        radius=radius_km or settings.DISPATCH_RADIUS_KM,
+        unit="km",
+        sort="ASC",
+        count=count,
+    )
+    return [int(member) for member in members]
+
+
+def rebuild_index():
+    """Reload the index from Postgres (after a Redis flush, or to drop drift)"""
+    couriers = CourierProfile.objects.filter(
+        is_available=True, current_location__isnull=False
+    ).values_list("id", "current_location")
+
+    client = get_redis()
+    pipe = client.pipeline()
+    pipe.delete(AVAILABLE_COURIERS_KEY)
+    values = []
+    for courier_id, point in couriers.iterator():
+        values.extend((point.x, point.y, courier_id))
+    if values:
+        pipe.geoadd(AVAILABLE_COURIERS_KEY, values)
+    pipe.execute()
+    return len(values) // 3
@@ -0,0 +1,178 @@
+"""
+Geofences around pickups and dropoffs of active deliveries.
+
+A worker (``manage.py geofence_locations``) reads the location stream in its
+own consumer group and tests every ping against the fences of the courier's
+delivery. Fences are reloaded from Postgres in one query every
+GEOFENCE_REFRESH_SECONDS and tested in memory with an equirectangular
+approximation, which is exact enough at fence scale (tens of metres).
+
+Events, each emitted once per delivery:
+    arrived_at_pickup   courier entered the pickup fence
+    left_pickup         courier left the pickup fence after arriving
+    arrived_at_dropoff  courier entered the dropoff fence with the order
+
+They are sent to the courier and delivery groups as ``geofence_event`` to
+prompt the courier. With GEOFENCE_AUTO_ADVANCE, leaving the pickup marks
+the delivery picked_up and arriving at the dropoff marks it delivered.
+"""
+import logging
+import math
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+from .batching import release_courier
+from .ingestion import ensure_consumer_group, parse_delivery_ids, read_batch
+from .models import DeliveryRequest
+from .streams import LOCATION_STREAM, get_redis
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_GROUP = "geofence"
+EVENT_TIMEOUT = 60 * 60 * 6
+METERS_PER_DEGREE = 111_320
+
+# Status the delivery moves to on each event when auto-advancing
+AUTO_ADVANCE = {
+    "left_pickup": "picked_up",
+    "arrived_at_dropoff": "delivered",
+}
+
+
+def geofence_event_key(delivery_id, event):
+    return f"delivery:{delivery_id}:geofence:{event}"
+
+
+class Fence:
+    """Precomputed circle: a point plus the scale that turns degrees into metres"""
+    __slots__ = ("lng", "lat", "lng_scale", "radius_sq")
+
+    def __init__(self, coords, radius_m):
+        self.lng, self.lat = coords
+        self.lng_scale = math.cos(math.radians(self.lat))
+        self.radius_sq = (radius_m / METERS_PER_DEGREE) ** 2
+
+    def contains(self, lng, lat):
+        dx = (lng - self.lng) * self.lng_scale
+        dy = lat - self.lat
+        return dx * dx + dy * dy <= self.radius_sq
+
+
+class GeofenceEngine:
+    def __init__(self):
+        self.deliveries = {}
+        self.arrived_at_pickup = set()
+        self.loaded_at = 0
+        self.channel_layer = get_channel_layer()
+
+    def refresh(self, force=False):
+        if not force and time.monotonic() - self.loaded_at < settings.GEOFENCE_REFRESH_SECONDS:
+            return
+
+        rows = DeliveryRequest.objects.filter(status__in=DeliveryRequest.ACTIVE_STATUSES).values(
+            "id", "courier_id", "status", "pickup_location", "dropoff_location"
+        )
+        self.deliveries = {
+            row["id"]: {
+                "courier_id": row["courier_id"],
+                "status": row["status"],
+                "pickup": Fence(row["pickup_location"].coords, settings.GEOFENCE_PICKUP_RADIUS_METERS)
+                if row["pickup_location"] else None,
+                "dropoff": Fence(row["dropoff_location"].coords, settings.GEOFENCE_DROPOFF_RADIUS_METERS)
+                if row["dropoff_location"] else None,
+            }
+            for row in rows.iterator()
+        }
+
+        # Arrivals seen by other workers in the group
+        keys = {geofence_event_key(delivery_id, "arrived_at_pickup"): delivery_id for delivery_id in self.deliveries}
+        self.arrived_at_pickup = {keys[key] for key in cache.get_many(list(keys))}
+        self.loaded_at = time.monotonic()
+
+    def check(self, delivery_id, lng, lat):
+        """Test one ping of ``delivery_id``'s courier against its fences"""
+        delivery = self.deliveries.get(delivery_id)
+        if delivery is None:
+            return
+
+        pickup, dropoff, status = delivery["pickup"], delivery["dropoff"], delivery["status"]
+        if status in ("assigned", "accepted") and pickup:
+            if pickup.contains(lng, lat):
+                if delivery_id not in self.arrived_at_pickup:
+                    self.arrived_at_pickup.add(delivery_id)
+                    self.emit(delivery_id, delivery, "arrived_at_pickup")
+            elif delivery_id in self.arrived_at_pickup and status == "accepted":
+                self.emit(delivery_id, delivery, "left_pickup")
+        elif status == "picked_up" and dropoff and dropoff.contains(lng, lat):
+            self.emit(delivery_id, delivery, "arrived_at_dropoff")
+
+    def emit(self, delivery_id, delivery, event):
+        key = geofence_event_key(delivery_id, event)
+        if not cache.add(key, 1, timeout=EVENT_TIMEOUT):
+            return
+
+        if settings.GEOFENCE_AUTO_ADVANCE and event in AUTO_ADVANCE:
+            try:
+                delivery["status"] = advance_delivery(delivery_id, AUTO_ADVANCE[event]) or delivery["status"]
+            except Exception:
+                # Give up the claim so the next ping in the fence retries
+                cache.delete(key)
+                logger.exception(f"Could not move delivery {delivery_id} to {AUTO_ADVANCE[event]}")
+                return
+
+        message = {
+            "type": "geofence_event",
+            "event": event,
+            "delivery_id": delivery_id,
+            "status": delivery["status"],
+        }
+        async_to_sync(self.channel_layer.group_send)(f"courier_{delivery['courier_id']}", message)
+        async_to_sync(self.channel_layer.group_send)(f"delivery_{delivery_id}", message)
+
+
+def advance_delivery(delivery_id, status):
+    """Move a delivery on like the courier's update_status would. Returns the new status"""
+    delivery = DeliveryRequest.objects.select_related("courier").filter(
+        id=delivery_id, status__in=DeliveryRequest.ACTIVE_STATUSES
+    ).first()
+    if delivery is None:
+        return None
+
+    delivery.mark_status(status)
+    if status in ["delivered", "cancelled"]:
+        release_courier(delivery)
+    return status
+
+
+def process_batch(engine, client, consumer, count, block_ms, pending=False):
+    entries = read_batch(client, consumer, count, block_ms, pending=pending, group=CONSUMER_GROUP)
+    if not entries:
+        return 0
+
+    engine.refresh()
+    for entry_id, fields in entries:
+        try:
+            for delivery_id in parse_delivery_ids(fields):
+                engine.check(delivery_id, float(fields["lng"]), float(fields["lat"]))
+        except (KeyError, ValueError):
+            logger.warning(f"Skipping malformed location ping {entry_id}: {fields}")
+
+    client.xack(LOCATION_STREAM, CONSUMER_GROUP, *[entry_id for entry_id, _ in entries])
+    return len(entries)
+
+
+def run(consumer, count, block_ms):
+    client = get_redis()
+    ensure_consumer_group(client, CONSUMER_GROUP)
+    engine = GeofenceEngine()
+    engine.refresh(force=True)
+
+    while process_batch(engine, client, consumer, count, block_ms, pending=True):
+        pass
+
+    while True:
+        process_batch(engine, client, consumer, count, block_ms)
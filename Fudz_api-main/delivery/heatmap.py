@@ -0,0 +1,146 @@
+"""
+Live demand/supply heatmap.
+
+Pending pickups (demand) and available couriers (supply) are snapped to a
+fixed lng/lat grid, the same cells ST_SnapToGrid would give, and counted in
+two Redis hashes. The counts are maintained incrementally: DeliveryRequest
+and CourierProfile saves (delivery.signals) and courier positions from the
+location stream (delivery.ingestion) move one member between cells, so
+reading the map is two HGETALLs and never scans a table. rebuild_heatmap
+reloads both layers from Postgres to drop drift.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+
+from users.models import CourierProfile
+from .geo_index import is_dispatchable
+from .models import DeliveryRequest
+from .streams import get_redis
+
+DEMAND_KEY = "heatmap:demand"
+SUPPLY_KEY = "heatmap:supply"
+WAITING_STATUSES = ["pending", "declined"]
+PAYLOAD_CACHE_KEY = "delivery_heatmap_payload"
+
+# KEYS: cell counts, member -> cell. ARGV: mode, then member/cell pairs; an
+# empty cell drops the member, and mode "xx" only moves members already counted
+MOVE_MEMBERS = """
+for i = 2, #ARGV, 2 do
+    local member, cell = ARGV[i], ARGV[i + 1]
+    local old = redis.call('HGET', KEYS[2], member)
+    if old ~= cell and (old or ARGV[1] ~= 'xx') then
+        if old and redis.call('HINCRBY', KEYS[1], old, -1) <= 0 then
+            redis.call('HDEL', KEYS[1], old)
+        end
+        if cell == '' then
+            redis.call('HDEL', KEYS[2], member)
+        else
+            redis.call('HSET', KEYS[2], member, cell)
+            redis.call('HINCRBY', KEYS[1], cell, 1)
+        end
+    end
+end
+"""
+
+
+def cells_key(layer_key):
+    return f"{layer_key}:cells"
+
+
+def snap(lng, lat):
+    """Grid cell "x:y" containing a point (cell indexes, not degrees)"""
+    size = settings.HEATMAP_CELL_DEGREES
+    return f"{math.floor(lng / size)}:{math.floor(lat / size)}"
+
+
+def move_members(layer_key, cells, xx=False, client=None):
+    """Apply {member_id: cell or None} to a layer in one atomic round trip"""
+    if not cells:
+        return
+    args = ["xx" if xx else ""]
+    for member, cell in cells.items():
+        args.extend((member, cell or ""))
+    (client or get_redis()).eval(MOVE_MEMBERS, 2, layer_key, cells_key(layer_key), *args)
+
+
+def is_waiting(delivery):
+    return (
+        delivery.status in WAITING_STATUSES
+        and delivery.courier_id is None
+        and delivery.pickup_location is not None
+    )
+
+
+def index_delivery(delivery):
+    """Count a delivery in its pickup cell while it waits for a courier"""
+    cell = snap(*delivery.pickup_location.coords) if is_waiting(delivery) else None
+    move_members(DEMAND_KEY, {delivery.id: cell})
+
+
+def index_courier(courier):
+    """Count a courier in its current cell while it can take deliveries"""
+    cell = snap(*courier.current_location.coords) if is_dispatchable(courier) else None
+    move_members(SUPPLY_KEY, {courier.id: cell})
+
+
+def update_positions(positions, client=None):
+    """Move counted couriers to the cells of their latest {courier_id: (lng, lat)}"""
+    move_members(
+        SUPPLY_KEY,
+        {courier_id: snap(lng, lat) for courier_id, (lng, lat) in positions.items()},
+        xx=True,
+        client=client,
+    )
+
+
+def rebuild_heatmap():
+    """Reload both layers from Postgres (after a Redis flush, a cell size change, or to drop drift)"""
+    demand = {
+        delivery_id: snap(*point.coords)
+        for delivery_id, point in DeliveryRequest.objects.filter(
+            status__in=WAITING_STATUSES, courier__isnull=True, pickup_location__isnull=False
+        ).values_list("id", "pickup_location").iterator()
+    }
+    supply = {
+        courier_id: snap(*point.coords)
+        for courier_id, point in CourierProfile.objects.filter(
+            is_available=True, current_location__isnull=False
+        ).values_list("id", "current_location").iterator()
+    }
+
+    pipe = get_redis().pipeline()
+    for layer_key, cells in ((DEMAND_KEY, demand), (SUPPLY_KEY, supply)):
+        pipe.delete(layer_key, cells_key(layer_key))
+        if cells:
+            pipe.hset(cells_key(layer_key), mapping=cells)
+            counts = {}
+            for cell in cells.values():
+                counts[cell] = counts.get(cell, 0) + 1
+            pipe.hset(layer_key, mapping=counts)
+    pipe.execute()
+    return len(demand), len(supply)
+
+
+def build_payload():
+    """
+    {"cell_degrees", "cells": [[x, y, demand, supply], ...]}. A cell covers
+    lng x*cell_degrees to (x+1)*cell_degrees, and likewise for lat and y.
+    """
+    pipe = get_redis().pipeline()
+    pipe.hgetall(DEMAND_KEY)
+    pipe.hgetall(SUPPLY_KEY)
+    demand, supply = pipe.execute()
+
+    cells = []
+    for cell in demand.keys() | supply.keys():
+        x, y = cell.split(":")
+        cells.append([int(x), int(y), int(demand.get(cell, 0)), int(supply.get(cell, 0))])
+    cells.sort()
+    return {"cell_degrees": settings.HEATMAP_CELL_DEGREES, "cells": cells}
+
+
+def get_heatmap():
+    """The heatmap payload, rebuilt from Redis at most every HEATMAP_REFRESH_SECONDS"""
+    return cache.get_or_set(PAYLOAD_CACHE_KEY, build_payload, timeout=settings.HEATMAP_REFRESH_SECONDS)
@@ -0,0 +1,151 @@
+"""
+Write-behind persistence for courier location pings.
+
+CourierLocationConsumer only appends pings to a Redis stream; this worker
+reads them in batches through a consumer group and writes courier positions
+with one bulk_update and tracking points with one bulk_create per batch.
+"""
+import logging
+from datetime import datetime
+
+from django.contrib.gis.geos import Point
+from django.db import DatabaseError, transaction
+from redis.exceptions import RedisError, ResponseError
+
+from users.models import CourierProfile
+from . import heatmap
+from .geo_index import update_positions
+from .models import DeliveryTracking
+from .streams import LOCATION_STREAM, get_redis
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_GROUP = "location-writer"
+
+# Entries that could not be stored (e.g. their delivery was deleted) are kept
+# here for inspection instead of blocking the stream
+DEAD_LETTER_STREAM = "delivery:locations:dead"
+DEAD_LETTER_MAXLEN = 10000
+
+
+def ensure_consumer_group(client, group=CONSUMER_GROUP):
+    try:
+        client.xgroup_create(LOCATION_STREAM, group, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def parse_delivery_ids(fields):
+    return [int(delivery_id) for delivery_id in fields.get("delivery_ids", "").split(",") if delivery_id]
+
+
+def parse_ping(fields):
+    return {
+        "courier_id": int(fields["courier_id"]),
+        "point": Point(float(fields["lng"]), float(fields["lat"]), srid=4326),
+        "timestamp": datetime.fromisoformat(fields["timestamp"]),
+        "delivery_ids": parse_delivery_ids(fields),
+    }
+
+
+def persist_pings(pings):
+    """Store a batch of pings: latest position per courier plus tracking points"""
+    latest = {}
+    for ping in pings:
+        current = latest.get(ping["courier_id"])
+        if current is None or ping["timestamp"] >= current["timestamp"]:
+            latest[ping["courier_id"]] = ping
+
+    with transaction.atomic():
+        CourierProfile.objects.bulk_update(
+            [CourierProfile(id=courier_id, current_location=ping["point"]) for courier_id, ping in latest.items()],
+            ["current_location"],
+        )
+        DeliveryTracking.objects.bulk_create([
+            DeliveryTracking(
+                delivery_id=delivery_id,
+                courier_id=ping["courier_id"],
+                current_location=ping["point"],
+                last_updated=ping["timestamp"],
+            )
+            for ping in pings
+            for delivery_id in ping["delivery_ids"]
+        ])
+
+    positions = {courier_id: ping["point"].coords for courier_id, ping in latest.items()}
+    sync_index(update_positions, positions)
+    sync_index(heatmap.update_positions, positions)
+
+
+def sync_index(func, positions):
+    """
+    Update a Redis index after the batch has committed. A failure is only
+    logged: raising would skip the ack and replay (duplicate) stored pings,
+    and the periodic rebuild tasks (rebuild_courier_geo_index,
+    rebuild_heatmap_grid) repair the drift.
+    """
+    try:
+        func(positions)
+    except RedisError:
+        logger.warning(f"Redis index update {func.__module__}.{func.__name__} failed", exc_info=True)
+
+
+def read_batch(client, consumer, count, block_ms, pending=False, group=CONSUMER_GROUP):
+    """Read up to ``count`` entries; ``pending`` re-reads ones delivered but never acked"""
+    response = client.xreadgroup(
+        group, consumer, {LOCATION_STREAM: "0" if pending else ">"}, count=count, block=None if pending else block_ms
+    )
+    return response[0][1] if response else []
+
+
+def process_batch(client, consumer, count, block_ms, pending=False):
+    """Persist one batch from the stream and acknowledge it. Returns the number of entries"""
+    entries = read_batch(client, consumer, count, block_ms, pending=pending)
+    if not entries:
+        return 0
+
+    parsed = []
+    for entry_id, fields in entries:
+        try:
+            parsed.append((entry_id, fields, parse_ping(fields)))
+        except (KeyError, ValueError):
+            logger.warning(f"Dropping malformed location ping {entry_id}: {fields}")
+
+    if parsed:
+        try:
+            persist_pings([ping for _, _, ping in parsed])
+        except DatabaseError:
+            # One bad row fails the whole batch; store what can be stored
+            logger.exception("Location batch failed, retrying ping by ping")
+            persist_one_by_one(client, parsed)
+
+    # Everything is acknowledged, stored or not, so a bad entry can't stall the stream
+    client.xack(LOCATION_STREAM, CONSUMER_GROUP, *[entry_id for entry_id, _ in entries])
+    return len(entries)
+
+
+def persist_one_by_one(client, parsed):
+    for entry_id, fields, ping in parsed:
+        try:
+            persist_pings([ping])
+        except DatabaseError as e:
+            logger.warning(f"Dead-lettering location ping {entry_id}: {e}")
+            client.xadd(
+                DEAD_LETTER_STREAM,
+                {**fields, "entry_id": entry_id, "error": str(e)[:500]},
+                maxlen=DEAD_LETTER_MAXLEN,
+                approximate=True,
+            )
+
+
+def run(consumer, count, block_ms):
+    client = get_redis()
+    ensure_consumer_group(client)
+
+    # Finish whatever this consumer read but did not acknowledge before a restart
+    while process_batch(client, consumer, count, block_ms, pending=True):
+        pass
+
+    while True:
+        process_batch(client, consumer, count, block_ms)
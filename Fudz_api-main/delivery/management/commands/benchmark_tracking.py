@@ -0,0 +1,175 @@
+"""
+Offline load test of the tracking websockets.
+
+N simulated couriers stream pings through CourierLocationConsumer while M
+subscribers per courier listen on DeliveryTrackingConsumer, all in this
+process via Channels' WebsocketCommunicator. By default it uses the
+in-memory channel layer and a local-memory cache, and skips the Redis
+location stream, so it needs neither Redis nor Postgres:
+
+    python manage.py benchmark_tracking --couriers 200 --subscribers 2 --pings 50
+"""
+import asyncio
+import json
+import time
+import tracemalloc
+from unittest import mock
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from delivery.routing import websocket_urlpatterns
+from delivery.tracking import active_delivery_key, delivery_context
+
+BASE_LAT = 6.5244
+BASE_LNG = 3.3792
+
+
+class SyntheticDelivery:
+    """Just enough of a DeliveryRequest for tracking.delivery_context"""
+
+    class Location:
+        def __init__(self, lng, lat):
+            self.coords = (lng, lat)
+
+    def __init__(self, courier_id):
+        self.id = courier_id
+        self.courier_id = courier_id
+        self.status = "picked_up"
+        self.pickup_location = self.Location(BASE_LNG, BASE_LAT)
+        self.dropoff_location = self.Location(BASE_LNG + 0.05, BASE_LAT + 0.05)
+        self.courier = mock.Mock(vehicle_type="motorcycle")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark CourierLocationConsumer -> DeliveryTrackingConsumer fan-out offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--couriers", type=int, default=100)
+        parser.add_argument("--subscribers", type=int, default=1, help="Tracking sockets per courier")
+        parser.add_argument("--pings", type=int, default=20, help="Pings per courier")
+        parser.add_argument("--interval", type=float, default=0.5, help="Seconds between a courier's pings")
+        parser.add_argument(
+            "--fanout-rate", type=float, default=None,
+            help="Override LOCATION_FANOUT_RATE (updates per second per group)",
+        )
+        parser.add_argument(
+            "--redis", action="store_true",
+            help="Use the configured channel layer, cache and location stream instead of in-memory ones",
+        )
+
+    def handle(self, *args, **options):
+        # The synthetic couriers barely move; measure every ping, not the movement filter
+        overrides = {"LOCATION_MIN_MOVE_METERS": 0, "LOCATION_MIN_INTERVAL_SECONDS": 0}
+        if not options["redis"]:
+            overrides["CHANNEL_LAYERS"] = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+            overrides["CACHES"] = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        if options["fanout_rate"]:
+            overrides["LOCATION_FANOUT_RATE"] = options["fanout_rate"]
+
+        with override_settings(**overrides):
+            if options["redis"]:
+                results = asyncio.run(self.benchmark(**options))
+            else:
+                with mock.patch("delivery.consumers.publish_location", new=mock.AsyncMock()):
+                    results = asyncio.run(self.benchmark(**options))
+
+        self.report(results, options)
+
+    async def benchmark(self, couriers, subscribers, pings, interval, **options):
+        application = URLRouter(websocket_urlpatterns)
+        sent_at = {}
+        latencies = []
+        last_received = [0.0]
+        publishing = asyncio.Event()
+
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+        courier_sockets = []
+        subscriber_sockets = []
+        for courier_id in range(1, couriers + 1):
+            cache.set(active_delivery_key(courier_id), [delivery_context(SyntheticDelivery(courier_id))])
+
+            socket = WebsocketCommunicator(application, f"/ws/courier/location/{courier_id}/")
+            await socket.connect()
+            await socket.receive_from()
+            courier_sockets.append((courier_id, socket))
+
+            for _ in range(subscribers):
+                socket = WebsocketCommunicator(application, f"/ws/delivery/track/{courier_id}/")
+                await socket.connect()
+                await socket.receive_from()
+                subscriber_sockets.append((courier_id, socket))
+
+        connections = len(courier_sockets) + len(subscriber_sockets)
+        memory_per_connection = (tracemalloc.get_traced_memory()[0] - memory_before) / connections
+        tracemalloc.stop()
+
+        async def courier(courier_id, socket):
+            for ping in range(pings):
+                # The position doubles as the ping's id on the subscriber side
+                lat = round(BASE_LAT + ping * 1e-5, 7)
+                sent_at[(courier_id, lat)] = time.perf_counter()
+                await socket.send_to(text_data=json.dumps({"lat": lat, "lng": BASE_LNG}))
+                await socket.receive_from()
+                await asyncio.sleep(interval)
+
+        async def subscriber(courier_id, socket):
+            while True:
+                try:
+                    frame = json.loads(await socket.receive_from(timeout=interval * 4 + 1))
+                except asyncio.TimeoutError:
+                    if not publishing.is_set():
+                        return
+                    continue
+                if frame.get("type") == "location_update":
+                    started = sent_at.get((courier_id, round(frame["lat"], 7)))
+                    if started is not None:
+                        last_received[0] = time.perf_counter()
+                        latencies.append(last_received[0] - started)
+
+        publishing.set()
+        started = time.perf_counter()
+        listeners = [asyncio.create_task(subscriber(*entry)) for entry in subscriber_sockets]
+        await asyncio.gather(*(courier(*entry) for entry in courier_sockets))
+        published = time.perf_counter()
+        publishing.clear()
+        await asyncio.gather(*listeners)
+        # The listeners idle for a while before giving up; don't count that
+        elapsed = max(last_received[0], published) - started
+
+        for _, socket in courier_sockets + subscriber_sockets:
+            await socket.disconnect()
+
+        return {
+            "connections": connections,
+            "pings": len(sent_at),
+            "delivered": len(latencies),
+            "elapsed": elapsed,
+            "latencies": latencies,
+            "memory_per_connection": memory_per_connection,
+        }
+
+    def report(self, results, options):
+        latencies = results["latencies"]
+        expected = results["pings"] * options["subscribers"]
+        self.stdout.write(f"📊 {options['couriers']} couriers x {options['subscribers']} subscribers, "
+                          f"{results['connections']} connections")
+        self.stdout.write(f"   pings sent:          {results['pings']}")
+        self.stdout.write(f"   updates delivered:   {results['delivered']} of {expected} "
+                          f"({expected - results['delivered']} coalesced or dropped)")
+        self.stdout.write(f"   throughput:          {(results['pings'] + results['delivered']) / results['elapsed']:.0f} msg/s")
+        self.stdout.write(f"   latency p50 / p99:   {percentile(latencies, 0.5) * 1000:.1f} / "
+                          f"{percentile(latencies, 0.99) * 1000:.1f} ms")
+        self.stdout.write(f"   memory/connection:   {results['memory_per_connection'] / 1024:.1f} KiB")
@@ -0,0 +1,26 @@
+import socket
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from delivery.ingestion import run
+
+
+class Command(BaseCommand):
+    help = "Persist courier location pings from the Redis stream in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.LOCATION_INGEST_BATCH_SIZE)
+        parser.add_argument("--block-ms", type=int, default=1000, help="How long to wait for new pings")
+        parser.add_argument(
+            "--consumer",
+            default=socket.gethostname(),
+            help="Consumer name in the group; keep it stable so unacked pings are retried on restart",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"📍 Ingesting courier locations as {options['consumer']}")
+        try:
+            run(options["consumer"], options["batch_size"], options["block_ms"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
@@ -0,0 +1,201 @@
+"""
+Replay deliveries through dispatch strategies in virtual time.
+
+Historical mode takes the DeliveryRequests of orders placed in the window,
+with the couriers who carried them starting from their first
+DeliveryTracking position (or current location). Synthetic mode draws
+orders and couriers around a centre point, so it needs no data at all:
+
+    python manage.py simulate_dispatch --since 2026-10-01 --until 2026-10-08
+    python manage.py simulate_dispatch --synthetic --orders 2000 --couriers 150 --strategy batch,nearest
+
+Strategies are the names in delivery.simulation.STRATEGIES or dotted paths
+to a callable with the same signature.
+"""
+import math
+import random
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.module_loading import import_string
+
+from users.models import CourierProfile
+from delivery.models import DeliveryRequest, DeliveryTracking
+from delivery.simulation import STRATEGIES, SimCourier, SimDelivery, simulate
+
+BASE_LAT = 6.5244
+BASE_LNG = 3.3792
+
+# Roughly 1 km in degrees near the equator
+KM_DEGREES = 1 / 111.32
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+    help = "Replay historical or synthetic deliveries through dispatch strategies offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strategy", default="batch,nearest",
+            help="Comma-separated strategy names or dotted paths (default: batch,nearest)",
+        )
+        parser.add_argument("--since", help="First day of orders to replay (YYYY-MM-DD, default: 7 days ago)")
+        parser.add_argument("--until", help="Day after the last one to replay (YYYY-MM-DD, default: today)")
+        parser.add_argument("--synthetic", action="store_true", help="Generate orders and couriers instead")
+        parser.add_argument("--orders", type=int, default=1000, help="Synthetic orders")
+        parser.add_argument(
+            "--couriers", type=int, default=None,
+            help="Synthetic fleet size (in historical mode, replaces the historical couriers)",
+        )
+        parser.add_argument("--hours", type=float, default=4, help="Synthetic orders are placed over this many hours")
+        parser.add_argument("--radius-km", type=float, default=8, help="Synthetic points lie within this radius")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--tick", type=int, default=30, help="Virtual seconds between dispatch rounds")
+        parser.add_argument(
+            "--prep-minutes", type=float, default=None,
+            help="Order ready this long after it is placed (default: DEFAULT_PREP_TIME_MINUTES)",
+        )
+        parser.add_argument("--service-minutes", type=float, default=2, help="Time spent at each stop")
+
+    def handle(self, *args, **options):
+        strategies = [self.load_strategy(name.strip()) for name in options["strategy"].split(",") if name.strip()]
+        rng = random.Random(options["seed"])
+        prep_seconds = (options["prep_minutes"] or settings.DEFAULT_PREP_TIME_MINUTES) * 60
+
+        for name, strategy in strategies:
+            # Every strategy gets the same, untouched timeline
+            rng.seed(options["seed"])
+            if options["synthetic"]:
+                deliveries, couriers = self.synthetic(rng, prep_seconds, **options)
+            else:
+                deliveries, couriers = self.historical(rng, prep_seconds, **options)
+            if not deliveries:
+                raise CommandError("No deliveries to replay")
+
+            results = simulate(
+                deliveries, couriers, strategy,
+                tick=options["tick"], service_seconds=options["service_minutes"] * 60,
+            )
+            self.report(name, results, len(couriers))
+
+    def load_strategy(self, name):
+        if name in STRATEGIES:
+            return name, STRATEGIES[name]
+        try:
+            return name, import_string(name)
+        except ImportError as e:
+            raise CommandError(f"Unknown strategy {name!r}: {e}")
+
+    def random_point(self, rng, radius_km):
+        """Uniform over a disc of ``radius_km`` around the centre"""
+        distance = radius_km * math.sqrt(rng.random()) * KM_DEGREES
+        angle = rng.uniform(0, math.tau)
+        return (BASE_LNG + distance * math.cos(angle), BASE_LAT + distance * math.sin(angle))
+
+    def synthetic(self, rng, prep_seconds, orders, couriers, hours, radius_km, **options):
+        deliveries = []
+        for delivery_id in range(1, orders + 1):
+            placed_at = rng.uniform(0, hours * 3600)
+            deliveries.append(SimDelivery(
+                id=delivery_id,
+                pickup=self.random_point(rng, radius_km),
+                dropoff=self.random_point(rng, radius_km),
+                placed_at=placed_at,
+                ready_at=placed_at + prep_seconds,
+            ))
+        fleet = [self.random_point(rng, radius_km) for _ in range(couriers or max(orders // 10, 1))]
+        return deliveries, self.synthetic_fleet(rng, fleet)
+
+    def synthetic_fleet(self, rng, positions):
+        vehicles = ["bike", "motorcycle", "car"]
+        return [
+            SimCourier(id=courier_id, position=position, vehicle_type=rng.choice(vehicles))
+            for courier_id, position in enumerate(positions, start=1)
+        ]
+
+    def historical(self, rng, prep_seconds, since, until, couriers, **options):
+        today = timezone.localdate()
+        since = parse_date(since) if since else today - timedelta(days=7)
+        until = parse_date(until) if until else today + timedelta(days=1)
+        if since is None or until is None:
+            raise CommandError("--since/--until must be YYYY-MM-DD")
+        start = timezone.make_aware(datetime.combine(since, dt_time.min))
+        end = timezone.make_aware(datetime.combine(until, dt_time.min))
+
+        rows = (
+            DeliveryRequest.objects.filter(
+                order__placed_at__gte=start,
+                order__placed_at__lt=end,
+                pickup_location__isnull=False,
+                dropoff_location__isnull=False,
+            )
+            .values_list("id", "courier_id", "pickup_location", "dropoff_location", "order__placed_at")
+            .order_by("order__placed_at")
+        )
+        deliveries = []
+        courier_ids = set()
+        for delivery_id, courier_id, pickup, dropoff, placed_at in rows.iterator():
+            placed_ts = placed_at.timestamp()
+            deliveries.append(SimDelivery(
+                id=delivery_id,
+                pickup=pickup.coords,
+                dropoff=dropoff.coords,
+                placed_at=placed_ts,
+                ready_at=placed_ts + prep_seconds,
+            ))
+            if courier_id:
+                courier_ids.add(courier_id)
+
+        if couriers:
+            # A hypothetical fleet, starting at random pickups of the window
+            if not deliveries:
+                return deliveries, []
+            return deliveries, self.synthetic_fleet(rng, [rng.choice(deliveries).pickup for _ in range(couriers)])
+
+        # Each courier starts where they were first seen in the window
+        first_seen = {}
+        tracking = (
+            DeliveryTracking.objects.filter(courier_id__in=courier_ids, last_updated__gte=start, last_updated__lt=end)
+            .order_by("courier_id", "last_updated")
+            .distinct("courier_id")
+            .values_list("courier_id", "current_location")
+        )
+        for courier_id, point in tracking:
+            first_seen[courier_id] = point.coords
+
+        fleet = []
+        for courier_id, vehicle_type, location, stats in CourierProfile.objects.filter(id__in=courier_ids).values_list(
+            "id", "vehicle_type", "current_location", "performance_stats"
+        ):
+            position = first_seen.get(courier_id) or (location.coords if location else None)
+            if position:
+                fleet.append(SimCourier(
+                    id=courier_id, position=position, vehicle_type=vehicle_type, performance_stats=stats or {},
+                ))
+        return deliveries, fleet
+
+    def report(self, name, results, couriers):
+        latencies = results["latencies"]
+        pickup_km = results["pickup_km"]
+        calls = results["strategy_calls"]
+        self.stdout.write(f"📊 {name}: {results['deliveries']} deliveries, {couriers} couriers, "
+                          f"{results['virtual_hours']:.1f} virtual hours")
+        self.stdout.write(f"   assigned:             {results['assigned']} "
+                          f"({results['deliveries'] - results['assigned']} never assigned)")
+        self.stdout.write(f"   assignment latency:   p50 {percentile(latencies, 0.5) / 60:.1f} / "
+                          f"p95 {percentile(latencies, 0.95) / 60:.1f} min")
+        self.stdout.write(f"   pickup distance:      mean {sum(pickup_km) / max(len(pickup_km), 1):.2f} / "
+                          f"p95 {percentile(pickup_km, 0.95):.2f} km")
+        self.stdout.write(f"   courier utilization:  {results['utilization']:.0%}")
+        self.stdout.write(f"   strategy wall time:   {results['strategy_seconds'] * 1000:.1f} ms over {calls} rounds "
+                          f"({results['strategy_seconds'] * 1000 / max(calls, 1):.2f} ms/round, "
+                          f"{results['assigned'] / max(results['strategy_seconds'], 1e-9):.0f} assignments/s)")
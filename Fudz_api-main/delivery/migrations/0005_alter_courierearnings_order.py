@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("delivery", "0004_courierearnings_commission_rate"),
+        ("orders", "0007_archivedorder"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="courierearnings",
+            name="order",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                to="orders.order",
+            ),
+        ),
+    ]
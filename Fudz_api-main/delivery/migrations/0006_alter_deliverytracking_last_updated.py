@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("delivery", "0005_alter_courierearnings_order"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="deliverytracking",
+            name="last_updated",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
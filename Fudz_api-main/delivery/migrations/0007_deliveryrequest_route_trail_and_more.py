@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("delivery", "0006_alter_deliverytracking_last_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deliveryrequest",
+            name="route_trail",
+            field=django.contrib.gis.db.models.fields.LineStringField(
+                blank=True, null=True, srid=4326
+            ),
+        ),
+        migrations.AddField(
+            model_name="deliveryrequest",
+            name="trail_compacted_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="deliverytracking",
+            index=models.Index(
+                fields=["delivery", "last_updated"], name="tracking_delivery_time_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("delivery", "0007_deliveryrequest_route_trail_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="deliveryrequest",
+            index=django.contrib.postgres.indexes.GistIndex(
+                condition=models.Q(("status", "pending")),
+                fields=["pickup_location"],
+                name="delivery_pending_pickup_gist",
+            ),
+        ),
+    ]
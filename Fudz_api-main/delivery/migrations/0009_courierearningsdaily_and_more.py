@@ -0,0 +1,87 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+REMOVE_DUPLICATE_EARNINGS = """
+DELETE FROM delivery_courierearnings a
+USING delivery_courierearnings b
+WHERE a.courier_id = b.courier_id AND a.order_id = b.order_id AND a.id > b.id;
+"""
+
+
+def backfill_rollups_and_balances(apps, schema_editor):
+    CourierEarnings = apps.get_model("delivery", "CourierEarnings")
+    CourierEarningsDaily = apps.get_model("delivery", "CourierEarningsDaily")
+    CourierProfile = apps.get_model("users", "CourierProfile")
+
+    daily = (
+        CourierEarnings.objects.annotate(day=TruncDate("created_at"))
+        .values("courier_id", "day")
+        .annotate(amount=Sum("amount"), deliveries=Count("id"))
+    )
+    CourierEarningsDaily.objects.bulk_create(
+        [CourierEarningsDaily(**row) for row in daily], batch_size=1000
+    )
+
+    totals = CourierEarnings.objects.values("courier_id").annotate(total=Sum("amount"))
+    for row in totals.iterator():
+        CourierProfile.objects.filter(id=row["courier_id"]).update(earnings_balance=row["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("delivery", "0008_deliveryrequest_delivery_pending_pickup_gist"),
+        ("users", "0006_notificationpreference"),
+    ]
+
+    operations = [
+        migrations.RunSQL(REMOVE_DUPLICATE_EARNINGS, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name="courierearnings",
+            constraint=models.UniqueConstraint(
+                fields=("courier", "order"), name="unique_courier_order_earning"
+            ),
+        ),
+        migrations.CreateModel(
+            name="CourierEarningsDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("deliveries", models.PositiveIntegerField(default=0)),
+                (
+                    "courier",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_earnings",
+                        to="users.courierprofile",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-day"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("courier", "day"), name="unique_courier_earnings_day"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups_and_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("delivery", "0009_courierearningsdaily_and_more"),
+        ("users", "0006_notificationpreference"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeliveryBatch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("active", "Active"), ("completed", "Completed")],
+                        default="active",
+                        max_length=20,
+                    ),
+                ),
+                ("stops", models.JSONField(default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "courier",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="delivery_batches",
+                        to="users.courierprofile",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="deliveryrequest",
+            name="batch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="deliveries",
+                to="delivery.deliverybatch",
+            ),
+        ),
+    ]
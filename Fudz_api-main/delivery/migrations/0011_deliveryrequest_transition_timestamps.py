@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_delivery_counts(apps, schema_editor):
+    """
+    Seed total_deliveries from history. The performance_stats counters start
+    from zero: past deliveries have no transition timestamps, so their
+    on-time and acceptance record can't be reconstructed, and seeding only
+    "delivered" would read as a 0% on-time rate.
+    """
+    DeliveryRequest = apps.get_model("delivery", "DeliveryRequest")
+    CourierProfile = apps.get_model("users", "CourierProfile")
+
+    delivered = (
+        DeliveryRequest.objects.filter(status="delivered", courier__isnull=False)
+        .values("courier_id")
+        .annotate(total=Count("id"))
+    )
+    for row in delivered.iterator():
+        CourierProfile.objects.filter(id=row["courier_id"]).update(total_deliveries=row["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("delivery", "0010_deliverybatch_deliveryrequest_batch"),
+        ("users", "0006_notificationpreference"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deliveryrequest",
+            name="accepted_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="deliveryrequest",
+            name="declined_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="deliveryrequest",
+            name="picked_up_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="deliveryrequest",
+            name="delivered_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="deliveryrequest",
+            name="cancelled_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_delivery_counts, migrations.RunPython.noop),
+    ]
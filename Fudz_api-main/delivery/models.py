@@ -1,10 +1,29 @@
 from decimal import Decimal
+from django.contrib.postgres.indexes import GistIndex
 from django.db import models
 from django.contrib.gis.db import models as gis_models
 from django.utils import timezone
 from users.models import CourierProfile
 from orders.models import Order
 
+class DeliveryBatch(models.Model):
+    """Several deliveries carried by one courier on a single planned route"""
+    STATUS_CHOICES = [
+        ("active", "Active"),
+        ("completed", "Completed"),
+    ]
+
+    courier = models.ForeignKey(CourierProfile, on_delete=models.CASCADE, related_name="delivery_batches")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
+    # Ordered route: [{"delivery_id", "kind": "pickup" | "dropoff", "lng", "lat"}, ...]
+    stops = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Batch #{self.id} ({self.courier}) - {self.status}"
+
+
 class DeliveryRequest(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -19,16 +38,75 @@ class DeliveryRequest(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="delivery_request")
     courier = models.ForeignKey(CourierProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name="deliveries")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    batch = models.ForeignKey(DeliveryBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name="deliveries")
 
     pickup_location = gis_models.PointField(geography=True, null=True, blank=True)
     dropoff_location = gis_models.PointField(geography=True, null=True, blank=True)
 
     assigned_at = models.DateTimeField(null=True, blank=True)
+    # Time of the latest transition into each status (see save)
+    accepted_at = models.DateTimeField(null=True, blank=True)
+    declined_at = models.DateTimeField(null=True, blank=True)
+    picked_up_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Simplified GPS trail, written by delivery.tasks.compact_delivery_trails
+    # once the delivery is finished; raw DeliveryTracking points are then purged
+    route_trail = gis_models.LineStringField(srid=4326, null=True, blank=True)
+    trail_compacted_at = models.DateTimeField(null=True, blank=True)
+
+    ACTIVE_STATUSES = ["assigned", "accepted", "picked_up"]
+    FINISHED_STATUSES = ["delivered", "cancelled"]
+    # assigned_at is set by assign_to
+    TRANSITION_FIELDS = {
+        "accepted": "accepted_at",
+        "declined": "declined_at",
+        "picked_up": "picked_up_at",
+        "delivered": "delivered_at",
+        "cancelled": "cancelled_at",
+    }
+
+    class Meta:
+        indexes = [
+            # Serves the couriers' nearby-deliveries radius search and KNN ordering
+            GistIndex(
+                fields=["pickup_location"],
+                condition=models.Q(status="pending"),
+                name="delivery_pending_pickup_gist",
+            ),
+        ]
+
     def __str__(self):
         return f"Delivery for Order #{self.order.id} - {self.status}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get("status")
+        instance._loaded_courier_id = instance.__dict__.get("courier_id")
+        return instance
+
+    @property
+    def previous_status(self):
+        """Status as last loaded from / saved to the database"""
+        return getattr(self, "_loaded_status", None)
+
+    @property
+    def previous_courier_id(self):
+        return getattr(self, "_loaded_courier_id", None)
+
+    def save(self, *args, **kwargs):
+        field = self.TRANSITION_FIELDS.get(self.status)
+        if field and self.status != self.previous_status:
+            setattr(self, field, timezone.now())
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], field}
+        super().save(*args, **kwargs)
+        self._loaded_status = self.status
+        self._loaded_courier_id = self.courier_id
+
     def assign_to(self, courier):
         self.courier = courier
         self.status = "assigned"
@@ -45,22 +123,50 @@ class DeliveryTracking(models.Model):
     delivery = models.ForeignKey(DeliveryRequest, on_delete=models.CASCADE, related_name="tracking")
     courier = models.ForeignKey(CourierProfile, on_delete=models.CASCADE)
     current_location = gis_models.PointField(geography=True)
-    last_updated = models.DateTimeField(auto_now=True)
+    # Time of the GPS ping; set by the ingestion worker, which writes in batches
+    last_updated = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-last_updated']
+        indexes = [
+            models.Index(fields=["delivery", "last_updated"], name="tracking_delivery_time_idx"),
+        ]
 
 
 
 class CourierEarnings(models.Model):
     courier = models.ForeignKey(CourierProfile, on_delete=models.CASCADE, related_name='earnings')
-    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    # Earnings outlive the order row once it is moved to orders.ArchivedOrder
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     commission_rate = models.DecimalField(max_digits=5, decimal_places=2, default=10.00)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Append-only ledger: one entry per delivered order and courier
+            models.UniqueConstraint(fields=["courier", "order"], name="unique_courier_order_earning"),
+        ]
     
     
     def calculate_amount(self, order_total):
         """Calculate earnings after platform commission."""
         commission = (Decimal(self.commission_rate) / 100) * order_total
         return order_total - commission
+
+
+class CourierEarningsDaily(models.Model):
+    """Per-courier daily totals of CourierEarnings, maintained as entries are recorded"""
+    courier = models.ForeignKey(CourierProfile, on_delete=models.CASCADE, related_name="daily_earnings")
+    day = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    deliveries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(fields=["courier", "day"], name="unique_courier_earnings_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.courier} - {self.day}: {self.amount}"
@@ -0,0 +1,28 @@
+"""
+Movement-threshold filtering of location pings.
+
+Devices resend their position every second or so even when standing still.
+A ping is only accepted (stored, published and broadcast) when it moved far
+enough from the last accepted position and enough time has passed since it,
+or as a heartbeat once LOCATION_HEARTBEAT_SECONDS go by without one. The
+last accepted position is the one the consumers already keep in the cache.
+"""
+from datetime import datetime
+
+from django.conf import settings
+
+from .eta import haversine_km
+
+
+def should_accept(last, lat, lng, timestamp):
+    """Whether a ping at ``timestamp`` (ISO string) supersedes ``last``, the cached {"lat", "lng", "timestamp"}"""
+    if not last:
+        return True
+
+    elapsed = (datetime.fromisoformat(timestamp) - datetime.fromisoformat(last["timestamp"])).total_seconds()
+    if elapsed >= settings.LOCATION_HEARTBEAT_SECONDS:
+        return True
+    if elapsed < settings.LOCATION_MIN_INTERVAL_SECONDS:
+        return False
+    moved_m = haversine_km((last["lng"], last["lat"]), (lng, lat)) * 1000
+    return moved_m >= settings.LOCATION_MIN_MOVE_METERS
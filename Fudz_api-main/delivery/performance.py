@@ -0,0 +1,102 @@
+"""
+Incremental courier performance statistics.
+
+Every delivery status transition (delivery.signals) folds into the
+courier's CourierProfile.performance_stats counters under a row lock, and
+the derived rates and averages are stored next to them. Dispatch scoring
+and the admin read the precomputed numbers instead of aggregating
+delivery history.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from users.models import CourierProfile
+
+COUNTERS = [
+    "offered", "accepted", "declined", "cancelled", "delivered", "on_time",
+    "pickup_seconds", "pickups", "drop_seconds", "drops",
+]
+
+
+def seconds_between(start, end):
+    if start is None or end is None:
+        return None
+    return max((end - start).total_seconds(), 0)
+
+
+def transition_counts(delivery):
+    """Counter increments for the transition ``delivery`` was just saved with"""
+    status = delivery.status
+    counts = {}
+    if status == "assigned":
+        counts["offered"] = 1
+    elif status in ("accepted", "declined", "cancelled"):
+        counts[status] = 1
+    elif status == "picked_up":
+        pickup = seconds_between(delivery.accepted_at or delivery.assigned_at, delivery.picked_up_at)
+        if pickup is not None:
+            counts.update(pickup_seconds=pickup, pickups=1)
+    elif status == "delivered":
+        counts["delivered"] = 1
+        took = seconds_between(delivery.accepted_at or delivery.assigned_at, delivery.delivered_at)
+        if took is not None and took <= settings.COURIER_ON_TIME_MINUTES * 60:
+            counts["on_time"] = 1
+        drop = seconds_between(delivery.picked_up_at, delivery.delivered_at)
+        if drop is not None:
+            counts.update(drop_seconds=drop, drops=1)
+    return counts
+
+
+def derive(stats):
+    """Add the rates and averages readers use to raw counters"""
+    def ratio(part, whole):
+        return round(stats[part] / stats[whole], 4) if stats[whole] else None
+
+    stats["acceptance_rate"] = ratio("accepted", "offered")
+    stats["decline_rate"] = ratio("declined", "offered")
+    stats["on_time_rate"] = ratio("on_time", "delivered")
+    stats["avg_pickup_seconds"] = ratio("pickup_seconds", "pickups")
+    stats["avg_drop_seconds"] = ratio("drop_seconds", "drops")
+    return stats
+
+
+def record_transition(delivery):
+    """Fold a delivery's status change into its courier's performance stats"""
+    # A decline clears the courier right after the status is saved
+    courier_id = delivery.courier_id or delivery.previous_courier_id
+    counts = transition_counts(delivery)
+    if courier_id is None or not counts:
+        return
+
+    with transaction.atomic():
+        stats = (
+            CourierProfile.objects.select_for_update()
+            .filter(id=courier_id)
+            .values_list("performance_stats", flat=True)
+            .first()
+        )
+        if stats is None:
+            return
+        stats = {counter: stats.get(counter, 0) for counter in COUNTERS}
+        for counter, value in counts.items():
+            stats[counter] += value
+
+        # .update() so the geo index / heatmap signals don't fire for a stats change
+        update = {"performance_stats": derive(stats)}
+        if "delivered" in counts:
+            update["total_deliveries"] = F("total_deliveries") + 1
+        CourierProfile.objects.filter(id=courier_id).update(**update)
+
+
+def dispatch_penalty_km(stats):
+    """
+    Extra pickup km a courier's record costs in dispatch scoring: missed
+    on-time deliveries and declined offers, once there are enough of them to go on
+    """
+    if not stats or stats.get("offered", 0) < settings.DISPATCH_STATS_MIN_OFFERS:
+        return 0.0
+    penalty = (stats.get("decline_rate") or 0) * settings.DISPATCH_DECLINE_PENALTY_KM
+    if stats.get("on_time_rate") is not None:
+        penalty += (1 - stats["on_time_rate"]) * settings.DISPATCH_LATE_PENALTY_KM
+    return penalty
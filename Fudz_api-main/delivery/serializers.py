@@ -2,8 +2,10 @@ from rest_framework import serializers
 
 from django.contrib.gis.geos import Point
 
+from .eta import get_delivery_eta
 from .models import DeliveryRequest, CourierEarnings
 from users.serializers import UserProfileSerializer
+from orders.models import Order
 from orders.serializers import OrderSerializer 
 
 class DeliveryRequestSerializer(serializers.ModelSerializer):
@@ -17,6 +19,7 @@ class DeliveryRequestSerializer(serializers.ModelSerializer):
 
     pickup_coords = serializers.SerializerMethodField()
     dropoff_coords = serializers.SerializerMethodField()
+    eta = serializers.SerializerMethodField()
 
     class Meta:
         model = DeliveryRequest
@@ -32,9 +35,13 @@ class DeliveryRequestSerializer(serializers.ModelSerializer):
             "dropoff_latitude",
             "dropoff_longitude",
             "assigned_at",
+            "accepted_at",
+            "picked_up_at",
+            "delivered_at",
             "updated_at",
+            "eta",
         ]
-        read_only_fields = ["id", "assigned_at", "updated_at"]
+        read_only_fields = ["id", "assigned_at", "accepted_at", "picked_up_at", "delivered_at", "updated_at"]
 
     def create(self, validated_data):
         pickup_lat = validated_data.pop("pickup_latitude", None)
@@ -59,6 +66,36 @@ class DeliveryRequestSerializer(serializers.ModelSerializer):
             return {"latitude": obj.dropoff_location.y, "longitude": obj.dropoff_location.x}
         return None
 
+    def get_eta(self, obj):
+        """Cached estimate kept current by courier location pings"""
+        if obj.status in DeliveryRequest.ACTIVE_STATUSES:
+            return get_delivery_eta(obj.id)
+        return None
+
+
+class NearbyDeliverySerializer(serializers.ModelSerializer):
+    """Lean listing for couriers browsing pending deliveries (no nested order)"""
+    restaurant_name = serializers.CharField(source="order.restaurant.restaurant_name", read_only=True)
+    distance = serializers.SerializerMethodField()
+    pickup_coords = serializers.SerializerMethodField()
+    dropoff_coords = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeliveryRequest
+        fields = ["id", "order_id", "restaurant_name", "distance", "pickup_coords", "dropoff_coords", "updated_at"]
+
+    def get_distance(self, obj):
+        """Metres from the courier to the pickup"""
+        return round(obj.distance)
+
+    def get_pickup_coords(self, obj):
+        return {"latitude": obj.pickup_location.y, "longitude": obj.pickup_location.x}
+
+    def get_dropoff_coords(self, obj):
+        if obj.dropoff_location:
+            return {"latitude": obj.dropoff_location.y, "longitude": obj.dropoff_location.x}
+        return None
+
 
 class DeliveryStatusUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -67,10 +104,17 @@ class DeliveryStatusUpdateSerializer(serializers.ModelSerializer):
 
 
 class CourierEarningsSerializer(serializers.ModelSerializer):
-    order_id = serializers.IntegerField(source="order.id", read_only=True)
-    restaurant_name = serializers.CharField(source="order.restaurant.restaurant_name", read_only=True)
+    order_id = serializers.IntegerField(read_only=True)
+    restaurant_name = serializers.SerializerMethodField()
     date = serializers.DateTimeField(source="created_at", read_only=True)
 
     class Meta:
         model = CourierEarnings
         fields = ["order_id", "restaurant_name", "amount", "commission_rate", "date"]
+
+    def get_restaurant_name(self, obj):
+        try:
+            return obj.order.restaurant.restaurant_name
+        except Order.DoesNotExist:
+            # Order has been moved to the archive
+            return None
@@ -1,23 +1,98 @@
+import logging
 from decimal import Decimal
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from redis.exceptions import RedisError
 
-from .models import DeliveryRequest, CourierEarnings
+from orders.models import OrderItem
+from users.models import CourierProfile
+from .batching import push_route_positions
+from .earnings import record_earning
+from . import heatmap
+from .geo_index import AVAILABLE_COURIERS_KEY, index_courier
+from .models import DeliveryRequest
+from .performance import record_transition
+from .streams import get_redis
+from .tracking import refresh_active_deliveries
+
+logger = logging.getLogger(__name__)
+
+
+def sync_redis_on_commit(func, *args):
+    """
+    Run a Redis index update after commit without failing the save when Redis
+    is down; the periodic rebuild tasks reconcile what was missed
+    """
+    def sync():
+        try:
+            func(*args)
+        except RedisError:
+            logger.warning(f"Redis index update {func.__name__} failed", exc_info=True)
+
+    transaction.on_commit(sync)
 
 @receiver(post_save, sender=DeliveryRequest)
 def handle_delivery_completed(sender, instance, **kwargs):
-    if instance.status == "delivered" and instance.courier:
-        order = instance.order
-
-        total_amount = sum(item.unit_price * item.qty for item in order.items.all())
+    if instance.status == "delivered" and instance.previous_status != "delivered" and instance.courier_id:
+        total_amount = OrderItem.objects.filter(order_id=instance.order_id).aggregate(
+            total=Sum(F("unit_price") * F("qty"), output_field=DecimalField())
+        )["total"] or Decimal("0")
+        # The share is of what the customer paid, after any promo code
+        total_amount = max(total_amount - instance.order.promo_discount, Decimal("0"))
         earning_amount = total_amount * Decimal("0.8")  # 80% to courier, example split
 
-        if not CourierEarnings.objects.filter(order=order, courier=instance.courier).exists():
-            CourierEarnings.objects.create(
-                courier=instance.courier,
-                order=order,
-                amount=earning_amount
-            )
-            
-            instance.courier.save()
+        record_earning(instance.courier_id, instance.order_id, earning_amount.quantize(Decimal("0.01")))
+
+
+@receiver(post_save, sender=DeliveryRequest)
+def update_courier_performance(sender, instance, **kwargs):
+    if instance.status != instance.previous_status:
+        record_transition(instance)
+
+
+@receiver(post_save, sender=DeliveryRequest)
+def refresh_active_delivery(sender, instance, **kwargs):
+    """Keep the courier -> active deliveries cache used by location pings current"""
+    # robust: a cache or channel layer error is logged instead of raising out of
+    # the commit and skipping the callbacks queued after it
+    courier_ids = {instance.courier_id, instance.previous_courier_id} - {None}
+    for courier_id in courier_ids:
+        transaction.on_commit(lambda courier_id=courier_id: refresh_active_deliveries(courier_id), robust=True)
+
+    if instance.batch_id and instance.status != instance.previous_status:
+        # Bound now: a decline clears the batch before the transaction commits
+        batch_id = instance.batch_id
+        transaction.on_commit(lambda: push_route_positions(batch_id), robust=True)
+
+
+@receiver(post_save, sender=DeliveryRequest)
+def sync_heatmap_demand(sender, instance, **kwargs):
+    sync_redis_on_commit(heatmap.index_delivery, instance)
+
+
+@receiver(post_delete, sender=DeliveryRequest)
+def drop_delivery_from_heatmap(sender, instance, **kwargs):
+    sync_redis_on_commit(heatmap.move_members, heatmap.DEMAND_KEY, {instance.id: None})
+
+
+@receiver(post_save, sender=CourierProfile)
+def sync_courier_geo_index(sender, instance, **kwargs):
+    sync_redis_on_commit(index_courier, instance)
+
+
+@receiver(post_delete, sender=CourierProfile)
+def drop_courier_from_geo_index(sender, instance, **kwargs):
+    sync_redis_on_commit(get_redis().zrem, AVAILABLE_COURIERS_KEY, instance.id)
+
+
+@receiver(post_save, sender=CourierProfile)
+def sync_heatmap_supply(sender, instance, **kwargs):
+    sync_redis_on_commit(heatmap.index_courier, instance)
+
+
+@receiver(post_delete, sender=CourierProfile)
+def drop_courier_from_heatmap(sender, instance, **kwargs):
+    sync_redis_on_commit(heatmap.move_members, heatmap.SUPPLY_KEY, {instance.id: None})
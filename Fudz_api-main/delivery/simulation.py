@@ -0,0 +1,165 @@
+"""
+Offline dispatch simulation.
+
+Replays a timeline of deliveries against a fleet of couriers in virtual
+time: every ``tick`` seconds the strategy sees the deliveries that are
+dispatchable (order ready within DISPATCH_LEAD_MINUTES, as in
+delivery.dispatch) and the couriers that are free, and returns the pairs
+to assign. An assigned courier drives to the pickup, waits for the order
+if it isn't ready, drives to the dropoff and is free again there.
+
+A strategy is any callable ``strategy(deliveries, couriers)`` returning
+[(delivery_index, courier_index), ...]; see STRATEGIES. Nothing here
+touches the database, so the same timeline can be replayed through
+several strategies (management command simulate_dispatch).
+"""
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.conf import settings
+
+from .dispatch import UNREACHABLE, build_cost_matrix, haversine_matrix, solve_assignment
+from .eta import DEFAULT_SPEED_KMH, ROUTE_FACTOR, VEHICLE_SPEEDS_KMH
+from .performance import dispatch_penalty_km
+
+
+@dataclass
+class SimDelivery:
+    id: int
+    pickup: tuple
+    dropoff: tuple
+    # Virtual seconds: order placed, order ready for pickup
+    placed_at: float
+    ready_at: float
+    assigned_at: float = None
+    courier_id: int = None
+    pickup_km: float = None
+
+    @property
+    def dispatchable_at(self):
+        return max(self.placed_at, self.ready_at - settings.DISPATCH_LEAD_MINUTES * 60)
+
+
+@dataclass
+class SimCourier:
+    id: int
+    position: tuple
+    vehicle_type: str = "motorcycle"
+    # CourierProfile.performance_stats; empty means no track record, no penalty
+    performance_stats: dict = field(default_factory=dict)
+    free_at: float = 0.0
+    busy_seconds: float = 0.0
+    deliveries: list = field(default_factory=list)
+
+    @property
+    def speed_kmh(self):
+        return VEHICLE_SPEEDS_KMH.get(self.vehicle_type, DEFAULT_SPEED_KMH)
+
+
+def batch_strategy(deliveries, couriers):
+    """
+    dispatch_deliveries' matching: one Hungarian assignment over pickup
+    distance plus each courier's track-record penalty. It does not
+    reproduce candidate_couriers' pruning or DISPATCH_BATCHING; every free
+    courier is a candidate and each delivery is its own job.
+    """
+    cost = build_cost_matrix(
+        [delivery.pickup for delivery in deliveries],
+        [courier.position for courier in couriers],
+        penalties=[dispatch_penalty_km(courier.performance_stats) for courier in couriers],
+    )
+    return solve_assignment(cost)
+
+
+def nearest_strategy(deliveries, couriers):
+    """First come, first served: each delivery in turn takes the nearest free courier"""
+    distances = haversine_matrix(
+        [delivery.pickup for delivery in deliveries], [courier.position for courier in couriers]
+    )
+    distances[distances > settings.DISPATCH_RADIUS_KM] = UNREACHABLE
+    pairs = []
+    taken = np.zeros(len(couriers), dtype=bool)
+    for row in sorted(range(len(deliveries)), key=lambda i: deliveries[i].dispatchable_at):
+        candidates = np.where(taken, UNREACHABLE, distances[row])
+        col = int(np.argmin(candidates))
+        if candidates[col] < UNREACHABLE:
+            pairs.append((row, col))
+            taken[col] = True
+    return pairs
+
+
+STRATEGIES = {
+    "batch": batch_strategy,
+    "nearest": nearest_strategy,
+}
+
+
+def travel_seconds(km, courier):
+    return km * ROUTE_FACTOR / courier.speed_kmh * 3600
+
+
+def simulate(deliveries, couriers, strategy, tick=30, service_seconds=120):
+    """
+    Run ``deliveries`` through ``strategy`` with ``couriers``, mutating both.
+    Returns a dict of metrics (see Command.report in simulate_dispatch).
+    """
+    pending = deque(sorted(deliveries, key=lambda delivery: delivery.dispatchable_at))
+    waiting = []
+    strategy_seconds = 0.0
+    strategy_calls = 0
+    now = pending[0].dispatchable_at if pending else 0.0
+    start = now
+
+    while pending or waiting:
+        while pending and pending[0].dispatchable_at <= now:
+            waiting.append(pending.popleft())
+        free = [courier for courier in couriers if courier.free_at <= now]
+
+        pairs = []
+        if waiting and free:
+            started = time.perf_counter()
+            pairs = strategy(waiting, free)
+            strategy_seconds += time.perf_counter() - started
+            strategy_calls += 1
+
+            for row, col in pairs:
+                delivery, courier = waiting[row], free[col]
+                pickup_km = float(haversine_matrix([courier.position], [delivery.pickup])[0, 0])
+                drop_km = float(haversine_matrix([delivery.pickup], [delivery.dropoff])[0, 0])
+
+                at_pickup = now + travel_seconds(pickup_km, courier) + service_seconds
+                done = max(at_pickup, delivery.ready_at) + travel_seconds(drop_km, courier) + service_seconds
+
+                delivery.assigned_at, delivery.courier_id, delivery.pickup_km = now, courier.id, pickup_km
+                courier.busy_seconds += done - now
+                courier.free_at, courier.position = done, delivery.dropoff
+                courier.deliveries.append(delivery.id)
+
+            assigned = {row for row, _ in pairs}
+            waiting = [delivery for index, delivery in enumerate(waiting) if index not in assigned]
+
+        if not pending and waiting and not pairs and len(free) == len(couriers):
+            # Every courier is idle and still none can take what is left
+            break
+        if pending and not waiting:
+            # Nothing to dispatch until the next order is due; skip the idle ticks
+            now = max(now + tick, pending[0].dispatchable_at)
+        else:
+            now += tick
+
+    end = max([now] + [courier.free_at for courier in couriers])
+    assigned = [delivery for delivery in deliveries if delivery.assigned_at is not None]
+    horizon = max(end - start, 1)
+    return {
+        "deliveries": len(deliveries),
+        "assigned": len(assigned),
+        "latencies": [delivery.assigned_at - delivery.dispatchable_at for delivery in assigned],
+        "pickup_km": [delivery.pickup_km for delivery in assigned],
+        "utilization": sum(courier.busy_seconds for courier in couriers) / (horizon * max(len(couriers), 1)),
+        "virtual_hours": horizon / 3600,
+        "strategy_calls": strategy_calls,
+        "strategy_seconds": strategy_seconds,
+    }
+
@@ -0,0 +1,44 @@
+"""Raw Redis clients for the location stream (the Django cache API has no streams)"""
+import asyncio
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+LOCATION_STREAM = "delivery:locations"
+
+_client = None
+_async_clients = {}
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def get_async_redis():
+    """Async client for the running event loop (connections can't cross loops)"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return client
+
+
+async def publish_location(courier_id, lat, lng, timestamp, delivery_ids=()):
+    """Append a courier ping to the location stream for the ingestion worker"""
+    await get_async_redis().xadd(
+        LOCATION_STREAM,
+        {
+            "courier_id": courier_id,
+            "lat": lat,
+            "lng": lng,
+            "timestamp": timestamp,
+            # Several when the courier carries a batch
+            "delivery_ids": ",".join(str(delivery_id) for delivery_id in delivery_ids),
+        },
+        maxlen=settings.LOCATION_STREAM_MAXLEN,
+        approximate=True,
+    )
@@ -1,12 +1,19 @@
+from datetime import timedelta
+
 from celery import shared_task
 
-from django.contrib.gis.db.models.functions import Distance
+from django.conf import settings
 from django.contrib.gis.geos import Point
 from django.utils import timezone
 
-from users.models import CourierProfile
+from orders.eta import get_ready_eta
 from orders.models import Order
-from .models import DeliveryRequest
+from .dispatch import dispatch_deliveries
+from .geo_index import rebuild_index
+from .heatmap import rebuild_heatmap
+from .models import DeliveryRequest, DeliveryTracking
+from .trails import compact_trail
+
 
 @shared_task
 def auto_assign_courier(delivery_id):
@@ -19,29 +26,113 @@ def auto_assign_courier(delivery_id):
     if not delivery.pickup_location:
         return "Pickup location missing"
 
-    couriers = CourierProfile.objects.filter(is_available=True, current_location__isnull=False)
-    if not couriers.exists():
-        return "No available couriers"
-
-    nearby = couriers.annotate(distance=Distance("current_location", delivery.pickup_location)).order_by("distance")
+    ready_at = get_ready_eta(delivery.order_id)
+    if ready_at:
+        dispatch_at = ready_at - timedelta(minutes=settings.DISPATCH_LEAD_MINUTES)
+        if dispatch_at > timezone.now():
+            # Don't tie up a courier while the kitchen is still cooking
+            auto_assign_courier.apply_async(args=[delivery.id], eta=dispatch_at)
+            return f"Delivery {delivery.id} dispatch deferred until {dispatch_at.isoformat()}"
 
-    nearest = nearby.first()
-    if not nearest:
-        return "No courier found"
-    
-    delivery.courier = nearest
-    delivery.status = "assigned"
-    delivery.assigned_at = timezone.now()
-    delivery.save()
-    
-    order = delivery.order
-    order.courier = nearest
-    order.save()
+    # Goes through the batch matcher so it can't race dispatch_pending_deliveries
+    assigned = dispatch_deliveries([delivery.id])
+    if not assigned:
+        return f"Delivery {delivery.id} left for the next dispatch tick"
 
-    nearest.is_available = False
-    nearest.save()
+    _, courier = assigned[0]
 
     # (Optional) Send notification
-    # send_courier_notification(nearest.user, f"New delivery assigned (#{delivery.id})")
+    # send_courier_notification(courier.user, f"New delivery assigned (#{delivery.id})")
+
+    return f"Assigned courier {courier.user.username} to delivery {delivery.id}"
+
+
+@shared_task
+def dispatch_pending_deliveries():
+    """
+    Match every delivery waiting for a courier in one pass.
+    Run this every 15-30 seconds via Celery Beat
+    """
+    assigned = dispatch_deliveries()
+    print(f"✅ Dispatched {len(assigned)} deliveries")
+    return f"Dispatched {len(assigned)} deliveries"
+
+
+@shared_task
+def rebuild_courier_geo_index():
+    """
+    Reload the available-courier GEO index from Postgres.
+    Run this every few minutes via Celery Beat
+    """
+    count = rebuild_index()
+    print(f"✅ Indexed {count} available couriers")
+    return f"Indexed {count} available couriers"
+
+
+@shared_task
+def rebuild_heatmap_grid():
+    """
+    Reload the demand/supply heatmap counts from Postgres, correcting drift
+    from rows changed without signals. Run this every few minutes via Celery Beat
+    """
+    demand, supply = rebuild_heatmap()
+    print(f"✅ Heatmap rebuilt: {demand} waiting deliveries, {supply} available couriers")
+    return f"Heatmap rebuilt: {demand} waiting deliveries, {supply} available couriers"
+
+
+@shared_task
+def compact_delivery_trails(batch_size=200):
+    """
+    Simplify the GPS trails of finished deliveries into DeliveryRequest.route_trail.
+    Run this every few minutes via Celery Beat
+    """
+    total = 0
+    while True:
+        deliveries = list(
+            DeliveryRequest.objects.filter(
+                status__in=DeliveryRequest.FINISHED_STATUSES, trail_compacted_at__isnull=True
+            ).order_by("updated_at")[:batch_size]
+        )
+        if not deliveries:
+            break
+
+        now = timezone.now()
+        for delivery in deliveries:
+            points = delivery.tracking.order_by("last_updated").values_list("current_location", flat=True)
+            delivery.route_trail = compact_trail(points)
+            delivery.trail_compacted_at = now
+
+        # bulk_update: no signals, and updated_at keeps the last status change
+        DeliveryRequest.objects.bulk_update(deliveries, ["route_trail", "trail_compacted_at"])
+
+        total += len(deliveries)
+        if len(deliveries) < batch_size:
+            break
+
+    print(f"✅ Compacted {total} delivery trails")
+    return f"Compacted {total} delivery trails"
+
+
+@shared_task
+def purge_tracking_points(batch_size=5000):
+    """
+    Delete raw tracking points of trails compacted more than
+    TRACKING_RETENTION_DAYS ago. Run this daily via Celery Beat
+    """
+    cutoff = timezone.now() - timedelta(days=settings.TRACKING_RETENTION_DAYS)
+    total = 0
+    while True:
+        ids = list(
+            DeliveryTracking.objects.filter(delivery__trail_compacted_at__lt=cutoff)
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        DeliveryTracking.objects.filter(id__in=ids).delete()
+
+        total += len(ids)
+        if len(ids) < batch_size:
+            break
 
-    return f"Assigned courier {nearest.user.username} to delivery {delivery.id}"
+    print(f"✅ Purged {total} tracking points")
+    return f"Purged {total} tracking points"
@@ -1,3 +1,365 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError
+from redis.exceptions import RedisError
+from django.test import SimpleTestCase, override_settings
+
+from .batching import plan_route, remaining_stops, respects_precedence, route_length, route_position
+from . import geofence, ingestion, views
+from . import dispatch
+from .dispatch import UNREACHABLE, haversine_matrix, solve_assignment
+from .fanout import GroupCoalescer
+from .movement import should_accept
+from .performance import COUNTERS, derive, dispatch_penalty_km, transition_counts
+from .simulation import SimCourier, SimDelivery, batch_strategy
+
+
+class Location:
+    def __init__(self, lng, lat):
+        self.coords = (lng, lat)
+
+
+class Delivery:
+    def __init__(self, id, pickup, dropoff):
+        self.id = id
+        self.pickup_location = Location(*pickup)
+        self.dropoff_location = Location(*dropoff)
+
+
+def stop(delivery_id, kind):
+    return {"delivery_id": delivery_id, "kind": kind, "lng": 0, "lat": 0}
+
+
+class SolveAssignmentTests(SimpleTestCase):
+    def brute_force(self, cost):
+        rows, cols = len(cost), len(cost[0])
+        if rows <= cols:
+            return min(sum(cost[r][c] for r, c in enumerate(perm)) for perm in itertools.permutations(range(cols), rows))
+        return min(sum(cost[r][c] for c, r in enumerate(perm)) for perm in itertools.permutations(range(rows), cols))
+
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        for rows, cols in [(3, 3), (2, 4), (4, 2), (5, 5)]:
+            cost = [[rng.uniform(0, 10) for _ in range(cols)] for _ in range(rows)]
+            pairs = solve_assignment(cost)
+            self.assertEqual(len(pairs), min(rows, cols))
+            self.assertEqual(len({c for _, c in pairs}), len(pairs))
+            self.assertAlmostEqual(sum(cost[r][c] for r, c in pairs), self.brute_force(cost))
+
+    def test_unreachable_pairs_are_left_out(self):
+        cost = [[1, UNREACHABLE], [UNREACHABLE, UNREACHABLE]]
+        self.assertEqual(solve_assignment(cost), [(0, 0)])
+
+    def test_empty(self):
+        self.assertEqual(solve_assignment([]), [])
+
+
+class WaitingDeliveries(list):
+    """Stands in for the DeliveryRequest queryset of dispatchable_deliveries"""
+    def filter(self, id__gt=0, **lookups):
+        return WaitingDeliveries(delivery for delivery in self if delivery.id > id__gt)
+
+    def order_by(self, field):
+        return WaitingDeliveries(sorted(self, key=lambda delivery: delivery.id))
+
+
+@override_settings(DISPATCH_BATCH_SIZE=2, DISPATCH_LEAD_MINUTES=10)
+class DispatchableDeliveriesTests(SimpleTestCase):
+    def test_pages_past_deliveries_still_in_the_kitchen(self):
+        deliveries = WaitingDeliveries(SimpleNamespace(id=i, order_id=i) for i in range(1, 6))
+        later = datetime.now(dt_timezone.utc) + timedelta(hours=1)
+        cooking = {1: later, 2: later, 3: later}
+
+        with (
+            mock.patch.object(dispatch.DeliveryRequest, "objects") as objects,
+            mock.patch.object(dispatch, "get_ready_etas", lambda order_ids: {i: cooking[i] for i in order_ids if i in cooking}),
+        ):
+            objects.filter.return_value = deliveries
+            ready = dispatch.dispatchable_deliveries()
+
+        self.assertEqual([delivery.id for delivery in ready], [4, 5])
+
+
+@override_settings(DISPATCH_CANDIDATES_PER_DELIVERY=2, DISPATCH_RADIUS_KM=10)
+class CandidateCouriersTests(SimpleTestCase):
+    def test_postgis_fallback_takes_the_nearest_per_pickup(self):
+        deliveries = [SimpleNamespace(pickup_location="pickup-1"), SimpleNamespace(pickup_location="pickup-2")]
+        nearest = {"pickup-1": [1, 2], "pickup-2": [2, 3]}
+
+        with (
+            mock.patch.object(dispatch, "nearest_couriers", side_effect=RedisError("down")),
+            mock.patch.object(dispatch.CourierProfile, "objects") as objects,
+            mock.patch.object(dispatch, "KNNDistance") as knn,
+        ):
+            couriers = objects.filter.return_value
+            ranked = couriers.filter.return_value.annotate.return_value.order_by.return_value.values_list.return_value
+            ranked.__getitem__.side_effect = lambda limit: nearest[knn.call_args.args[1]][limit]
+            dispatch.candidate_couriers(deliveries)
+
+        couriers.filter.return_value.annotate.return_value.order_by.assert_called_with("distance")
+        self.assertEqual(ranked.__getitem__.call_args.args[0], slice(None, 2))
+        couriers.filter.assert_called_with(id__in={1, 2, 3})
+
+
+@override_settings(NEARBY_DELIVERIES_RADIUS_KM=5, NEARBY_DELIVERIES_MAX_RADIUS_KM=25)
+class NearbyDeliveriesTests(SimpleTestCase):
+    def nearby(self, **params):
+        request = SimpleNamespace(query_params={"lat": "6.5", "lng": "3.3", **params})
+        return views.DeliveryRequestViewSet().nearby(request)
+
+    def test_bad_radius_is_rejected(self):
+        for radius_km in ["0", "-2", "nan", "inf", "far"]:
+            with self.subTest(radius_km=radius_km):
+                self.assertEqual(self.nearby(radius_km=radius_km).status_code, 400)
+
+    def test_bad_coordinates_are_rejected(self):
+        self.assertEqual(self.nearby(lat="nan").status_code, 400)
+
+
+class PlanRouteTests(SimpleTestCase):
+    def deliveries(self):
+        return [
+            Delivery(1, (3.300, 6.500), (3.350, 6.550)),
+            Delivery(2, (3.301, 6.501), (3.320, 6.520)),
+            Delivery(3, (3.302, 6.499), (3.360, 6.540)),
+        ]
+
+    def test_dropoff_never_before_pickup(self):
+        route = plan_route((3.29, 6.49), self.deliveries())
+        seen = set()
+        for entry in route:
+            if entry["kind"] == "pickup":
+                seen.add(entry["delivery_id"])
+            else:
+                self.assertIn(entry["delivery_id"], seen)
+        self.assertEqual(len(route), 6)
+
+    def test_close_to_best_route(self):
+        deliveries = self.deliveries()
+        start = (3.29, 6.49)
+        stops = [(d.id, "pickup", d.pickup_location.coords) for d in deliveries]
+        stops += [(d.id, "dropoff", d.dropoff_location.coords) for d in deliveries]
+        points = [start] + [entry[2] for entry in stops]
+        distances = haversine_matrix(points, points)
+        index = {(entry[0], entry[1]): i + 1 for i, entry in enumerate(stops)}
+
+        route = [index[(entry["delivery_id"], entry["kind"])] for entry in plan_route(start, deliveries)]
+        best = min(
+            route_length(list(order), distances)
+            for order in itertools.permutations(range(1, len(stops) + 1))
+            if respects_precedence(list(order), stops)
+        )
+        self.assertLessEqual(route_length(route, distances), best * 1.15)
+
+
+class RemainingStopsTests(SimpleTestCase):
+    stops = [stop(1, "pickup"), stop(2, "pickup"), stop(1, "dropoff"), stop(2, "dropoff")]
+
+    def test_dropped_off_batch_mate_is_not_ahead(self):
+        ahead = remaining_stops(self.stops, {1: "delivered", 2: "picked_up"})
+        self.assertEqual(ahead, [stop(2, "dropoff")])
+
+    def test_declined_and_removed_deliveries_are_not_ahead(self):
+        self.assertEqual(remaining_stops(self.stops, {1: "declined", 2: "accepted"}), [stop(2, "pickup"), stop(2, "dropoff")])
+        # A delivery that left the batch has no status in it
+        self.assertEqual(remaining_stops(self.stops, {2: "accepted"}), [stop(2, "pickup"), stop(2, "dropoff")])
+
+    def test_route_position(self):
+        self.assertEqual(
+            route_position(self.stops, {1: "picked_up", 2: "picked_up"}, 2),
+            {"stops_before": 1, "total_stops": 2},
+        )
+        self.assertIsNone(route_position(self.stops, {1: "delivered", 2: "delivered"}, 2))
+
+
+@override_settings(LOCATION_MIN_MOVE_METERS=10, LOCATION_MIN_INTERVAL_SECONDS=1, LOCATION_HEARTBEAT_SECONDS=30)
+class ShouldAcceptTests(SimpleTestCase):
+    last = {"lat": 6.5, "lng": 3.3, "timestamp": "2026-10-19T12:00:00+00:00"}
+
+    def test_first_ping_is_accepted(self):
+        self.assertTrue(should_accept(None, 6.5, 3.3, "2026-10-19T12:00:00+00:00"))
+
+    def test_standing_still_is_dropped_until_the_heartbeat(self):
+        self.assertFalse(should_accept(self.last, 6.5, 3.3, "2026-10-19T12:00:10+00:00"))
+        self.assertTrue(should_accept(self.last, 6.5, 3.3, "2026-10-19T12:00:30+00:00"))
+
+    def test_movement_past_the_threshold_is_accepted(self):
+        # ~0.0002° of latitude is ~22 m
+        self.assertTrue(should_accept(self.last, 6.5002, 3.3, "2026-10-19T12:00:05+00:00"))
+        self.assertFalse(should_accept(self.last, 6.50005, 3.3, "2026-10-19T12:00:05+00:00"))
+
+    def test_pings_closer_than_the_min_interval_are_dropped(self):
+        self.assertFalse(should_accept(self.last, 6.51, 3.3, "2026-10-19T12:00:00.500000+00:00"))
+        # Out-of-order pings too
+        self.assertFalse(should_accept(self.last, 6.51, 3.3, "2026-10-19T11:59:50+00:00"))
+
+
+class PerformanceStatsTests(SimpleTestCase):
+    def delivery(self, status, **times):
+        fields = {field: None for field in ["assigned_at", "accepted_at", "picked_up_at", "delivered_at"]}
+        fields.update(times)
+        return SimpleNamespace(status=status, **fields)
+
+    def test_delivered_on_time_with_durations(self):
+        accepted = datetime(2026, 10, 19, 12, tzinfo=dt_timezone.utc)
+        delivery = self.delivery(
+            "delivered",
+            accepted_at=accepted,
+            picked_up_at=accepted + timedelta(minutes=10),
+            delivered_at=accepted + timedelta(minutes=30),
+        )
+        self.assertEqual(
+            transition_counts(delivery), {"delivered": 1, "on_time": 1, "drop_seconds": 1200, "drops": 1}
+        )
+
+    def test_late_delivery_is_not_on_time(self):
+        accepted = datetime(2026, 10, 19, 12, tzinfo=dt_timezone.utc)
+        delivery = self.delivery("delivered", accepted_at=accepted, delivered_at=accepted + timedelta(hours=2))
+        self.assertNotIn("on_time", transition_counts(delivery))
+
+    def test_derive_rates(self):
+        stats = dict.fromkeys(COUNTERS, 0)
+        stats.update(offered=10, accepted=8, declined=2, delivered=8, on_time=6)
+        stats = derive(stats)
+        self.assertEqual(stats["acceptance_rate"], 0.8)
+        self.assertEqual(stats["decline_rate"], 0.2)
+        self.assertEqual(stats["on_time_rate"], 0.75)
+        self.assertIsNone(stats["avg_pickup_seconds"])
+
+    def test_fresh_stats_carry_no_penalty(self):
+        self.assertEqual(dispatch_penalty_km({}), 0.0)
+        # Counters start from zero after the migration: no on-time rate yet, no late penalty
+        stats = derive(dict.fromkeys(COUNTERS, 0) | {"offered": 20, "accepted": 20})
+        self.assertEqual(dispatch_penalty_km(stats), 0.0)
+
+
+class BatchStrategyTests(SimpleTestCase):
+    def test_track_record_penalty_is_applied(self):
+        delivery = SimDelivery(id=1, pickup=(3.3, 6.5), dropoff=(3.35, 6.55), placed_at=0, ready_at=0)
+        declines_everything = SimCourier(
+            id=1, position=(3.3045, 6.5), performance_stats={"offered": 20, "decline_rate": 1.0}
+        )
+        fresh = SimCourier(id=2, position=(3.3135, 6.5))
+        self.assertEqual(batch_strategy([delivery], [declines_everything, fresh]), [(0, 1)])
+        self.assertEqual(batch_strategy([delivery], [SimCourier(id=1, position=(3.3045, 6.5)), fresh]), [(0, 0)])
+
+
+@override_settings(LOCATION_FANOUT_MAX_AGE_SECONDS=10)
+class GroupCoalescerTests(SimpleTestCase):
+    def message(self, kind):
+        return {"type": kind, "timestamp": datetime.now(dt_timezone.utc).isoformat()}
+
+    async def test_message_types_are_coalesced_separately(self):
+        channel_layer = mock.AsyncMock()
+        coalescer = GroupCoalescer(interval=60)
+        await coalescer.send(channel_layer, "delivery_1", self.message("location_update"))
+        await coalescer.send(channel_layer, "delivery_1", self.message("customer_location_update"))
+        # Inside the window: held back until the flush
+        await coalescer.send(channel_layer, "delivery_1", self.message("location_update"))
+
+        sent = [call.args[1]["type"] for call in channel_layer.group_send.call_args_list]
+        self.assertEqual(sent, ["location_update", "customer_location_update"])
+        self.assertIn(("delivery_1", "location_update"), coalescer.pending)
+
+    async def test_failed_flush_is_logged_and_released(self):
+        channel_layer = mock.AsyncMock()
+        coalescer = GroupCoalescer(interval=0.01)
+        await coalescer.send(channel_layer, "delivery_1", self.message("location_update"))
+        channel_layer.group_send.side_effect = RuntimeError("channel layer down")
+        await coalescer.send(channel_layer, "delivery_1", self.message("location_update"))
+
+        with self.assertLogs("delivery.fanout", "ERROR"):
+            await asyncio.sleep(0.05)
+        self.assertEqual(coalescer.flushes, set())
+
+    async def test_quiet_groups_are_pruned_once_per_period(self):
+        channel_layer = mock.AsyncMock()
+        coalescer = GroupCoalescer(interval=60)
+        coalescer.last_sent[("delivery_1", "location_update")] = (float("-inf"), 0)
+        await coalescer.send(channel_layer, "delivery_2", self.message("location_update"))
+        self.assertNotIn(("delivery_1", "location_update"), coalescer.last_sent)
+
+        # Not again until the period is over
+        coalescer.last_sent[("delivery_1", "location_update")] = (float("-inf"), 0)
+        await coalescer.send(channel_layer, "delivery_3", self.message("location_update"))
+        self.assertIn(("delivery_1", "location_update"), coalescer.last_sent)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    GEOFENCE_AUTO_ADVANCE=True,
+)
+class GeofenceEmitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.engine = geofence.GeofenceEngine()
+        self.engine.channel_layer = mock.AsyncMock()
+        self.delivery = {"courier_id": 3, "status": "picked_up"}
+
+    def test_failed_advance_releases_the_event(self):
+        with mock.patch.object(geofence, "advance_delivery", side_effect=IntegrityError("boom")):
+            self.engine.emit(1, self.delivery, "arrived_at_dropoff")
+        self.assertIsNone(cache.get(geofence.geofence_event_key(1, "arrived_at_dropoff")))
+        self.engine.channel_layer.group_send.assert_not_called()
+
+        # The next ping in the fence tries again
+        with mock.patch.object(geofence, "advance_delivery", return_value="delivered"):
+            self.engine.emit(1, self.delivery, "arrived_at_dropoff")
+        self.assertEqual(self.delivery["status"], "delivered")
+        self.assertEqual(self.engine.channel_layer.group_send.call_count, 2)
+
+    def test_event_is_emitted_once(self):
+        with mock.patch.object(geofence, "advance_delivery", return_value="delivered") as advance:
+            self.engine.emit(1, self.delivery, "arrived_at_dropoff")
+            self.engine.emit(1, self.delivery, "arrived_at_dropoff")
+        advance.assert_called_once_with(1, "delivered")
+
+
+class IngestionBatchTests(SimpleTestCase):
+    def entry(self, entry_id, delivery_ids):
+        return entry_id, {
+            "courier_id": "1", "lat": "6.5", "lng": "3.3",
+            "timestamp": "2026-10-19T12:00:00+00:00", "delivery_ids": delivery_ids,
+        }
+
+    def test_unstorable_entry_is_dead_lettered_and_acked(self):
+        client = mock.Mock()
+        client.xreadgroup.return_value = [(ingestion.LOCATION_STREAM, [self.entry("1-0", "5"), self.entry("2-0", "99")])]
+
+        def persist(pings):
+            if any(99 in ping["delivery_ids"] for ping in pings):
+                raise IntegrityError("delivery 99 does not exist")
+
+        with mock.patch.object(ingestion, "persist_pings", side_effect=persist) as persist_pings:
+            self.assertEqual(ingestion.process_batch(client, "worker", 10, 0), 2)
+
+        # The whole batch, then each ping on its own
+        self.assertEqual(persist_pings.call_count, 3)
+        client.xadd.assert_called_once()
+        self.assertEqual(client.xadd.call_args.args[0], ingestion.DEAD_LETTER_STREAM)
+        self.assertEqual(client.xadd.call_args.args[1]["entry_id"], "2-0")
+        client.xack.assert_called_once_with(ingestion.LOCATION_STREAM, ingestion.CONSUMER_GROUP, "1-0", "2-0")
+
+    def test_redis_failure_after_commit_still_acks(self):
+        client = mock.Mock()
+        client.xreadgroup.return_value = [(ingestion.LOCATION_STREAM, [self.entry("1-0", "5")])]
+
+        def update_positions(positions):
+            raise RedisError("down")
+
+        database = {name: mock.DEFAULT for name in ["transaction", "CourierProfile", "DeliveryTracking"]}
+        with (
+            mock.patch.multiple(ingestion, **database),
+            mock.patch.object(ingestion, "update_positions", update_positions),
+            mock.patch.object(ingestion.heatmap, "update_positions", update_positions),
+        ):
+            self.assertEqual(ingestion.process_batch(client, "worker", 10, 0), 1)
+
+        client.xack.assert_called_once_with(ingestion.LOCATION_STREAM, ingestion.CONSUMER_GROUP, "1-0")
+        client.xadd.assert_not_called()
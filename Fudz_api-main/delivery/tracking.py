@@ -0,0 +1,74 @@
+from django.core.cache import cache
+
+from .batching import remaining_stops
+from .models import DeliveryRequest
+
+ACTIVE_DELIVERY_TIMEOUT = 60 * 60 * 6
+
+
+def active_delivery_key(courier_id):
+    # A list of contexts; renamed from ":active_delivery", which held a single dict
+    return f"courier:{courier_id}:active_deliveries"
+
+
+def delivery_context(delivery, route=None):
+    """
+    What location pings need to know about a delivery, without a query.
+    ``route`` is the batch's remaining stops; the delivery's ETA then follows
+    the route up to its own dropoff.
+    """
+    context = {
+        "id": delivery.id,
+        "status": delivery.status,
+        "pickup": delivery.pickup_location.coords if delivery.pickup_location else None,
+        "dropoff": delivery.dropoff_location.coords if delivery.dropoff_location else None,
+        "vehicle_type": delivery.courier.vehicle_type if delivery.courier_id else None,
+    }
+    if route:
+        stops = []
+        for stop in route:
+            stops.append((stop["lng"], stop["lat"]))
+            if stop["delivery_id"] == delivery.id and stop["kind"] == "dropoff":
+                break
+        context["stops"] = stops
+    return context
+
+
+def active_contexts(courier_id):
+    deliveries = list(
+        DeliveryRequest.objects.select_related("courier", "batch").filter(
+            courier_id=courier_id, status__in=DeliveryRequest.ACTIVE_STATUSES
+        )
+    )
+    # Whole batches, so batch-mates already dropped off count as done
+    batch_ids = {delivery.batch_id for delivery in deliveries if delivery.batch_id}
+    statuses = {}
+    for batch_id, delivery_id, status in DeliveryRequest.objects.filter(batch_id__in=batch_ids).values_list(
+        "batch_id", "id", "status"
+    ):
+        statuses.setdefault(batch_id, {})[delivery_id] = status
+    routes = {
+        delivery.batch_id: remaining_stops(delivery.batch.stops, statuses.get(delivery.batch_id, {}))
+        for delivery in deliveries
+        if delivery.batch_id
+    }
+    return [delivery_context(delivery, routes.get(delivery.batch_id)) for delivery in deliveries]
+
+
+def get_active_deliveries(courier_id):
+    """
+    Cached contexts (see delivery_context) of the courier's in-progress
+    deliveries, several when they carry a batch. Kept current by
+    delivery.signals, so pings don't hit the database.
+    """
+    key = active_delivery_key(courier_id)
+    active = cache.get(key)
+    if active is None:
+        active = refresh_active_deliveries(courier_id)
+    return active
+
+
+def refresh_active_deliveries(courier_id):
+    active = active_contexts(courier_id)
+    cache.set(active_delivery_key(courier_id), active, timeout=ACTIVE_DELIVERY_TIMEOUT)
+    return active
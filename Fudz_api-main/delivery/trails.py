@@ -0,0 +1,37 @@
+"""
+Compaction of GPS tracking trails.
+
+A finished delivery's DeliveryTracking points are simplified with
+Douglas-Peucker (GEOS simplify without topology preservation) into
+DeliveryRequest.route_trail, after which the raw points only have to be
+kept for TRACKING_RETENTION_DAYS.
+"""
+from django.conf import settings
+from django.contrib.gis.geos import LineString
+
+# Good enough to turn a tolerance in metres into degrees at city scale
+METERS_PER_DEGREE = 111_320
+
+
+def compact_trail(points):
+    """Simplified LineString through ``points`` (ordered by time), or None"""
+    coords = [point.coords for point in points]
+    # Consecutive duplicate pings add nothing to the line
+    coords = [coord for i, coord in enumerate(coords) if i == 0 or coord != coords[i - 1]]
+    if len(coords) < 2:
+        return None
+
+    tolerance = settings.TRAIL_SIMPLIFY_TOLERANCE_METERS / METERS_PER_DEGREE
+    trail = LineString(coords, srid=4326).simplify(tolerance, preserve_topology=False)
+    trail.srid = 4326
+    return trail
+
+
+def trail_points(delivery):
+    """The delivery's trail as [(lng, lat), ...]: compacted if available, raw otherwise"""
+    if delivery.route_trail:
+        return list(delivery.route_trail.coords)
+    return [
+        point.coords
+        for point in delivery.tracking.order_by("last_updated").values_list("current_location", flat=True)
+    ]
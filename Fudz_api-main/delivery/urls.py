@@ -8,4 +8,9 @@ router = routers.DefaultRouter()
 router.register('deliveries', views.DeliveryRequestViewSet, basename='delivery')
 
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path('earnings/', views.CourierEarningsListView.as_view(), name='courier-earnings'),
+    path('earnings/summary/', views.CourierEarningsSummaryView.as_view(), name='courier-earnings-summary'),
+    path('heatmap/', views.HeatmapView.as_view(), name='delivery-heatmap'),
+    path('metrics/fanout/', views.FanoutMetricsView.as_view(), name='fanout-metrics'),
+] + router.urls
\ No newline at end of file
@@ -1,15 +1,40 @@
+import math
+from datetime import timedelta
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from rest_framework import viewsets, status, generics, permissions
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
+from django.conf import settings
 from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
-from django.db.models import Sum
+from django.contrib.gis.measure import D
+from django.http import HttpResponse
 from django.utils import timezone
-
-from .models import DeliveryRequest, CourierEarnings
-from .serializers import DeliveryRequestSerializer, DeliveryStatusUpdateSerializer, CourierEarningsSerializer
+from django.utils.cache import patch_cache_control
+
+from .models import DeliveryRequest, CourierEarnings, CourierEarningsDaily
+from .batching import release_courier
+from .expressions import KNNDistance
+from .heatmap import get_heatmap
+from .serializers import (
+    DeliveryRequestSerializer,
+    DeliveryStatusUpdateSerializer,
+    CourierEarningsSerializer,
+    NearbyDeliverySerializer,
+)
+from .trails import trail_points
 from users.models import CourierProfile
+from users.permissions import IsCourier, IsCourierOrAdmin
+
+class NearbyDeliveryPagination(CursorPagination):
+    """Keyset pages over the distance ordering, so deep pages stay cheap"""
+    ordering = ("distance", "id")
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 50
+
 
 class DeliveryRequestViewSet(viewsets.ModelViewSet):
     queryset = DeliveryRequest.objects.select_related("order", "courier").all()
@@ -50,22 +75,45 @@ class DeliveryRequestViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="nearby")
     def nearby(self, request):
-        """Get nearby pending deliveries for courier"""
+        """Get nearby pending deliveries for courier, nearest first"""
         lat = request.query_params.get("lat")
         lng = request.query_params.get("lng")
 
         if not lat or not lng:
             return Response({"error": "lat and lng required"}, status=400)
 
-        point = Point(float(lng), float(lat), srid=4326)
+        try:
+            lat, lng = float(lat), float(lng)
+            radius_km = float(request.query_params.get("radius_km", settings.NEARBY_DELIVERIES_RADIUS_KM))
+        except ValueError:
+            return Response({"error": "lat, lng and radius_km must be numbers"}, status=400)
+        if not all(math.isfinite(value) for value in (lat, lng, radius_km)) or radius_km <= 0:
+            return Response({"error": "lat, lng and radius_km must be numbers, radius_km above 0"}, status=400)
+
+        point = Point(lng, lat, srid=4326)
+        radius_km = min(radius_km, settings.NEARBY_DELIVERIES_MAX_RADIUS_KM)
+
+        # ST_DWithin and <-> are both answered by the partial GiST index on pending pickups
         deliveries = (
-            DeliveryRequest.objects.filter(status="pending")
-            .annotate(distance=Distance("pickup_location", point))
-            .order_by("distance")[:10]
+            DeliveryRequest.objects.filter(status="pending", pickup_location__dwithin=(point, D(km=radius_km)))
+            .select_related("order__restaurant")
+            .annotate(distance=KNNDistance("pickup_location", point))
         )
 
-        serializer = self.get_serializer(deliveries, many=True)
-        return Response(serializer.data)
+        paginator = NearbyDeliveryPagination()
+        page = paginator.paginate_queryset(deliveries, request, view=self)
+        serializer = NearbyDeliverySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=["get"], url_path="trail")
+    def trail(self, request, pk=None):
+        """Route the courier took (simplified once the delivery is finished)"""
+        delivery = self.get_object()
+        return Response({
+            "delivery_id": delivery.id,
+            "compacted": delivery.trail_compacted_at is not None,
+            "points": [{"latitude": lat, "longitude": lng} for lng, lat in trail_points(delivery)],
+        })
 
     @action(detail=True, methods=["post"], url_path="accept")
     def accept(self, request, pk=None):
@@ -90,6 +138,8 @@ class DeliveryRequestViewSet(viewsets.ModelViewSet):
 
         delivery.mark_status("declined")
         delivery.courier = None
+        # Leaves the batch; it is re-dispatched on its own or in a new group
+        delivery.batch = None
         delivery.save()
 
         return Response({"message": "Delivery declined"}, status=200)
@@ -103,9 +153,9 @@ class DeliveryRequestViewSet(viewsets.ModelViewSet):
             new_status = serializer.validated_data["status"]
             serializer.save()
 
-            if new_status in ["delivered", "cancelled"] and delivery.courier:
-                delivery.courier.is_available = True
-                delivery.courier.save()
+            if new_status in ["delivered", "cancelled"]:
+                # Stays busy while other deliveries of a batch are still on board
+                release_courier(delivery)
 
             return Response({"message": f"Status updated to {new_status}"})
         return Response(serializer.errors, status=400)
@@ -113,28 +163,54 @@ class DeliveryRequestViewSet(viewsets.ModelViewSet):
     
 class CourierEarningsListView(generics.ListAPIView):
     serializer_class = CourierEarningsSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsCourier]
 
     def get_queryset(self):
         return CourierEarnings.objects.filter(
-            courier=self.request.user.courierprofile
+            courier=self.request.user.courier_profile
         ).order_by("-created_at")
 
 class CourierEarningsSummaryView(generics.GenericAPIView):
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsCourier]
 
     def get(self, request):
-        courier = request.user.courierprofile
-        total_earnings = CourierEarnings.objects.filter(courier=courier).aggregate(
-            total=Sum("amount")
-        )["total"] or 0
-
-        today_earnings = CourierEarnings.objects.filter(
-            courier=courier, created_at__date__exact=timezone.now().date()
-        ).aggregate(total=Sum("amount"))["total"] or 0
+        """Reads the maintained balance and daily rollup (see delivery.earnings)"""
+        courier = request.user.courier_profile
+        last_week = list(
+            CourierEarningsDaily.objects.filter(
+                courier=courier, day__gt=timezone.localdate() - timedelta(days=7)
+            ).values("day", "amount", "deliveries")
+        )
+        today = next((row for row in last_week if row["day"] == timezone.localdate()), None)
 
         return Response({
-            "total_earnings": total_earnings,
-            "today_earnings": today_earnings,
-        })    
+            "total_earnings": courier.earnings_balance,
+            "today_earnings": today["amount"] if today else 0,
+            "today_deliveries": today["deliveries"] if today else 0,
+            "last_7_days": last_week,
+        })
+
+
+class FanoutMetricsView(generics.GenericAPIView):
+    """
+    Prometheus counters of websocket location fan-out (staff only).
+
+    The counters live in the memory of the process that serves this request,
+    so they cover only the sockets that process handles. With several ASGI
+    workers, or with HTTP served separately from websockets, this is not a
+    fleet-wide total: scrape each worker and sum the series.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
+    def get(self, request):
+        return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+
+
+class HeatmapView(generics.GenericAPIView):
+    """Waiting deliveries and available couriers per grid cell (see delivery.heatmap)"""
+    permission_classes = [IsCourierOrAdmin]
+
+    def get(self, request):
+        response = Response(get_heatmap())
+        patch_cache_control(response, private=True, max_age=settings.HEATMAP_REFRESH_SECONDS)
+        return response
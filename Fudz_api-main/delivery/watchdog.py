@@ -0,0 +1,53 @@
+"""
+Debug-mode detector for code that blocks the event loop.
+
+A heartbeat task on the loop ticks every half threshold; a daemon thread
+watches it, and when the loop has not ticked for LOOP_BLOCK_THRESHOLD_MS it
+logs the loop thread's current stack (the synchronous call that is holding
+it up). Installed by FramedWebsocketConsumer, once per event loop.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_watched_loops = set()
+
+
+def install_loop_watchdog():
+    if not settings.DEBUG:
+        return
+    loop = asyncio.get_running_loop()
+    if loop in _watched_loops:
+        return
+    _watched_loops.add(loop)
+
+    threshold = settings.LOOP_BLOCK_THRESHOLD_MS / 1000
+    loop_thread_id = threading.get_ident()
+    state = {"beat": time.monotonic(), "reported": False}
+
+    async def heartbeat():
+        while True:
+            state["beat"] = time.monotonic()
+            state["reported"] = False
+            await asyncio.sleep(threshold / 2)
+
+    def watch():
+        while not loop.is_closed():
+            time.sleep(threshold / 2)
+            blocked = time.monotonic() - state["beat"]
+            if blocked > threshold and not state["reported"]:
+                # One report per stall; the stack is where the loop is stuck right now
+                state["reported"] = True
+                frame = sys._current_frames().get(loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else "(no frame)"
+                logger.warning(f"Event loop blocked for {blocked * 1000:.0f} ms in:\n{stack}")
+
+    state["task"] = loop.create_task(heartbeat())
+    threading.Thread(target=watch, name="loop-watchdog", daemon=True).start()
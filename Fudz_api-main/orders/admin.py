@@ -38,6 +38,20 @@ class OrderAdmin(GISModelAdmin):
     status_badge.short_description = "Status"
 
 
+@admin.register(models.ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ["id", "restaurant", "courier", "customer", "status", "total_amount", "placed_at", "archived_at"]
+    list_filter = ["status"]
+    list_per_page = 20
+    search_fields = ["id"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 class CartItemInline(admin.TabularInline):
     min_num = 1
     autocomplete_fields = ["menu_item"]
@@ -1,7 +1,36 @@
-import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+from django.db.models import DecimalField, F, Sum
+from channels.db import database_sync_to_async
 
-class AdminNotificationConsumer(AsyncWebsocketConsumer):
+from delivery.framing import FramedWebsocketConsumer
+
+from .models import Order
+
+
+def restaurant_orders_group(restaurant_id):
+    return f"restaurant_{restaurant_id}_orders"
+
+
+def compact_orders(queryset):
+    """Serialize orders to the compact shape used by the restaurant stream (one query)"""
+    rows = queryset.annotate(
+        item_count=Sum("items__qty"),
+        total_amount=Sum(F("items__unit_price") * F("items__qty"), output_field=DecimalField()) - F("promo_discount"),
+    ).values("id", "status", "placed_at", "updated_at", "item_count", "total_amount")
+
+    return [
+        {
+            "id": row["id"],
+            "status": row["status"],
+            "placed_at": row["placed_at"].isoformat(),
+            "updated_at": row["updated_at"].isoformat(),
+            "item_count": row["item_count"] or 0,
+            "total_amount": float(row["total_amount"] or 0),
+        }
+        for row in rows
+    ]
+
+
+class AdminNotificationConsumer(FramedWebsocketConsumer):
     async def connect(self):
         user = self.scope.get('user')
         if user.is_active and user.is_staff:
@@ -16,7 +45,7 @@ class AdminNotificationConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_discard("admin_notifications", self.channel_name)
 
     async def admin_notification(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             "type": event["event_type"],
             "notification_id": event["notification_id"],
             "order_id": event["order_id"],
@@ -25,4 +54,61 @@ class AdminNotificationConsumer(AsyncWebsocketConsumer):
             "status": event["status"],
             "message": event["message"],
             "redirect_url": event["redirect_url"],
-        }))
+        })
+
+
+class RestaurantOrderConsumer(FramedWebsocketConsumer):
+    """Streams new orders and status changes to a restaurant's dashboard"""
+
+    async def connect(self):
+        self.restaurant_id = await self.get_restaurant_id(self.scope.get('user'))
+        if self.restaurant_id is None:
+            await self.close()
+            return
+
+        self.group_name = restaurant_orders_group(self.restaurant_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        # Joined the group first so nothing placed meanwhile is missed;
+        # clients de-duplicate snapshot rows and events by order id.
+        orders = await self.get_open_orders()
+        await self.send_frame({
+            "type": "snapshot",
+            "orders": orders,
+        })
+
+    async def disconnect(self, close_code):
+        if getattr(self, "group_name", None):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        await self.send_frame({
+            "type": "info",
+            "message": "This WebSocket is for receiving order updates only.",
+        })
+
+    async def order_event(self, event):
+        """Handler for order events sent from orders.signals"""
+        await self.send_frame({
+            "type": event["event"],
+            "order": event["order"],
+        })
+
+    @database_sync_to_async
+    def get_restaurant_id(self, user):
+        if user is None or not user.is_authenticated or not user.is_active:
+            return None
+        if hasattr(user, "restaurant_profile"):
+            return user.restaurant_profile.id
+        if hasattr(user, "restaurant_staff_profile") and user.restaurant_staff_profile.is_active:
+            return user.restaurant_staff_profile.restaurant_id
+        return None
+
+    @database_sync_to_async
+    def get_open_orders(self):
+        return compact_orders(
+            Order.objects.filter(
+                restaurant_id=self.restaurant_id, status__in=Order.OPEN_STATUSES
+            ).order_by("placed_at")
+        )
@@ -0,0 +1,174 @@
+"""
+Prep-time-aware "order ready" estimates.
+
+Each restaurant's kitchen is modelled as a few parallel stations working
+through accepted orders first-come first-served; an order takes as long as
+its slowest item (MenuItem.prep_time_minutes). The queue is rebuilt only
+when an order changes status (see orders.signals), and the results are kept
+in the cache so dispatch, tracking and capacity checks just read them.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from restaurants.capacity import get_kitchen_capacity
+
+ETA_TIMEOUT = 60 * 60 * 6
+
+
+def queue_key(restaurant_id):
+    return f"order_eta_queue_{restaurant_id}"
+
+
+def kitchen_free_key(restaurant_id):
+    return f"kitchen_free_at_{restaurant_id}"
+
+
+def order_eta_key(order_id):
+    return f"order_eta_{order_id}"
+
+
+def kitchen_stations(restaurant_id):
+    """Orders the kitchen prepares at once, derived from its prep-minute budget"""
+    capacity = get_kitchen_capacity(restaurant_id)
+    if capacity and capacity["max_prep_minutes_per_slot"]:
+        return max(1, capacity["max_prep_minutes_per_slot"] // capacity["slot_minutes"])
+    return settings.DEFAULT_KITCHEN_STATIONS
+
+
+def order_prep_seconds(order):
+    """Time to prepare an order: its slowest item"""
+    prep_minutes = [
+        prep or settings.DEFAULT_PREP_TIME_MINUTES
+        for prep in order.items.values_list("menu_item__prep_time_minutes", flat=True)
+    ]
+    return max(prep_minutes, default=settings.DEFAULT_PREP_TIME_MINUTES) * 60
+
+
+class QueueLockTimeout(Exception):
+    pass
+
+
+@contextmanager
+def queue_lock(restaurant_id):
+    """
+    Best-effort cross-process lock around a restaurant's queue (SET NX).
+    Raises QueueLockTimeout rather than running unlocked.
+    """
+    key = f"order_eta_lock_{restaurant_id}"
+    token = uuid.uuid4().hex
+    for _ in range(50):
+        if cache.add(key, token, timeout=5):
+            break
+        time.sleep(0.02)
+    else:
+        raise QueueLockTimeout(f"Kitchen queue of restaurant {restaurant_id} is locked")
+    try:
+        yield
+    finally:
+        # Only release our own lock; it may have expired and been taken by another process
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def schedule(queue, stations, now):
+    """
+    Run the queue through ``stations`` parallel stations.
+    Returns ({order_id: ready_ts}, ts at which the next station frees up).
+    """
+    free = [0.0] * stations
+    ready = {}
+    for order_id, (accepted_ts, prep_seconds) in sorted(queue.items(), key=lambda entry: entry[1][0]):
+        station = free.index(min(free))
+        start = max(free[station], accepted_ts)
+        # An order running late is expected to be ready any moment now
+        ready[order_id] = max(start + prep_seconds, now)
+        free[station] = ready[order_id]
+    return ready, max(min(free), now)
+
+
+def store_order_eta(order_id, ready_ts, prep_seconds):
+    cache.set(
+        order_eta_key(order_id),
+        {"ready_ts": ready_ts, "prep_seconds": prep_seconds},
+        timeout=ETA_TIMEOUT,
+    )
+
+
+def refresh_queue(restaurant_id, queue):
+    now = time.time()
+    # Drop orders whose status was changed without signals (e.g. queryset.update)
+    queue = {
+        order_id: entry for order_id, entry in queue.items() if entry[0] > now - ETA_TIMEOUT
+    }
+    ready, free_at = schedule(queue, kitchen_stations(restaurant_id), now)
+
+    cache.set(queue_key(restaurant_id), queue, timeout=ETA_TIMEOUT)
+    cache.set(kitchen_free_key(restaurant_id), free_at, timeout=ETA_TIMEOUT)
+    cache.set_many(
+        {
+            order_eta_key(order_id): {"ready_ts": ready_ts, "prep_seconds": queue[order_id][1]}
+            for order_id, ready_ts in ready.items()
+        },
+        timeout=ETA_TIMEOUT,
+    )
+
+
+def order_placed(order):
+    """Estimate for an order that has not been accepted yet"""
+    prep_seconds = order_prep_seconds(order)
+    store_order_eta(order.id, kitchen_free_at(order.restaurant_id) + prep_seconds, prep_seconds)
+
+
+def order_accepted(order):
+    estimate = cache.get(order_eta_key(order.id)) or {}
+    prep_seconds = estimate.get("prep_seconds") or order_prep_seconds(order)
+
+    with queue_lock(order.restaurant_id):
+        queue = cache.get(queue_key(order.restaurant_id)) or {}
+        queue[order.id] = (time.time(), prep_seconds)
+        refresh_queue(order.restaurant_id, queue)
+
+
+def order_left_kitchen(order):
+    """The order is ready (or cancelled) and no longer holds a station"""
+    with queue_lock(order.restaurant_id):
+        queue = cache.get(queue_key(order.restaurant_id)) or {}
+        queue.pop(order.id, None)
+        refresh_queue(order.restaurant_id, queue)
+
+    if order.status == "cancelled":
+        cache.delete(order_eta_key(order.id))
+    else:
+        store_order_eta(order.id, time.time(), 0)
+
+
+def kitchen_free_at(restaurant_id):
+    return max(cache.get(kitchen_free_key(restaurant_id)) or 0, time.time())
+
+
+def kitchen_wait_seconds(restaurant_id):
+    """Seconds until the kitchen can start on a newly accepted order"""
+    return kitchen_free_at(restaurant_id) - time.time()
+
+
+def get_ready_eta(order_id):
+    """Cached ready time of an order as an aware datetime, or None"""
+    estimate = cache.get(order_eta_key(order_id))
+    if not estimate:
+        return None
+    return datetime.fromtimestamp(estimate["ready_ts"], tz=dt_timezone.utc)
+
+
+def get_ready_etas(order_ids):
+    """{order_id: ready time} for the orders that have a cached estimate"""
+    estimates = cache.get_many([order_eta_key(order_id) for order_id in order_ids])
+    return {
+        order_id: datetime.fromtimestamp(estimates[order_eta_key(order_id)]["ready_ts"], tz=dt_timezone.utc)
+        for order_id in order_ids
+        if estimates.get(order_eta_key(order_id))
+    }
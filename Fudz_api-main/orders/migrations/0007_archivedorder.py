@@ -0,0 +1,146 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:00
+#
+# The archive table is created by hand as a PostgreSQL table range-partitioned
+# by placed_at. Monthly partitions are added by orders.tasks.archive_finished_orders
+# before rows are moved in; the DEFAULT partition only catches stragglers.
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+CREATE_ARCHIVE_TABLE = """
+CREATE TABLE orders_archivedorder (
+    id bigint NOT NULL,
+    customer_id bigint NOT NULL,
+    restaurant_id bigint NOT NULL,
+    courier_id bigint NULL,
+    pickup_location geography(POINT, 4326) NULL,
+    dropoff_location geography(POINT, 4326) NULL,
+    status varchar(20) NOT NULL,
+    payment_status varchar(20) NOT NULL,
+    placed_at timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL,
+    archived_at timestamp with time zone NOT NULL,
+    items jsonb NOT NULL,
+    delivery jsonb NULL,
+    total_amount numeric(10, 2) NOT NULL,
+    total_discount numeric(10, 2) NOT NULL,
+    PRIMARY KEY (id, placed_at)
+) PARTITION BY RANGE (placed_at);
+
+CREATE TABLE orders_archivedorder_default PARTITION OF orders_archivedorder DEFAULT;
+
+CREATE INDEX archivedorder_customer_idx ON orders_archivedorder (customer_id, placed_at DESC);
+CREATE INDEX archivedorder_restaurant_idx ON orders_archivedorder (restaurant_id, placed_at DESC);
+CREATE INDEX archivedorder_courier_idx ON orders_archivedorder (courier_id, placed_at DESC);
+"""
+
+DROP_ARCHIVE_TABLE = "DROP TABLE IF EXISTS orders_archivedorder CASCADE;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0006_alter_orderitem_options_orderitem_applied_promotion_and_more"),
+        ("users", "0006_notificationpreference"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_ARCHIVE_TABLE, DROP_ARCHIVE_TABLE),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name="ArchivedOrder",
+                    fields=[
+                        ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                        (
+                            "pickup_location",
+                            django.contrib.gis.db.models.fields.PointField(
+                                blank=True, geography=True, null=True, srid=4326
+                            ),
+                        ),
+                        (
+                            "dropoff_location",
+                            django.contrib.gis.db.models.fields.PointField(
+                                blank=True, geography=True, null=True, srid=4326
+                            ),
+                        ),
+                        (
+                            "status",
+                            models.CharField(
+                                choices=[
+                                    ("placed", "Placed"),
+                                    ("accepted", "Accepted"),
+                                    ("ready", "Ready for pickup"),
+                                    ("picked_up", "Picked up"),
+                                    ("delivered", "Delivered"),
+                                    ("cancelled", "Cancelled"),
+                                ],
+                                max_length=20,
+                            ),
+                        ),
+                        ("payment_status", models.CharField(max_length=20)),
+                        ("placed_at", models.DateTimeField()),
+                        ("updated_at", models.DateTimeField()),
+                        ("archived_at", models.DateTimeField(auto_now_add=True)),
+                        ("items", models.JSONField(default=list)),
+                        ("delivery", models.JSONField(blank=True, null=True)),
+                        ("total_amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                        (
+                            "total_discount",
+                            models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                        ),
+                        (
+                            "courier",
+                            models.ForeignKey(
+                                blank=True,
+                                db_constraint=False,
+                                null=True,
+                                on_delete=django.db.models.deletion.DO_NOTHING,
+                                related_name="+",
+                                to="users.courierprofile",
+                            ),
+                        ),
+                        (
+                            "customer",
+                            models.ForeignKey(
+                                db_constraint=False,
+                                on_delete=django.db.models.deletion.DO_NOTHING,
+                                related_name="+",
+                                to="users.customerprofile",
+                            ),
+                        ),
+                        (
+                            "restaurant",
+                            models.ForeignKey(
+                                db_constraint=False,
+                                on_delete=django.db.models.deletion.DO_NOTHING,
+                                related_name="+",
+                                to="users.restaurantprofile",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "ordering": ["-placed_at"],
+                        "indexes": [
+                            models.Index(
+                                fields=["customer", "-placed_at"],
+                                name="archivedorder_customer_idx",
+                            ),
+                            models.Index(
+                                fields=["restaurant", "-placed_at"],
+                                name="archivedorder_restaurant_idx",
+                            ),
+                            models.Index(
+                                fields=["courier", "-placed_at"],
+                                name="archivedorder_courier_idx",
+                            ),
+                        ],
+                    },
+                ),
+            ],
+        ),
+    ]
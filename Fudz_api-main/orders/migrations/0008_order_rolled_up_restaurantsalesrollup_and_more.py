@@ -0,0 +1,132 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0007_archivedorder"),
+        ("restaurants", "0002_initial"),
+        ("users", "0006_notificationpreference"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="rolled_up",
+            field=models.BooleanField(
+                default=False, help_text="Counted in the restaurant sales rollups"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("rolled_up", False), ("status", "delivered")),
+                fields=["placed_at"],
+                name="order_pending_rollup_idx",
+            ),
+        ),
+        migrations.CreateModel(
+            name="RestaurantSalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "bucket",
+                    models.DateTimeField(
+                        help_text="Start of the hour the orders were placed in"
+                    ),
+                ),
+                ("order_count", models.PositiveIntegerField(default=0)),
+                ("items_sold", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "discount_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "restaurant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_rollups",
+                        to="users.restaurantprofile",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["bucket"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("restaurant", "bucket"),
+                        name="unique_restaurant_sales_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PromotionSalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "bucket",
+                    models.DateTimeField(
+                        help_text="Start of the hour the orders were placed in"
+                    ),
+                ),
+                ("items_sold", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "discount_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "promotion",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_rollups",
+                        to="restaurants.promotion",
+                    ),
+                ),
+                (
+                    "restaurant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="promotion_rollups",
+                        to="users.restaurantprofile",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["bucket"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("promotion", "bucket"),
+                        name="unique_promotion_sales_bucket",
+                    )
+                ],
+            },
+        ),
+    ]
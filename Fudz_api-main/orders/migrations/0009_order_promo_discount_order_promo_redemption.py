@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0008_order_rolled_up_restaurantsalesrollup_and_more"),
+        ("restaurants", "0004_promocode_promocoderedemption"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="promo_discount",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Share of the promo code discount applied to this order",
+                max_digits=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="promo_redemption",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="orders",
+                to="restaurants.promocoderedemption",
+            ),
+        ),
+    ]
@@ -31,6 +31,8 @@ class Order(models.Model):
         ("delivered", "Delivered"),
         ("cancelled", "Cancelled"),
     ]
+    OPEN_STATUSES = ["placed", "accepted", "ready"]
+
     customer = models.ForeignKey(
         CustomerProfile, on_delete=models.CASCADE, related_name="orders"
     )
@@ -50,10 +52,58 @@ class Order(models.Model):
     payment_status = models.CharField(max_length=20, default="pending")
     placed_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    promo_redemption = models.ForeignKey(
+        'restaurants.PromoCodeRedemption',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="orders",
+    )
+    promo_discount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        help_text="Share of the promo code discount applied to this order",
+    )
+    rolled_up = models.BooleanField(
+        default=False, help_text="Counted in the restaurant sales rollups"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["placed_at"],
+                condition=models.Q(status="delivered", rolled_up=False),
+                name="order_pending_rollup_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.status}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    @property
+    def previous_status(self):
+        """Status as last loaded from / saved to the database"""
+        return getattr(self, "_loaded_status", None)
+
+    def save(self, *args, **kwargs):
+        # rolled_up is owned by orders.tasks.rollup_restaurant_sales, which sets
+        # it with queryset.update(); a full save of an instance loaded before
+        # that must not write the stale False back (the order would be counted twice)
+        if kwargs.get("update_fields") is None and not self._state.adding:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "rolled_up"
+            ]
+        super().save(*args, **kwargs)
+        self._loaded_status = self.status
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name="items")
@@ -102,6 +152,96 @@ class OrderItem(models.Model):
         return self.discount_amount * self.qty
 
 
+class ArchivedOrder(models.Model):
+    """
+    Cold copy of a delivered or cancelled order.
+
+    The table is range-partitioned by placed_at month (see migration 0007),
+    so relations are kept without database constraints.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(
+        CustomerProfile, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    restaurant = models.ForeignKey(
+        RestaurantProfile, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    courier = models.ForeignKey(
+        CourierProfile,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    pickup_location = gis_models.PointField(geography=True, null=True, blank=True)
+    dropoff_location = gis_models.PointField(geography=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20)
+    placed_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    items = models.JSONField(default=list)
+    delivery = models.JSONField(null=True, blank=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    total_discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["-placed_at"]
+        indexes = [
+            models.Index(fields=["customer", "-placed_at"], name="archivedorder_customer_idx"),
+            models.Index(fields=["restaurant", "-placed_at"], name="archivedorder_restaurant_idx"),
+            models.Index(fields=["courier", "-placed_at"], name="archivedorder_courier_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id} - {self.status}"
+
+
+class RestaurantSalesRollup(models.Model):
+    """Hourly sales totals per restaurant, filled by orders.tasks.rollup_restaurant_sales"""
+    restaurant = models.ForeignKey(
+        RestaurantProfile, on_delete=models.CASCADE, related_name="sales_rollups"
+    )
+    bucket = models.DateTimeField(help_text="Start of the hour the orders were placed in")
+    order_count = models.PositiveIntegerField(default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["bucket"]
+        constraints = [
+            models.UniqueConstraint(fields=["restaurant", "bucket"], name="unique_restaurant_sales_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant.restaurant_name} @ {self.bucket:%Y-%m-%d %H:00}"
+
+
+class PromotionSalesRollup(models.Model):
+    """Hourly totals for items sold under each Promotion"""
+    restaurant = models.ForeignKey(
+        RestaurantProfile, on_delete=models.CASCADE, related_name="promotion_rollups"
+    )
+    promotion = models.ForeignKey(
+        'restaurants.Promotion', on_delete=models.CASCADE, related_name="sales_rollups"
+    )
+    bucket = models.DateTimeField(help_text="Start of the hour the orders were placed in")
+    items_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["bucket"]
+        constraints = [
+            models.UniqueConstraint(fields=["promotion", "bucket"], name="unique_promotion_sales_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.promotion.name} @ {self.bucket:%Y-%m-%d %H:00}"
+
+
 class Notification(models.Model):
     EVENT_CHOICES = [
         ("new_order", "New Order"),
@@ -0,0 +1,21 @@
+"""
+Counter rows shared by the sales rollups and the courier earnings ledger.
+
+Kept out of orders.tasks so that callers outside Celery, such as
+delivery.earnings, don't import the task module.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def increment_rollup(model, lookup, values, defaults=None):
+    """Add ``values`` to the rollup row identified by ``lookup``, creating it if needed"""
+    increments = {field: F(field) + value for field, value in values.items()}
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **values, **(defaults or {}))
+    except IntegrityError:
+        # Another worker created the bucket first
+        model.objects.filter(**lookup).update(**increments)
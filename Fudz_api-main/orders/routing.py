@@ -3,4 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r"ws/admin-notifications/$", consumers.AdminNotificationConsumer.as_asgi()),
+    re_path(r"ws/restaurant/orders/$", consumers.RestaurantOrderConsumer.as_asgi()),
 ]
@@ -1,10 +1,24 @@
 from django.db import transaction
+from django.db.models import Prefetch
 from django.contrib.gis.geos import Point
+from django.utils import timezone
 
 from rest_framework import serializers
 
-from restaurants.models import MenuItem
-from .models import Cart, CartItem, Order, OrderItem
+from restaurants.capacity import order_prep_minutes, release_kitchen_capacity, reserve_kitchen_capacity
+from restaurants.models import MenuItem, PromoCodeRedemption, Promotion
+from restaurants.promo_codes import (
+    PromoCodeError,
+    allocate_discount,
+    get_redeemable_code,
+    promo_discount,
+    release_promo_code,
+    reserve_promo_code,
+)
+from restaurants.tasks import sync_promo_code_usage
+from .eta import get_ready_eta
+from .models import ArchivedOrder, Cart, CartItem, Order, OrderItem
+from .signals import orders_placed
 from users.models import CustomerProfile
 
 class SimpleMenuSerializer(serializers.ModelSerializer):
@@ -131,6 +145,7 @@ class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     total_discount = serializers.SerializerMethodField()
     total_amount = serializers.SerializerMethodField()
+    ready_eta = serializers.SerializerMethodField()
     
     class Meta:
         model = Order
@@ -145,7 +160,9 @@ class OrderSerializer(serializers.ModelSerializer):
             'payment_status', 
             'items',
             'total_discount',
-            'total_amount'
+            'promo_discount',
+            'total_amount',
+            'ready_eta',
             ]
         
     def get_total_discount(self, obj):
@@ -160,9 +177,36 @@ class OrderSerializer(serializers.ModelSerializer):
         return float(sum(
             item.unit_price * item.qty 
             for item in obj.items.all()
-        ))
+        ) - obj.promo_discount)
+    
+    def get_ready_eta(self, obj):
+        """Estimated time the kitchen will have the order ready"""
+        if obj.status not in Order.OPEN_STATUSES:
+            return None
+        return get_ready_eta(obj.id)
  
 
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            'id',
+            'customer',
+            'restaurant',
+            'courier',
+            'pickup_location',
+            'dropoff_location',
+            'placed_at',
+            'status',
+            'payment_status',
+            'items',
+            'delivery',
+            'total_discount',
+            'total_amount',
+            'archived_at',
+        ]
+
+
 class UpdateOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -172,6 +216,13 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
     dropoff_location = serializers.JSONField(required=False)
+    promo_code = serializers.CharField(required=False)
+    
+    def validate_promo_code(self, code):
+        try:
+            return get_redeemable_code(code)
+        except PromoCodeError as e:
+            raise serializers.ValidationError(str(e))
     
     def validate_cart_id(self, cart_id):
         if not Cart.objects.filter(pk=cart_id).exists():
@@ -180,69 +231,136 @@ class CreateOrderSerializer(serializers.Serializer):
             raise serializers.ValidationError("The cart is empty.")
         return cart_id
     
+    def price_cart(self, cart_items):
+        """
+        Price every cart line in one pass. Active promotions are prefetched
+        with the cart, so no per-item promotion queries are made.
+        """
+        lines = []
+        for item in cart_items:
+            menu_item = item.menu_item
+            active_promotion = menu_item.active_promotions[0] if menu_item.active_promotions else None
+            offer_price = menu_item.apply_promotion(active_promotion)
+
+            lines.append({
+                'menu_item': menu_item,
+                'qty': item.qty,
+                'unit_price': offer_price,
+                'original_price': menu_item.price,
+                'applied_promotion': active_promotion,
+                'discount_amount': menu_item.price - offer_price,
+            })
+        return lines
+    
     def save(self, **kwargs):
-        with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-            dropoff_location = self.validated_data.get('dropoff_location')
+        """
+        Create one order per restaurant in the cart and return the list of
+        orders. Each order then gets its own DeliveryRequest when accepted.
+        """
+        reservations = []
+        promo_reservation = []
+        try:
+            with transaction.atomic():
+                cart_id = self.validated_data['cart_id']
+                dropoff_location = self.validated_data.get('dropoff_location')
+                promo_code = self.validated_data.get('promo_code')
             
-            customer, created = CustomerProfile.objects.get_or_create(
-                user_id=self.context['user_id']
-            )
+                customer, created = CustomerProfile.objects.get_or_create(
+                    user_id=self.context['user_id']
+                )
 
-            cart_items = CartItem.objects.filter(cart_id=cart_id).select_related('menu_item__restaurant').all()
+                now = timezone.now()
+                cart_items = list(
+                    CartItem.objects.filter(cart_id=cart_id)
+                    .select_related('menu_item__restaurant')
+                    .prefetch_related(Prefetch(
+                        'menu_item__promotions',
+                        queryset=Promotion.objects.filter(
+                            is_active=True, start_date__lte=now, end_date__gte=now
+                        ).order_by('-discount'),
+                        to_attr='active_promotions',
+                    ))
+                )
             
-            if not cart_items:
-                raise serializers.ValidationError("Cart is empty.")
- 
-            restaurant = cart_items[0].menu_item.restaurant
+                if not cart_items:
+                    raise serializers.ValidationError("Cart is empty.")
             
-            if dropoff_location:
-                lat = float(dropoff_location['latitude'])
-                lng = float(dropoff_location['longitude'])
-                address = dropoff_location['address']
+                if dropoff_location:
+                    lat = float(dropoff_location['latitude'])
+                    lng = float(dropoff_location['longitude'])
+                    address = dropoff_location['address']
                 
-                point = Point(lng, lat)
-
-            # for item in cart_items:
-            #     if item.menu_item.restaurant_id != restaurant.id:
-            #         raise serializers.ValidationError(
-            #             "All items in the cart must be from the same restaurant."
-            #         )
-
-            order = Order.objects.create(
-                customer=customer,
-                dropoff_location=point if dropoff_location else customer.current_location,
-                restaurant=restaurant,
-                pickup_location=restaurant.location if hasattr(restaurant, 'location') else None
-            )
+                    point = Point(lng, lat)
+
+                lines_by_restaurant = {}
+                for line in self.price_cart(cart_items):
+                    lines_by_restaurant.setdefault(line['menu_item'].restaurant, []).append(line)
+
+                for restaurant, lines in lines_by_restaurant.items():
+                    reservation, wait_minutes = reserve_kitchen_capacity(
+                        restaurant.id,
+                        order_prep_minutes((line['menu_item'], line['qty']) for line in lines),
+                    )
+                    if reservation is None:
+                        raise serializers.ValidationError(
+                            f"{restaurant.restaurant_name} is busy, estimated wait {wait_minutes} min."
+                        )
+                    reservations.append(reservation)
+
+                redemption = None
+                promo_shares = {}
+                if promo_code:
+                    eligible = [
+                        restaurant for restaurant in lines_by_restaurant
+                        if promo_code.restaurant_id in (None, restaurant.id)
+                    ]
+                    if not eligible:
+                        raise serializers.ValidationError("This promo code does not apply to the items in your cart.")
+
+                    subtotals = [
+                        sum(line['unit_price'] * line['qty'] for line in lines_by_restaurant[restaurant])
+                        for restaurant in eligible
+                    ]
+                    discount = promo_discount(promo_code, sum(subtotals))
+
+                    try:
+                        promo_reservation = reserve_promo_code(promo_code, customer.id)
+                    except PromoCodeError as e:
+                        raise serializers.ValidationError(str(e))
+
+                    redemption = PromoCodeRedemption.objects.create(
+                        promo_code=promo_code, customer=customer, discount_amount=discount
+                    )
+                    promo_shares = dict(zip(eligible, allocate_discount(discount, subtotals)))
+                    transaction.on_commit(lambda: sync_promo_code_usage.delay(promo_code.id))
+
+                orders = Order.objects.bulk_create([
+                    Order(
+                        customer=customer,
+                        dropoff_location=point if dropoff_location else customer.current_location,
+                        restaurant=restaurant,
+                        pickup_location=restaurant.location if hasattr(restaurant, 'location') else None,
+                        promo_redemption=redemption if restaurant in promo_shares else None,
+                        promo_discount=promo_shares.get(restaurant, 0),
+                    )
+                    for restaurant in lines_by_restaurant
+                ])
             
-            order_items = []
-            for item in cart_items:
-                menu_item = item.menu_item
-                
-                offer_price = menu_item.get_offer_price()
-                original_price = menu_item.price
-                discount = original_price - offer_price
-                
-                active_promotion = menu_item.get_active_promotion()
-                
-                order_item = OrderItem(
-                    order=order,
-                    menu_item=menu_item,
-                    qty=item.qty,
-                    unit_price=offer_price, 
-                    original_price=original_price,
-                    applied_promotion=active_promotion,
-                    discount_amount=discount
-                )
-                order_items.append(order_item)
-                
-                if active_promotion:
-                    print(f"✅ Applied {active_promotion.discount}% discount to {menu_item.title}")
-                    print(f"   Original: ${original_price}, Now: ${offer_price}")
+                order_items = []
+                for order, lines in zip(orders, lines_by_restaurant.values()):
+                    order_items.extend(OrderItem(order=order, **line) for line in lines)
             
-            OrderItem.objects.bulk_create(order_items)
+                OrderItem.objects.bulk_create(order_items)
+
+                Cart.objects.filter(id=cart_id).delete()
 
-            Cart.objects.filter(id=cart_id).delete()
+                # bulk_create skips post_save, which drives notifications,
+                # the restaurant order stream and ready estimates.
+                orders_placed(orders)
             
-            return order
\ No newline at end of file
+                return orders
+        except Exception:
+            for reservation in reservations:
+                release_kitchen_capacity(reservation)
+            release_promo_code(promo_reservation)
+            raise
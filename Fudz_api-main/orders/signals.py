@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.core.mail import send_mail
@@ -5,6 +6,8 @@ from django.contrib.auth import get_user_model
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
+from .consumers import compact_orders, restaurant_orders_group
+from .eta import order_accepted, order_left_kitchen, order_placed
 from .models import Notification, Order
 from users.models import User
 from users.services import send_normal_email
@@ -112,4 +115,67 @@ def customer_order_notification(sender, instance, created, **kwargs):
         "no-reply@foodapp.com",
         [customer.email],
         fail_silently=True,
-    )
\ No newline at end of file
+    )
+
+
+@receiver(post_save, sender=Order)
+def restaurant_order_stream(sender, instance, created, **kwargs):
+    """Push compact order events to the restaurant dashboard stream"""
+    if not created and instance.previous_status == instance.status:
+        return
+
+    group_name = restaurant_orders_group(instance.restaurant_id)
+    order_id = instance.id
+
+    payload = {
+        "id": order_id,
+        "status": instance.status,
+        "previous_status": instance.previous_status,
+        "updated_at": instance.updated_at.isoformat(),
+    }
+
+    def send_event():
+        # Items are bulk-created after the order row, so a new order is
+        # only summarised once the checkout transaction has committed.
+        if created:
+            rows = compact_orders(Order.objects.filter(id=order_id))
+            if not rows:
+                return
+            event = {"type": "order_event", "event": "order_created", "order": rows[0]}
+        else:
+            event = {"type": "order_event", "event": "order_status_changed", "order": payload}
+
+        channel_layer = get_channel_layer()
+        async_to_sync(channel_layer.group_send)(group_name, event)
+
+    transaction.on_commit(send_event)
+
+
+@receiver(post_save, sender=Order)
+def update_ready_eta(sender, instance, created, **kwargs):
+    """Keep the kitchen queue and ready estimates in step with order status"""
+    if created:
+        transaction.on_commit(lambda: order_placed(instance))
+        return
+
+    previous_status = instance.previous_status
+    if previous_status == instance.status:
+        return
+
+    if instance.status == "accepted":
+        transaction.on_commit(lambda: order_accepted(instance))
+    elif previous_status == "accepted" or instance.status == "cancelled":
+        transaction.on_commit(lambda: order_left_kitchen(instance))
+
+
+def orders_placed(orders):
+    """
+    Run the new-order handlers above for orders inserted with bulk_create,
+    which sends no post_save. Call it inside the checkout transaction.
+    """
+    for order in orders:
+        order._loaded_status = order.status
+        order_notification(Order, order, created=True)
+        customer_order_notification(Order, order, created=True)
+        restaurant_order_stream(Order, order, created=True)
+        update_ready_eta(Order, order, created=True)
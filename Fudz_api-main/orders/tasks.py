@@ -0,0 +1,203 @@
+from celery import shared_task
+from dateutil.relativedelta import relativedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem, PromotionSalesRollup, RestaurantSalesRollup
+from .rollups import increment_rollup
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def ensure_archive_partition(start):
+    """Create the monthly archive partition starting at ``start`` if it is missing"""
+    end = start + relativedelta(months=1)
+    name = f"orders_archivedorder_{start:%Y_%m}"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF orders_archivedorder "
+            "FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+
+def build_archived_order(order):
+    items = list(order.items.all())
+    try:
+        delivery = order.delivery_request
+    except Order.delivery_request.RelatedObjectDoesNotExist:
+        delivery = None
+
+    return ArchivedOrder(
+        id=order.id,
+        customer_id=order.customer_id,
+        restaurant_id=order.restaurant_id,
+        courier_id=order.courier_id,
+        pickup_location=order.pickup_location,
+        dropoff_location=order.dropoff_location,
+        status=order.status,
+        payment_status=order.payment_status,
+        placed_at=order.placed_at,
+        updated_at=order.updated_at,
+        items=[
+            {
+                "menu_item_id": item.menu_item_id,
+                "title": item.menu_item.title,
+                "qty": item.qty,
+                "unit_price": str(item.unit_price),
+                "original_price": str(item.original_price) if item.original_price is not None else None,
+                "discount_amount": str(item.discount_amount),
+                "applied_promotion_id": item.applied_promotion_id,
+            }
+            for item in items
+        ],
+        delivery={
+            "id": delivery.id,
+            "courier_id": delivery.courier_id,
+            "status": delivery.status,
+            "assigned_at": delivery.assigned_at.isoformat() if delivery.assigned_at else None,
+            "route_trail": delivery.route_trail.coords if delivery.route_trail else None,
+        } if delivery else None,
+        total_amount=sum((item.unit_price * item.qty for item in items), 0) - order.promo_discount,
+        total_discount=sum((item.discount_amount * item.qty for item in items), 0),
+    )
+
+
+@shared_task
+def archive_finished_orders(batch_size=500):
+    """
+    Move delivered/cancelled orders older than ORDER_ARCHIVE_AFTER_MONTHS
+    into the partitioned archive table, keeping the live tables small.
+    Run this daily via Celery Beat
+    """
+    cutoff = timezone.now() - relativedelta(months=settings.ORDER_ARCHIVE_AFTER_MONTHS)
+    known_partitions = set()
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            # Delivered orders wait until they are counted in the sales rollups
+            orders = list(
+                Order.objects.filter(
+                    Q(status="cancelled") | Q(status="delivered", rolled_up=True),
+                    placed_at__lt=cutoff,
+                )
+                .select_related("delivery_request")
+                .prefetch_related("items__menu_item")
+                .select_for_update(skip_locked=True, of=("self",))
+                .order_by("placed_at")[:batch_size]
+            )
+            if not orders:
+                break
+
+            for order in orders:
+                start = month_start(order.placed_at)
+                if start not in known_partitions:
+                    ensure_archive_partition(start)
+                    known_partitions.add(start)
+
+            ArchivedOrder.objects.bulk_create(
+                [build_archived_order(order) for order in orders], ignore_conflicts=True
+            )
+
+            order_ids = [order.id for order in orders]
+            OrderItem.objects.filter(order_id__in=order_ids).delete()
+            Order.objects.filter(id__in=order_ids).delete()
+
+        total += len(orders)
+        if len(orders) < batch_size:
+            break
+
+    print(f"✅ Archived {total} orders")
+    return f"Archived {total} orders"
+
+
+@shared_task
+def rollup_restaurant_sales(batch_size=1000):
+    """
+    Fold newly delivered orders into the hourly restaurant and promotion
+    rollups. Each order is counted exactly once (Order.rolled_up).
+    Run this every few minutes via Celery Beat
+    """
+    line_total = F("unit_price") * F("qty")
+    line_discount = F("discount_amount") * F("qty")
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                Order.objects.filter(status="delivered", rolled_up=False)
+                .select_for_update(skip_locked=True)
+                .order_by("placed_at")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+
+            items = OrderItem.objects.filter(order_id__in=order_ids).annotate(
+                bucket=TruncHour("order__placed_at")
+            )
+
+            # Promo codes discount whole orders, not lines; take them off the revenue
+            promo_discounts = {
+                (row["restaurant_id"], row["bucket"]): row["promo_total"]
+                for row in Order.objects.filter(id__in=order_ids, promo_discount__gt=0)
+                .annotate(bucket=TruncHour("placed_at"))
+                .values("restaurant_id", "bucket")
+                .annotate(promo_total=Sum("promo_discount"))
+            }
+
+            sales = items.values("order__restaurant_id", "bucket").annotate(
+                order_count=Count("order_id", distinct=True),
+                items_sold=Sum("qty"),
+                revenue=Sum(line_total, output_field=DecimalField()),
+                discount_total=Sum(line_discount, output_field=DecimalField()),
+            )
+            for row in sales:
+                increment_rollup(
+                    RestaurantSalesRollup,
+                    {"restaurant_id": row["order__restaurant_id"], "bucket": row["bucket"]},
+                    {
+                        "order_count": row["order_count"],
+                        "items_sold": row["items_sold"],
+                        "revenue": row["revenue"]
+                        - promo_discounts.get((row["order__restaurant_id"], row["bucket"]), 0),
+                        "discount_total": row["discount_total"],
+                    },
+                )
+
+            promotion_sales = (
+                items.filter(applied_promotion__isnull=False)
+                .values("order__restaurant_id", "applied_promotion_id", "bucket")
+                .annotate(
+                    items_sold=Sum("qty"),
+                    revenue=Sum(line_total, output_field=DecimalField()),
+                    discount_total=Sum(line_discount, output_field=DecimalField()),
+                )
+            )
+            for row in promotion_sales:
+                increment_rollup(
+                    PromotionSalesRollup,
+                    {"promotion_id": row["applied_promotion_id"], "bucket": row["bucket"]},
+                    {
+                        "items_sold": row["items_sold"],
+                        "revenue": row["revenue"],
+                        "discount_total": row["discount_total"],
+                    },
+                    defaults={"restaurant_id": row["order__restaurant_id"]},
+                )
+
+            Order.objects.filter(id__in=order_ids).update(rolled_up=True)
+
+        total += len(order_ids)
+        if len(order_ids) < batch_size:
+            break
+
+    print(f"✅ Rolled up {total} delivered orders")
+    return f"Rolled up {total} delivered orders"
@@ -1,3 +1,89 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import ValidationError
+
+from . import signals, views
+from .eta import QueueLockTimeout, queue_lock, schedule
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class ScheduleTests(SimpleTestCase):
+    def test_parallel_stations_first_come_first_served(self):
+        queue = {1: (0, 600), 2: (10, 300), 3: (20, 300)}
+        ready, free_at = schedule(queue, stations=2, now=0)
+        self.assertEqual(ready, {1: 600, 2: 310, 3: 610})
+        self.assertEqual(free_at, 600)
+
+    def test_late_orders_are_ready_now(self):
+        ready, free_at = schedule({1: (0, 60)}, stations=1, now=1000)
+        self.assertEqual(ready, {1: 1000})
+        self.assertEqual(free_at, 1000)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class QueueLockTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lock_is_released(self):
+        with queue_lock(1):
+            self.assertIsNotNone(cache.get("order_eta_lock_1"))
+        self.assertIsNone(cache.get("order_eta_lock_1"))
+
+    @mock.patch("orders.eta.time.sleep")
+    def test_held_lock_raises_and_is_left_alone(self, sleep):
+        cache.set("order_eta_lock_1", "other-process", timeout=5)
+        with self.assertRaises(QueueLockTimeout):
+            with queue_lock(1):
+                pass
+        self.assertEqual(cache.get("order_eta_lock_1"), "other-process")
+
+    def test_expired_lock_taken_by_another_process_is_not_deleted(self):
+        with queue_lock(1):
+            cache.set("order_eta_lock_1", "other-process", timeout=5)
+        self.assertEqual(cache.get("order_eta_lock_1"), "other-process")
+
+
+class OrdersPlacedTests(SimpleTestCase):
+    def test_runs_the_new_order_handlers(self):
+        order = SimpleNamespace(status="pending")
+        handlers = ["order_notification", "customer_order_notification", "restaurant_order_stream", "update_ready_eta"]
+        with mock.patch.multiple(signals, **{name: mock.DEFAULT for name in handlers}) as mocks:
+            signals.orders_placed([order])
+
+        for name in handlers:
+            mocks[name].assert_called_once_with(signals.Order, order, created=True)
+        self.assertEqual(order._loaded_status, "pending")
+
+
+class Rows(list):
+    """Stands in for the export's values_list queryset: rows of (id, ...)"""
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.pages_after = []
+
+    def filter(self, id__gt):
+        self.pages_after.append(id__gt)
+        return [row for row in self if row[0] > id__gt]
+
+
+class OrderExportTests(SimpleTestCase):
+    def view(self, **params):
+        view = views.OrderExportView()
+        view.request = SimpleNamespace(query_params=params, user=SimpleNamespace(is_staff=True))
+        return view
+
+    @override_settings(ORDER_EXPORT_CHUNK_SIZE=2)
+    def test_rows_are_paged_by_id(self):
+        rows = Rows([(1, "a"), (2, "b"), (5, "c"), (8, "d")])
+        self.assertEqual(list(self.view().iterate_rows(rows)), list(rows))
+        self.assertEqual(rows.pages_after, [0, 2, 8])
+
+    def test_unknown_status_is_rejected(self):
+        with self.assertRaises(ValidationError) as raised:
+            self.view(status="delivered,shipped").get_export_queryset()
+        self.assertIn("shipped", str(raised.exception.detail["status"]))
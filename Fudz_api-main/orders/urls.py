@@ -12,4 +12,8 @@ carts_router = routers.NestedDefaultRouter(router, 'carts', lookup='cart')
 carts_router.register('items', views.CartItemViewSet, basename='cart-items')
 
 
-urlpatterns = router.urls + carts_router.urls
+urlpatterns = [
+    path('reports/sales/', views.SalesReportView.as_view(), name='sales-report'),
+    path('reports/promotions/', views.PromotionReportView.as_view(), name='promotion-report'),
+    path('export/', views.OrderExportView.as_view(), name='order-export'),
+] + router.urls + carts_router.urls
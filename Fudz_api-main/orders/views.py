@@ -1,16 +1,30 @@
+import csv
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import TruncDay
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from rest_framework import status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.generics import GenericAPIView
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 
 from delivery.models import DeliveryRequest
 from delivery.tasks import auto_assign_courier
-from .models import Cart, CartItem, Order
-from .serializers import CartSerializer, CartItemSerializer, AddCartItemSerializer, OrderSerializer, UpdateCartItemSerializer, CreateOrderSerializer, UpdateOrderSerializer
+from .models import ArchivedOrder, Cart, CartItem, Order, PromotionSalesRollup, RestaurantSalesRollup
+from .serializers import ArchivedOrderSerializer, CartSerializer, CartItemSerializer, AddCartItemSerializer, OrderSerializer, UpdateCartItemSerializer, CreateOrderSerializer, UpdateOrderSerializer
 
 
 class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
@@ -38,6 +52,12 @@ class CartItemViewSet(ModelViewSet):
         return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('menu_item').all()
     
     
+class OrderHistoryPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
 class OrderViewSet(ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
     
@@ -49,9 +69,9 @@ class OrderViewSet(ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = CreateOrderSerializer(data=request.data, context={'user_id': self.request.user.id})
         serializer.is_valid(raise_exception=True)
-        order = serializer.save()
-        serializer = OrderSerializer(order)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        orders = serializer.save()
+        # One order per restaurant in the cart, always as a list
+        return Response(OrderSerializer(orders, many=True).data, status=status.HTTP_201_CREATED)
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -74,12 +94,34 @@ class OrderViewSet(ModelViewSet):
 
         return Order.objects.none()
     
+    def get_archived_queryset(self):
+        user = self.request.user
+        if user.is_staff:
+            return ArchivedOrder.objects.all()
+
+        if hasattr(user, 'customer_profile'):
+            return ArchivedOrder.objects.filter(customer=user.customer_profile)
+        if hasattr(user, 'restaurant_profile'):
+            return ArchivedOrder.objects.filter(restaurant=user.restaurant_profile)
+        if hasattr(user, 'courier_profile'):
+            return ArchivedOrder.objects.filter(courier=user.courier_profile)
+
+        return ArchivedOrder.objects.none()
+    
+    @action(detail=False, methods=["get"])
+    def history(self, request):
+        """Archived (delivered/cancelled) orders moved out of the live tables"""
+        paginator = OrderHistoryPagination()
+        page = paginator.paginate_queryset(self.get_archived_queryset(), request, view=self)
+        serializer = ArchivedOrderSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
     
     @action(detail=True, methods=["post"])
     def accept(self, request, pk=None):
         order = self.get_object()
         order.status = "accepted"
-        order.save()
+        order.save(update_fields=["status", "updated_at"])
 
         delivery = DeliveryRequest.objects.create(
             order=order,
@@ -94,3 +136,201 @@ class OrderViewSet(ModelViewSet):
         return Response(
             {"message": "Order accepted and delivery request created"}
         )
+
+
+class RestaurantReportMixin:
+    """Common filtering for reports served from the sales rollup tables"""
+    permission_classes = [IsAuthenticated]
+
+    def get_restaurant_filter(self):
+        user = self.request.user
+        if user.is_staff:
+            restaurant_id = self.request.query_params.get('restaurant')
+            if not restaurant_id:
+                return {}
+            if not restaurant_id.isdigit():
+                raise ValidationError({'restaurant': "Must be a restaurant id."})
+            return {'restaurant_id': int(restaurant_id)}
+        if hasattr(user, 'restaurant_profile'):
+            return {'restaurant': user.restaurant_profile}
+        raise PermissionDenied("Only restaurants and admins can view sales reports.")
+
+    def parse_bound(self, name, default):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValidationError({name: "Use an ISO 8601 date or datetime."})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def get_rollups(self, model):
+        granularity = self.request.query_params.get('granularity', 'hour')
+        if granularity not in ('hour', 'day'):
+            raise ValidationError({'granularity': "Must be 'hour' or 'day'."})
+
+        end = self.parse_bound('end', timezone.now())
+        start = self.parse_bound('start', end - timedelta(days=7))
+
+        rollups = model.objects.filter(
+            bucket__gte=start, bucket__lt=end, **self.get_restaurant_filter()
+        )
+        if granularity == 'day':
+            return rollups.annotate(period=TruncDay('bucket'))
+        return rollups.annotate(period=F('bucket'))
+
+
+class SalesReportView(RestaurantReportMixin, GenericAPIView):
+    """Revenue, items sold, discounts and average ticket by hour or day"""
+
+    def get(self, request):
+        rows = (
+            self.get_rollups(RestaurantSalesRollup)
+            .values('period')
+            .annotate(
+                order_count=Sum('order_count'),
+                items_sold=Sum('items_sold'),
+                revenue=Sum('revenue'),
+                discount_total=Sum('discount_total'),
+            )
+            .order_by('period')
+        )
+
+        return Response([
+            {
+                'period': row['period'],
+                'order_count': row['order_count'],
+                'items_sold': row['items_sold'],
+                'revenue': float(row['revenue']),
+                'discount_total': float(row['discount_total']),
+                'average_ticket': float(row['revenue'] / row['order_count']) if row['order_count'] else 0,
+            }
+            for row in rows
+        ])
+
+
+class PromotionReportView(RestaurantReportMixin, GenericAPIView):
+    """Items sold, revenue and discount given per Promotion by hour or day"""
+
+    def get(self, request):
+        rows = (
+            self.get_rollups(PromotionSalesRollup)
+            .values('period', 'promotion_id', 'promotion__name')
+            .annotate(
+                items_sold=Sum('items_sold'),
+                revenue=Sum('revenue'),
+                discount_total=Sum('discount_total'),
+            )
+            .order_by('period', 'promotion_id')
+        )
+
+        return Response([
+            {
+                'period': row['period'],
+                'promotion_id': row['promotion_id'],
+                'promotion_name': row['promotion__name'],
+                'items_sold': row['items_sold'],
+                'revenue': float(row['revenue']),
+                'discount_total': float(row['discount_total']),
+            }
+            for row in rows
+        ])
+
+
+class Echo:
+    """File-like object that hands back what csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+class OrderExportView(RestaurantReportMixin, GenericAPIView):
+    """
+    Stream orders as CSV or NDJSON in keyset pages of
+    ORDER_EXPORT_CHUNK_SIZE rows, so memory stays flat regardless of the
+    number of rows exported. Each page is a plain query: server-side
+    cursors don't survive the transaction-mode connection pooler.
+    """
+    columns = [
+        'id',
+        'placed_at',
+        'status',
+        'payment_status',
+        'restaurant_id',
+        'restaurant__restaurant_name',
+        'customer_id',
+        'courier_id',
+        'item_count',
+        'total_discount',
+        'total_amount',
+    ]
+
+    def get_export_queryset(self):
+        orders = Order.objects.filter(**self.get_restaurant_filter())
+
+        start = self.parse_bound('start', None)
+        end = self.parse_bound('end', None)
+        if start:
+            orders = orders.filter(placed_at__gte=start)
+        if end:
+            orders = orders.filter(placed_at__lt=end)
+
+        statuses = self.request.query_params.get('status')
+        if statuses:
+            statuses = statuses.split(',')
+            known = {value for value, _ in Order.STATUS_CHOICES}
+            unknown = [value for value in statuses if value not in known]
+            if unknown:
+                raise ValidationError({'status': f"Unknown status: {', '.join(unknown)}."})
+            orders = orders.filter(status__in=statuses)
+
+        return (
+            orders.annotate(
+                item_count=Sum('items__qty'),
+                total_discount=Sum(F('items__discount_amount') * F('items__qty'), output_field=DecimalField()),
+                total_amount=Sum(F('items__unit_price') * F('items__qty'), output_field=DecimalField())
+                - F('promo_discount'),
+            )
+            .order_by('id')
+            .values_list(*self.columns)
+        )
+
+    def iterate_rows(self, rows):
+        """Page through ``rows`` by id (the first column)"""
+        chunk_size = settings.ORDER_EXPORT_CHUNK_SIZE
+        last_id = 0
+        while True:
+            chunk = list(rows.filter(id__gt=last_id)[:chunk_size])
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            last_id = chunk[-1][0]
+
+    def stream_csv(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.columns)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def stream_ndjson(self, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(self.columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+    def get(self, request):
+        # "format" is reserved by DRF's format suffix handling
+        output = request.query_params.get('output', 'csv')
+        if output not in ('csv', 'ndjson'):
+            raise ValidationError({'output': "Must be 'csv' or 'ndjson'."})
+
+        rows = self.iterate_rows(self.get_export_queryset())
+        timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
+
+        if output == 'csv':
+            response = StreamingHttpResponse(self.stream_csv(rows), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(self.stream_ndjson(rows), content_type='application/x-ndjson')
+
+        response['Content-Disposition'] = f'attachment; filename="orders-{timestamp}.{output}"'
+        return response
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
-from .models import MenuCategoryImage, Promotion, MenuCategory, MenuItem, MenuItemImage
+from .models import KitchenCapacity, MenuCategoryImage, Promotion, PromoCode, MenuCategory, MenuItem, MenuItemImage
 
 class MenuCategoryImageInline(admin.TabularInline):
     model = MenuCategoryImage
@@ -83,3 +83,20 @@ class PromotionAdmin(admin.ModelAdmin):
         return obj.is_active and obj.start_date <= now <= obj.end_date
     is_current.boolean = True
     is_current.short_description = 'Currently Active'
+
+
+@admin.register(KitchenCapacity)
+class KitchenCapacityAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["restaurant"]
+    list_display = ["restaurant", "slot_minutes", "max_orders_per_slot", "max_prep_minutes_per_slot", "updated_at"]
+    list_select_related = ["restaurant"]
+
+
+@admin.register(PromoCode)
+class PromoCodeAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["restaurant"]
+    list_display = ["code", "restaurant", "discount", "redemptions_count", "max_redemptions", "max_redemptions_per_customer", "start_date", "end_date", "is_active"]
+    list_filter = ["is_active", "start_date", "end_date"]
+    list_select_related = ["restaurant"]
+    readonly_fields = ["redemptions_count"]
+    search_fields = ["code"]
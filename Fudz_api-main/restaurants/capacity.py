@@ -0,0 +1,109 @@
+from math import ceil
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .counters import release_counter, reserve_counter
+from .models import KitchenCapacity
+
+
+def capacity_cache_key(restaurant_id):
+    return f"kitchen_capacity_{restaurant_id}"
+
+
+def get_kitchen_capacity(restaurant_id):
+    """Cached capacity settings for a restaurant, or None when it has no limits"""
+    key = capacity_cache_key(restaurant_id)
+    capacity = cache.get(key)
+    if capacity is None:
+        capacity = KitchenCapacity.objects.filter(restaurant_id=restaurant_id).values(
+            "slot_minutes", "max_orders_per_slot", "max_prep_minutes_per_slot"
+        ).first() or {}
+        cache.set(key, capacity, timeout=60 * 10)
+    return capacity or None
+
+
+def current_slot(capacity):
+    """Index of the running slot and the seconds left in it"""
+    slot_seconds = capacity["slot_minutes"] * 60
+    now = int(timezone.now().timestamp())
+    return now // slot_seconds, slot_seconds - now % slot_seconds
+
+
+def slot_counter_keys(restaurant_id, slot):
+    return f"kitchen_{restaurant_id}_{slot}_orders", f"kitchen_{restaurant_id}_{slot}_prep"
+
+
+def order_prep_minutes(lines):
+    """Kitchen work in an order: item prep time x quantity, for (menu_item, qty) pairs"""
+    return sum(
+        (menu_item.prep_time_minutes or settings.DEFAULT_PREP_TIME_MINUTES) * qty
+        for menu_item, qty in lines
+    )
+
+
+def estimated_wait_minutes(restaurant_id, slot_seconds_left=0):
+    """Wait for a new order: the kitchen queue, or the end of a full slot if later"""
+    from orders.eta import kitchen_wait_seconds
+
+    return ceil(max(kitchen_wait_seconds(restaurant_id), slot_seconds_left) / 60)
+
+
+def reserve_kitchen_capacity(restaurant_id, prep_minutes):
+    """
+    Count an order against the restaurant's running slot.
+
+    Returns ``(reservation, wait_minutes)``. ``reservation`` is None when the
+    kitchen is full; otherwise pass it to release_kitchen_capacity if the
+    order is not created after all.
+    """
+    capacity = get_kitchen_capacity(restaurant_id)
+    if capacity is None:
+        return [], 0
+
+    slot, seconds_left = current_slot(capacity)
+    orders_key, prep_key = slot_counter_keys(restaurant_id, slot)
+    timeout = capacity["slot_minutes"] * 60 * 2
+
+    reservation = []
+    for key, amount, limit in [
+        (orders_key, 1, capacity["max_orders_per_slot"]),
+        (prep_key, prep_minutes, capacity["max_prep_minutes_per_slot"]),
+    ]:
+        if limit is None:
+            continue
+        if not reserve_counter(key, amount, limit, timeout):
+            release_kitchen_capacity(reservation)
+            return None, estimated_wait_minutes(restaurant_id, seconds_left)
+        reservation.append((key, amount))
+
+    return reservation, 0
+
+
+def release_kitchen_capacity(reservation):
+    for key, amount in reservation or []:
+        release_counter(key, amount)
+
+
+def kitchen_status(restaurant_id):
+    """Whether the kitchen is taking orders right now, and the wait if it is not"""
+    capacity = get_kitchen_capacity(restaurant_id)
+    if capacity is None:
+        return {"busy": False, "estimated_wait_minutes": estimated_wait_minutes(restaurant_id)}
+
+    slot, seconds_left = current_slot(capacity)
+    orders_key, prep_key = slot_counter_keys(restaurant_id, slot)
+    counters = cache.get_many([orders_key, prep_key])
+
+    max_orders = capacity["max_orders_per_slot"]
+    max_prep = capacity["max_prep_minutes_per_slot"]
+    busy = (
+        (max_orders is not None and counters.get(orders_key, 0) >= max_orders)
+        or (max_prep is not None and counters.get(prep_key, 0) >= max_prep)
+    )
+
+    return {
+        "busy": busy,
+        "estimated_wait_minutes": estimated_wait_minutes(restaurant_id, seconds_left if busy else 0),
+    }
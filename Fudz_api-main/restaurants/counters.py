@@ -0,0 +1,33 @@
+from django.core.cache import cache
+
+
+def reserve_counter(key, amount, limit, timeout):
+    """
+    Atomically add ``amount`` to the Redis counter ``key`` unless that takes it
+    over ``limit``. A reservation into an empty counter always succeeds, so a
+    single request bigger than the limit is not rejected forever.
+    Returns True when the amount was reserved.
+    """
+    for _ in range(3):
+        cache.add(key, 0, timeout=timeout)
+        try:
+            value = cache.incr(key, amount)
+        except ValueError:
+            # Key expired between add() and incr(); another worker may
+            # re-create it first, so go through the limit check again
+            continue
+
+        if value > limit and value != amount:
+            cache.decr(key, amount)
+            return False
+        return True
+    return False
+
+
+def release_counter(key, amount):
+    """Give back an amount taken with reserve_counter"""
+    try:
+        cache.decr(key, amount)
+    except ValueError:
+        # Counter already expired, nothing to give back
+        pass
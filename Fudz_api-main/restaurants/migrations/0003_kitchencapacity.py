@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:00
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurants", "0002_initial"),
+        ("users", "0006_notificationpreference"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KitchenCapacity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "slot_minutes",
+                    models.PositiveIntegerField(
+                        default=15,
+                        validators=[django.core.validators.MinValueValidator(1)],
+                    ),
+                ),
+                (
+                    "max_orders_per_slot",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Orders accepted per slot. Leave empty for no limit",
+                        null=True,
+                    ),
+                ),
+                (
+                    "max_prep_minutes_per_slot",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Total item prep minutes accepted per slot. Leave empty for no limit",
+                        null=True,
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "restaurant",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="kitchen_capacity",
+                        to="users.restaurantprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Kitchen Capacities",
+            },
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:00
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurants", "0003_kitchencapacity"),
+        ("users", "0006_notificationpreference"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PromoCode",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("code", models.CharField(max_length=50, unique=True)),
+                ("description", models.CharField(blank=True, max_length=225)),
+                (
+                    "discount",
+                    models.FloatField(
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(100.0),
+                        ]
+                    ),
+                ),
+                (
+                    "max_discount_amount",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "max_redemptions",
+                    models.PositiveIntegerField(
+                        blank=True, help_text="Leave empty for no global cap", null=True
+                    ),
+                ),
+                ("max_redemptions_per_customer", models.PositiveIntegerField(default=1)),
+                (
+                    "redemptions_count",
+                    models.PositiveIntegerField(default=0, editable=False),
+                ),
+                ("start_date", models.DateTimeField()),
+                ("end_date", models.DateTimeField()),
+                ("is_active", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "restaurant",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Limit the code to one restaurant. Leave empty for a platform-wide code",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="promo_codes",
+                        to="users.restaurantprofile",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="PromoCodeRedemption",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "discount_amount",
+                    models.DecimalField(decimal_places=2, max_digits=10),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="promo_redemptions",
+                        to="users.customerprofile",
+                    ),
+                ),
+                (
+                    "promo_code",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="redemptions",
+                        to="restaurants.promocode",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["promo_code", "customer"],
+                        name="promoredemption_customer_idx",
+                    )
+                ],
+            },
+        ),
+    ]
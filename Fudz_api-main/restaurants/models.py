@@ -1,8 +1,8 @@
-from django.core.validators import MinValueValidator
+from django.core.validators import MaxValueValidator, MinValueValidator
 from decimal import Decimal
 from django.db import models
 
-from users.models import RestaurantProfile
+from users.models import CustomerProfile, RestaurantProfile
 
 from .validators import validate_file_size
 
@@ -24,6 +24,50 @@ class Promotion(models.Model):
         return f"{self.restaurant.restaurant_name} - {self.name}"
 
 
+class PromoCode(models.Model):
+    """Checkout code with global and per-customer redemption caps (see restaurants.promo_codes)"""
+    code = models.CharField(max_length=50, unique=True)
+    restaurant = models.ForeignKey(
+        RestaurantProfile,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="promo_codes",
+        help_text="Limit the code to one restaurant. Leave empty for a platform-wide code",
+    )
+    description = models.CharField(max_length=225, blank=True)
+    discount = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(100.0)])
+    max_discount_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_redemptions = models.PositiveIntegerField(null=True, blank=True, help_text="Leave empty for no global cap")
+    max_redemptions_per_customer = models.PositiveIntegerField(default=1)
+    redemptions_count = models.PositiveIntegerField(default=0, editable=False)
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return self.code
+
+
+class PromoCodeRedemption(models.Model):
+    promo_code = models.ForeignKey(PromoCode, on_delete=models.PROTECT, related_name="redemptions")
+    customer = models.ForeignKey(CustomerProfile, on_delete=models.CASCADE, related_name="promo_redemptions")
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["promo_code", "customer"], name="promoredemption_customer_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.promo_code.code} - {self.customer}"
+
+
 class MenuCategory(models.Model):
     restaurant = models.ForeignKey(RestaurantProfile, on_delete=models.CASCADE, related_name="categories")
     name = models.CharField(max_length=255)
@@ -89,7 +133,14 @@ class MenuItem(models.Model):
             return self.price
         
         best_promotion = active_promotions.order_by('-discount').first()
-        discount_amount = self.price * Decimal(best_promotion.discount / 100)
+        return self.apply_promotion(best_promotion)
+    
+    def apply_promotion(self, promotion):
+        """Price after the given promotion (the plain price when there is none)"""
+        if promotion is None:
+            return self.price
+        
+        discount_amount = self.price * Decimal(promotion.discount / 100)
         offer_price = self.price - discount_amount
         
         return round(offer_price, 2)
@@ -106,6 +157,25 @@ class MenuItem(models.Model):
         ).order_by('-discount').first()
 
 
+class KitchenCapacity(models.Model):
+    """How much a restaurant's kitchen can take per time slot (see restaurants.capacity)"""
+    restaurant = models.OneToOneField(RestaurantProfile, on_delete=models.CASCADE, related_name="kitchen_capacity")
+    slot_minutes = models.PositiveIntegerField(default=15, validators=[MinValueValidator(1)])
+    max_orders_per_slot = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Orders accepted per slot. Leave empty for no limit"
+    )
+    max_prep_minutes_per_slot = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Total item prep minutes accepted per slot. Leave empty for no limit"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Kitchen Capacities"
+
+    def __str__(self):
+        return f"{self.restaurant.restaurant_name} - {self.slot_minutes} min slots"
+
+
 class MenuItemImage(models.Model):
     menu_item = models.ForeignKey(MenuItem, related_name="images", on_delete=models.CASCADE)
     image = models.ImageField(upload_to="images/menu_items/")
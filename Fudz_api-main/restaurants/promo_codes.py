@@ -0,0 +1,109 @@
+"""
+Promo code redemption.
+
+Caps are enforced with atomic Redis counters so flash-sale codes don't
+serialize thousands of checkouts on one Postgres row. A checkout reserves a
+redemption, writes the PromoCodeRedemption row inside its own transaction,
+and gives the reservation back if that transaction fails. Postgres stays the
+source of truth: the counters expire after PROMO_CODE_COUNTER_TIMEOUT_SECONDS
+and are reloaded from the redemption rows, so a reservation leaked by a
+crashed checkout or a deleted redemption only holds a cap that long, and
+PromoCode.redemptions_count is reconciled after commit (restaurants.tasks).
+Checkouts in flight while a counter is reloaded are not in it, so a cap can
+be overshot by that many.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .counters import release_counter, reserve_counter
+from .models import PromoCode, PromoCodeRedemption
+
+
+class PromoCodeError(Exception):
+    pass
+
+
+def global_counter_key(promo_code_id):
+    return f"promo_code_{promo_code_id}_redemptions"
+
+
+def customer_counter_key(promo_code_id, customer_id):
+    return f"promo_code_{promo_code_id}_customer_{customer_id}_redemptions"
+
+
+def get_redeemable_code(code):
+    """Look up a code that is active right now, or raise PromoCodeError"""
+    now = timezone.now()
+    promo_code = PromoCode.objects.filter(
+        code__iexact=code.strip(), is_active=True, start_date__lte=now, end_date__gte=now
+    ).first()
+    if promo_code is None:
+        raise PromoCodeError("This promo code is invalid or has expired.")
+    return promo_code
+
+
+def seed_counter(key, count_redemptions):
+    """Initialise a missing counter from Postgres (after it expired, or a Redis restart)"""
+    if cache.get(key) is None:
+        cache.add(key, count_redemptions(), timeout=settings.PROMO_CODE_COUNTER_TIMEOUT_SECONDS)
+
+
+def reserve_promo_code(promo_code, customer_id):
+    """
+    Take one redemption against the code's global and per-customer caps.
+    Returns a reservation for release_promo_code, or raises PromoCodeError.
+    """
+    # reserve_counter lets one reservation into an empty counter, so a cap
+    # of zero has to be refused before getting there
+    if promo_code.max_redemptions_per_customer <= 0:
+        raise PromoCodeError("You have already used this promo code.")
+    if promo_code.max_redemptions is not None and promo_code.max_redemptions <= 0:
+        raise PromoCodeError("This promo code has been fully redeemed.")
+
+    timeout = settings.PROMO_CODE_COUNTER_TIMEOUT_SECONDS
+    customer_key = customer_counter_key(promo_code.id, customer_id)
+    seed_counter(
+        customer_key,
+        lambda: PromoCodeRedemption.objects.filter(promo_code=promo_code, customer_id=customer_id).count(),
+    )
+    if not reserve_counter(customer_key, 1, promo_code.max_redemptions_per_customer, timeout=timeout):
+        raise PromoCodeError("You have already used this promo code.")
+
+    reservation = [(customer_key, 1)]
+    if promo_code.max_redemptions is not None:
+        global_key = global_counter_key(promo_code.id)
+        seed_counter(global_key, lambda: promo_code.redemptions.count())
+        if not reserve_counter(global_key, 1, promo_code.max_redemptions, timeout=timeout):
+            release_promo_code(reservation)
+            raise PromoCodeError("This promo code has been fully redeemed.")
+        reservation.append((global_key, 1))
+
+    return reservation
+
+
+def release_promo_code(reservation):
+    for key, amount in reservation or []:
+        release_counter(key, amount)
+
+
+def promo_discount(promo_code, subtotal):
+    """Discount the code gives on ``subtotal``"""
+    discount = round(subtotal * Decimal(promo_code.discount / 100), 2)
+    if promo_code.max_discount_amount is not None:
+        discount = min(discount, promo_code.max_discount_amount)
+    return discount
+
+
+def allocate_discount(discount, subtotals):
+    """Split ``discount`` across orders in proportion to their subtotals"""
+    total = sum(subtotals)
+    if not total:
+        return [Decimal("0.00") for _ in subtotals]
+
+    shares = [round(discount * subtotal / total, 2) for subtotal in subtotals]
+    # Keep the rounding remainder on the last order so the shares add up
+    shares[-1] += discount - sum(shares)
+    return shares
@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import Promotion
+from .capacity import capacity_cache_key
+from .models import KitchenCapacity, Promotion
 from .tasks import activate_promotion, deactivate_promotion
 
 
@@ -42,3 +44,8 @@ def schedule_promotion_status_change(sender, instance, created, **kwargs):
         print(
             f"⚡ Immediately deactivating expired promotion '{instance.name}'"
         )
+
+
+@receiver([post_save, post_delete], sender=KitchenCapacity)
+def clear_kitchen_capacity_cache(sender, instance, **kwargs):
+    cache.delete(capacity_cache_key(instance.restaurant_id))
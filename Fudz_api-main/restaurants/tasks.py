@@ -2,7 +2,7 @@ from celery import shared_task
 from django.utils import timezone
 from django.core.cache import cache
 
-from .models import Promotion, MenuItem
+from .models import Promotion, MenuItem, PromoCode
 from users.helpers import notify_new_promotion
 from users.models import User
 
@@ -173,4 +173,37 @@ def send_promotion_reminders():
         except Exception as e:
             print(f"⚠️ Failed to send notifications: {e}")
     
-    return f"Sent reminders for {promotions.count()} promotions"
\ No newline at end of file
+    return f"Sent reminders for {promotions.count()} promotions"
+
+
+@shared_task
+def sync_promo_code_usage(promo_code_id):
+    """
+    Reconcile PromoCode.redemptions_count with the committed redemption rows.
+    Queued after each checkout that used the code
+    """
+    try:
+        promo_code = PromoCode.objects.get(id=promo_code_id)
+    except PromoCode.DoesNotExist:
+        return f"Promo code {promo_code_id} not found"
+
+    count = promo_code.redemptions.count()
+    PromoCode.objects.filter(id=promo_code_id).update(redemptions_count=count)
+    return f"Promo code '{promo_code.code}' redeemed {count} times"
+
+
+@shared_task
+def reconcile_promo_codes():
+    """
+    Periodic task to reconcile usage counts of all running promo codes
+    Run this every few minutes via Celery Beat
+    """
+    now = timezone.now()
+    promo_code_ids = PromoCode.objects.filter(
+        is_active=True, start_date__lte=now, end_date__gte=now
+    ).values_list('id', flat=True)
+
+    for promo_code_id in promo_code_ids:
+        sync_promo_code_usage(promo_code_id)
+
+    return f"Reconciled {len(promo_code_ids)} promo codes"
@@ -1,3 +1,79 @@
-from django.test import TestCase
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .counters import release_counter, reserve_counter
+from . import promo_codes
+from .promo_codes import PromoCodeError, reserve_promo_code
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ReserveCounterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_reserves_up_to_the_limit(self):
+        self.assertTrue(reserve_counter("counter", 2, 3, timeout=60))
+        self.assertFalse(reserve_counter("counter", 2, 3, timeout=60))
+        self.assertTrue(reserve_counter("counter", 1, 3, timeout=60))
+        self.assertEqual(cache.get("counter"), 3)
+
+    def test_release_gives_the_amount_back(self):
+        reserve_counter("counter", 3, 3, timeout=60)
+        release_counter("counter", 2)
+        self.assertTrue(reserve_counter("counter", 2, 3, timeout=60))
+
+    def test_oversized_request_into_empty_counter(self):
+        self.assertTrue(reserve_counter("counter", 5, 3, timeout=60))
+
+    def test_counter_recreated_at_the_limit_after_expiring(self):
+        incr = cache.incr
+        expired = []
+
+        def expire_once(key, delta=1, **kwargs):
+            if not expired:
+                # The counter expires after add(), and another worker re-creates it full
+                expired.append(key)
+                cache.set(key, 3, timeout=60)
+                raise ValueError(f"Key '{key}' not found")
+            return incr(key, delta, **kwargs)
+
+        with mock.patch.object(cache, "incr", side_effect=expire_once):
+            self.assertFalse(reserve_counter("counter", 1, 3, timeout=60))
+        self.assertEqual(cache.get("counter"), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PROMO_CODE_COUNTER_TIMEOUT_SECONDS=300)
+class ReservePromoCodeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_zero_per_customer_cap_is_refused(self):
+        promo_code = SimpleNamespace(id=1, max_redemptions=None, max_redemptions_per_customer=0)
+        with self.assertRaises(PromoCodeError):
+            reserve_promo_code(promo_code, customer_id=7)
+
+    def test_zero_global_cap_is_refused(self):
+        promo_code = SimpleNamespace(id=1, max_redemptions=0, max_redemptions_per_customer=1)
+        with self.assertRaises(PromoCodeError):
+            reserve_promo_code(promo_code, customer_id=7)
+
+    @mock.patch.object(promo_codes, "PromoCodeRedemption")
+    def test_leaked_reservation_is_corrected_from_postgres(self, redemptions):
+        redemptions.objects.filter.return_value.count.return_value = 0
+        promo_code = SimpleNamespace(id=1, max_redemptions=None, max_redemptions_per_customer=1)
+
+        # Reserved, but the checkout died before committing or releasing
+        reserve_promo_code(promo_code, customer_id=7)
+        with self.assertRaises(PromoCodeError):
+            reserve_promo_code(promo_code, customer_id=7)
+
+        # Once the counter expires it is reloaded from the (zero) redemption rows
+        later = time.time() + 301
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=later):
+            reserve_promo_code(promo_code, customer_id=7)
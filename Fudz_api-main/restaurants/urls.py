@@ -10,6 +10,7 @@ router.register('promotions', views.PromotionViewSet, basename='promotion')
 urlpatterns = [
     path('restaurants/', views.RestaurantListView.as_view(), name='restaurant-list'),
     path('restaurants/<int:pk>/', views.RestaurantDetailView.as_view(), name='restaurant-detail'),
+    path('restaurants/<int:pk>/kitchen-status/', views.RestaurantKitchenStatusView.as_view(), name='restaurant-kitchen-status'),
 
     path('restaurants/<int:restaurant_id>/categories/', views.MenuCategoryListCreateView.as_view(), name='restaurant-category-list'),
     path('restaurants/<int:restaurant_id>/categories/<int:pk>/', views.MenuCategoryRetrieveUpdateDestroyView.as_view(), name='restaurant-category-detail'),
@@ -10,6 +10,7 @@ from rest_framework.viewsets import ModelViewSet
 from users.models import RestaurantProfile
 from users.permissions import IsManagerOrReadOnly
 
+from .capacity import kitchen_status
 from .models import MenuCategory, MenuCategoryImage, MenuItem, MenuItemImage, Promotion
 from .permissions import IsAdminOrRestaurantOwner, IsOwnerOrReadOnly
 from .serializers import (
@@ -371,6 +372,19 @@ class RestaurantListView(generics.ListAPIView):
         )
 
 
+class RestaurantKitchenStatusView(generics.GenericAPIView):
+    """
+    Public view telling clients whether a restaurant is busy before they order
+    """
+
+    permission_classes = [AllowAny]
+    queryset = RestaurantProfile.objects.filter(is_approved=True, is_active=True)
+
+    def get(self, request, pk):
+        restaurant = self.get_object()
+        return Response(kitchen_status(restaurant.id))
+
+
 class RestaurantDetailView(generics.RetrieveAPIView):
     """
     Public view to get restaurant details with menu
@@ -44,6 +44,9 @@ class CourierAdmin(GISModelAdmin):
         "is_available",
         "is_approved",
         "rating",
+        "total_deliveries",
+        "on_time_rate",
+        "acceptance_rate",
         "current_location",
     ]
     ordering = ["user__first_name", "user__last_name"]
@@ -58,6 +61,15 @@ class CourierAdmin(GISModelAdmin):
     def courier_name(self, courier):
         return f"{courier.user.first_name} {courier.user.last_name}"
 
+    # Precomputed by delivery.performance
+    def on_time_rate(self, courier):
+        rate = courier.performance_stats.get("on_time_rate")
+        return f"{rate:.0%}" if rate is not None else "-"
+
+    def acceptance_rate(self, courier):
+        rate = courier.performance_stats.get("acceptance_rate")
+        return f"{rate:.0%}" if rate is not None else "-"
+
 
 @admin.register(models.RestaurantProfile)
 class RestaurantAdmin(GISModelAdmin):
@@ -18,4 +18,20 @@ class IsRestaurantOwner(BasePermission):
     Only allow restaurant owners to manage their own staff.
     """
     def has_permission(self, request, view):
-        return request.user.is_authenticated and (hasattr(request.user, "restaurant_profile") or request.user.is_staff)
\ No newline at end of file
+        return request.user.is_authenticated and (hasattr(request.user, "restaurant_profile") or request.user.is_staff)
+
+
+class IsCourierOrAdmin(BasePermission):
+    """
+    Only couriers and staff.
+    """
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and (hasattr(request.user, "courier_profile") or request.user.is_staff)
+
+
+class IsCourier(BasePermission):
+    """
+    Only users with a courier profile.
+    """
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and hasattr(request.user, "courier_profile")